@@ -0,0 +1,90 @@
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 数値に変換できない「記録なし」の表記
+MISSING = {"", "-", "--", "---", "----"}
+
+# 「123.1」が 123回1/3 を意味する投球回の列
+INNINGS_COLUMNS = {"投球回"}
+
+_INT = re.compile(r"^-?\d+$")
+_FLOAT = re.compile(r"^-?\d*\.\d+$")
+
+
+def parse_innings(value: str) -> float:
+    """Convert NPB innings notation ("123.1" = 123 1/3) to a float"""
+    whole, _, thirds = value.partition(".")
+    return int(whole or 0) + int(thirds or 0) / 3
+
+
+def format_innings(value: float) -> str:
+    outs = int(round(value * 3))
+    return f"{outs // 3}.{outs % 3}" if outs % 3 else str(outs // 3)
+
+
+def _column(name: str, cells: List[str]) -> Tuple[np.ndarray, str]:
+    """Infer the type of one column and build its array.
+
+    Returns the array and its kind: "int", "float", "innings" or "str".
+    Columns with missing values are stored as float with NaN.
+    """
+    values = [c.strip() for c in cells]
+    present = [v for v in values if v not in MISSING]
+    if present and all(_INT.match(v) or _FLOAT.match(v) for v in present):
+        if name in INNINGS_COLUMNS:
+            return np.array([parse_innings(v) if v not in MISSING else np.nan for v in values]), "innings"
+        if len(present) == len(values) and all(_INT.match(v) for v in present):
+            return np.array([int(v) for v in values], dtype=np.int64), "int"
+        return np.array([float(v) if v not in MISSING else np.nan for v in values]), "float"
+    return np.array(values, dtype=str), "str"
+
+
+class StatsTable:
+    """A stats table stored as one typed array per column"""
+
+    def __init__(self, columns: List[str], arrays: List[np.ndarray], kinds: List[str]):
+        self.columns = columns
+        self.arrays = dict(zip(columns, arrays))
+        self.kinds = dict(zip(columns, kinds))
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, str]]) -> "StatsTable":
+        columns = list(rows[0].keys()) if rows else []
+        arrays, kinds = [], []
+        for name in columns:
+            array, kind = _column(name, [row.get(name, "") for row in rows])
+            arrays.append(array)
+            kinds.append(kind)
+        return cls(columns, arrays, kinds)
+
+    def __len__(self) -> int:
+        return len(self.arrays[self.columns[0]]) if self.columns else 0
+
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def to_rows(self, index: Optional[np.ndarray] = None,
+                columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Materialize rows as JSON-ready dicts (NaN becomes None, innings keep NPB notation)"""
+        columns = columns or self.columns
+        lists = []
+        for name in columns:
+            array = self.arrays[name] if index is None else self.arrays[name][index]
+            kind = self.kinds[name]
+            if kind == "innings":
+                lists.append([None if np.isnan(v) else format_innings(v) for v in array.tolist()])
+            elif kind == "float":
+                lists.append([None if v != v else v for v in array.tolist()])
+            else:
+                lists.append(array.tolist())
+        return [dict(zip(columns, values)) for values in zip(*lists)]
+
+    def iter_rows(self, index: Optional[np.ndarray] = None, columns: Optional[List[str]] = None,
+                  chunk_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """Materialize rows lazily, ``chunk_size`` rows at a time (for streaming)"""
+        if index is None:
+            index = np.arange(len(self))
+        for start in range(0, len(index), chunk_size):
+            yield self.to_rows(index[start:start + chunk_size], columns)
@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from events import EventHub, SnapshotWatcher, players_diff, stats_diff
+from responses import PayloadCache
+from snapshot import SnapshotCache, load_json
+from store import is_store_locator, read_teams, source_for
+from telemetry import startup
+
+logger = logging.getLogger(__name__)
+
+
+def load_teams(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """league -> teams of an npb_teams_*.json file or a store snapshot"""
+    if is_store_locator(path):
+        return read_teams(path)
+    return load_json(path)
+
+
+class DataService:
+    """The snapshot caches (players, stats, teams) every router reads from.
+
+    Each cache and its serialized-response cache is created the first time a
+    router asks for it, so a worker that mounts only some of the routers
+    neither imports nor loads the data of the others. ``warm`` loads every
+    cache created so far before the first request is accepted.
+    """
+
+    def __init__(self):
+        self.events = EventHub()
+        self.watcher = SnapshotWatcher(self.events)
+        self._caches: Dict[str, SnapshotCache] = {}
+
+    @functools.cached_property
+    def players(self) -> SnapshotCache:
+        # 検索索引・年度別成績のモジュールは選手データを使うワーカーだけが import する
+        from players import PlayerSnapshot
+
+        cache = SnapshotCache("npb_players_", loader=PlayerSnapshot.load, empty=PlayerSnapshot.empty,
+                              source=source_for("npb_players_"), prepare=PlayerSnapshot.prepare)
+        self.watcher.watch("players", cache, players_diff)
+        self._caches["players"] = cache
+        return cache
+
+    @functools.cached_property
+    def stats(self) -> SnapshotCache:
+        from stats_snapshot import StatsSnapshot
+
+        cache = SnapshotCache("npb_stats_", loader=StatsSnapshot.load, empty=StatsSnapshot.empty,
+                              source=source_for("npb_stats_"))
+        self.watcher.watch("stats", cache, stats_diff)
+        self._caches["stats"] = cache
+        return cache
+
+    @functools.cached_property
+    def teams(self) -> SnapshotCache:
+        cache = SnapshotCache("npb_teams_", loader=load_teams, empty=dict, source=source_for("npb_teams_"))
+        self._caches["teams"] = cache
+        return cache
+
+    # 直列化済みのレスポンス（スナップショットが替わると破棄される）
+    @functools.cached_property
+    def players_payloads(self) -> PayloadCache:
+        return PayloadCache("players", self.players)
+
+    @functools.cached_property
+    def stats_payloads(self) -> PayloadCache:
+        return PayloadCache("stats", self.stats)
+
+    @functools.cached_property
+    def teams_payloads(self) -> PayloadCache:
+        return PayloadCache("teams", self.teams)
+
+    async def warm(self) -> Dict[str, float]:
+        """Load every cache in use (and build its indexes) off the event loop; seconds per cache"""
+
+        async def load(name: str, cache: SnapshotCache):
+            start = time.perf_counter()
+            try:
+                await cache.aget()
+            except Exception as e:
+                # 読み込めなかったスナップショットは最初のリクエストで再び試す
+                logger.error(f"Error warming {name} snapshot: {str(e)}")
+            startup.warm[name] = time.perf_counter() - start
+
+        await asyncio.gather(*(load(name, cache) for name, cache in self._caches.items()))
+        return dict(startup.warm)
+
+
+_service: Optional[DataService] = None
+
+
+def data_service() -> DataService:
+    """The DataService of this process (created on first use)"""
+    global _service
+    if _service is None:
+        _service = DataService()
+    return _service
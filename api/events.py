@@ -0,0 +1,256 @@
+import asyncio
+import functools
+import logging
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from responses import dumps
+from snapshot import DATA_DIR, Snapshot, SnapshotCache, snapshot_time
+
+logger = logging.getLogger(__name__)
+
+# ポーリング時の確認間隔（秒）
+WATCH_INTERVAL = float(os.environ.get("NPB_WATCH_INTERVAL", "2"))
+
+# 接続ごとに溜めておけるイベント数（超えた接続は切断し、再接続時に再送する）
+SUBSCRIBER_QUEUE = 16
+
+# 再接続したクライアントに Last-Event-ID 以降を再送するために残すイベント数
+REPLAY_EVENTS = 64
+
+# 何も送らない接続に送るコメント行の間隔（秒）
+KEEPALIVE_SECONDS = 15.0
+
+# 比較しないフィールド（取得時刻だけが変わった選手は更新扱いにしない）
+IGNORED_PLAYER_FIELDS = {"fetched_at"}
+
+
+def _player_fields(player: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in player.items() if k not in IGNORED_PLAYER_FIELDS}
+
+
+def _roster_fields(snapshot: Any) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+    """Compared fields per team and per player id (each roster is read once, also for packed snapshots)"""
+    teams = {team_id: [_player_fields(p) for p in players] for team_id, players in snapshot.rosters.items()}
+    players: Dict[str, Dict[str, Any]] = {}
+    for fields in teams.values():
+        for player in fields:
+            players.setdefault(player.get("id", ""), player)
+    return teams, players
+
+
+def players_diff(old: Any, new: Any) -> Dict[str, Any]:
+    """Teams whose roster changed and players added, removed or updated between two PlayerSnapshots"""
+    old_teams, old_players = _roster_fields(old)
+    new_teams, new_players = _roster_fields(new)
+    old_ids, new_ids = set(old_players), set(new_players)
+    updated = sorted(player_id for player_id in old_ids & new_ids if old_players[player_id] != new_players[player_id])
+    teams = sorted(team_id for team_id in set(old_teams) | set(new_teams)
+                   if old_teams.get(team_id, []) != new_teams.get(team_id, []))
+    return {
+        "teams": teams,
+        "added": sorted(new_ids - old_ids),
+        "removed": sorted(old_ids - new_ids),
+        "updated": updated,
+    }
+
+
+def _board_order(board: Dict[str, Any]) -> List[Tuple[Any, Any]]:
+    category = board["category"]
+    return [(row.get("選手"), row.get(category)) for row in board["rankings"]]
+
+
+def stats_diff(old: Any, new: Any) -> Dict[str, Any]:
+    """Leaderboards of two StatsSnapshots whose order or values moved"""
+    moved = []
+    for stats_type, boards in new.leaderboards.items():
+        previous = {board["category"]: board for board in old.leaderboards.get(stats_type, [])}
+        for board in boards:
+            before = previous.get(board["category"])
+            if before is not None and _board_order(before) == _board_order(board):
+                continue
+            leader = board["rankings"][0].get("選手") if board["rankings"] else None
+            previous_leader = before["rankings"][0].get("選手") if before and before["rankings"] else None
+            moved.append({
+                "stats_type": stats_type,
+                "category": board["category"],
+                "leader": leader,
+                "previous_leader": previous_leader,
+            })
+    return {"season": new.season, "leaderboards": moved}
+
+
+class Event:
+    """One change notification, serialized once for every subscriber"""
+
+    def __init__(self, event_id: int, kind: str, payload: Dict[str, Any]):
+        self.id = event_id
+        self.kind = kind
+        self.json = dumps({"id": event_id, "kind": kind, **payload})
+        self.text = self.json.decode("utf-8")
+        self.sse = b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, kind.encode(), self.json)
+
+
+class EventHub:
+    """Fan-out of events to SSE and WebSocket subscribers.
+
+    Publishing puts the same pre-serialized event into each subscriber's
+    bounded queue, so an idle connection costs one queue and nothing per
+    event beyond that. A subscriber whose queue is full is dropped; it
+    reconnects with Last-Event-ID and gets the missed events from the replay
+    buffer.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE, replay: int = REPLAY_EVENTS):
+        self.queue_size = queue_size
+        self._subscribers: Set["asyncio.Queue[Optional[Event]]"] = set()
+        self._recent: Deque[Event] = deque(maxlen=replay)
+        self._next_id = 1
+        self.dropped = 0
+
+    def subscribe(self) -> "asyncio.Queue[Optional[Event]]":
+        queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Optional[Event]]"):
+        self._subscribers.discard(queue)
+
+    def publish(self, kind: str, payload: Dict[str, Any]) -> Event:
+        event = Event(self._next_id, kind, payload)
+        self._next_id += 1
+        self._recent.append(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 読み出しが追いつかない接続は切る（None で終了を知らせる）
+                self._subscribers.discard(queue)
+                self.dropped += 1
+                queue.get_nowait()
+                queue.put_nowait(None)
+        return event
+
+    def replay(self, last_event_id: Optional[str]) -> List[Event]:
+        """Events published after ``last_event_id`` that are still buffered"""
+        try:
+            last = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return []
+        if last is None:
+            return []
+        return [event for event in self._recent if event.id > last]
+
+    async def events(self, last_event_id: Optional[str] = None) -> AsyncIterator[Optional[Event]]:
+        """Yield events for one subscriber; ``None`` when nothing happened for KEEPALIVE_SECONDS"""
+        queue = self.subscribe()
+        try:
+            for event in self.replay(last_event_id):
+                yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.unsubscribe(queue)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subscribers), "published": self._next_id - 1, "dropped": self.dropped}
+
+
+# inotify 等で data ディレクトリを監視できればそれを使う（無ければポーリング）。
+# 監視を始めるときに初めて import する
+@functools.lru_cache(maxsize=None)
+def _awatch() -> Optional[Callable[..., Any]]:
+    try:
+        from watchfiles import awatch
+    except ImportError:
+        return None
+    return awatch
+
+
+class SnapshotWatcher:
+    """Publishes a diff whenever a watched snapshot cache picks up a newer snapshot.
+
+    The data directory is watched with ``watchfiles`` (inotify and friends)
+    when it is installed; otherwise every cache is checked each
+    ``interval`` seconds. With the SQLite store the check is a single
+    ``MAX(version)`` query.
+    """
+
+    def __init__(self, hub: EventHub, interval: float = WATCH_INTERVAL, data_dir: str = DATA_DIR):
+        self.hub = hub
+        self.interval = interval
+        self.data_dir = data_dir
+        self._watched: Dict[str, Tuple[SnapshotCache, Callable[[Any, Any], Dict[str, Any]]]] = {}
+        self._seen: Dict[str, Snapshot] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stop = asyncio.Event()
+
+    def watch(self, kind: str, cache: SnapshotCache, diff: Callable[[Any, Any], Dict[str, Any]]):
+        self._watched[kind] = (cache, diff)
+
+    def check(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Refresh every watched cache and return (kind, payload) for those that changed"""
+        changes = []
+        for kind, (cache, diff) in self._watched.items():
+            snapshot = cache.refresh()
+            previous = self._seen.get(kind)
+            self._seen[kind] = snapshot
+            if previous is None or snapshot is previous:
+                continue
+            updated_at = snapshot_time(snapshot)
+            changes.append((kind, {
+                "file": os.path.basename(snapshot.path) if snapshot.path else None,
+                "updated_at": updated_at.isoformat() if updated_at else None,
+                "diff": diff(previous.data, snapshot.data),
+            }))
+        return changes
+
+    async def _check(self):
+        try:
+            changes = await asyncio.to_thread(self.check)
+        except Exception as e:
+            logger.error(f"Error checking snapshots: {str(e)}")
+            return
+        for kind, payload in changes:
+            event = self.hub.publish(kind, payload)
+            logger.info(f"Published {kind} event {event.id} to {self.hub.metrics()['subscribers']} subscribers")
+
+    async def _run(self):
+        await self._check()
+        awatch = _awatch()
+        if awatch is not None and os.path.isdir(self.data_dir):
+            async for _ in awatch(self.data_dir, stop_event=self._stop, debounce=int(self.interval * 1000)):
+                await self._check()
+            return
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                await self._check()
+
+    def start(self):
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+
+
+async def sse_stream(hub: EventHub, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Server-Sent Events body: ``retry`` hint, replayed events, then live events and keepalives"""
+    yield b"retry: 5000\n\n"
+    async for event in hub.events(last_event_id):
+        yield event.sse if event is not None else b": keepalive\n\n"
+
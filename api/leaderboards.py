@@ -0,0 +1,133 @@
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from columnar import StatsTable
+from query import LEAGUE_TEAMS, TEAM_COLUMN, sort_index
+
+TOP_N = 10
+
+# チーム成績が無い場合の1シーズンの試合数
+SEASON_GAMES = 143
+
+PLAYER_COLUMN = "選手"
+POSITION_COLUMN = "ポジション"
+GAMES_COLUMN = "試合"
+
+# 値が小さいほど良い指標（それ以外は大きいほど良い）
+LOWER_IS_BETTER = {
+    "batting": {"三振", "併殺打", "盗塁刺"},
+    "pitching": {"防御率", "敗北", "安打", "本塁打", "四球", "死球", "失点", "自責点"},
+    "fielding": {"失策"}
+}
+
+# 率の指標は規定打席・規定投球回に達した選手だけで順位を付ける
+QUALIFIERS = {
+    "batting": ("打席", 3.1, {"打率", "長打率", "出塁率"}),
+    "pitching": ("投球回", 1.0, {"防御率", "勝率"})
+}
+
+
+def name_key(name: str) -> str:
+    """Normalize a player name for matching (NFKC, no spaces)"""
+    return "".join(unicodedata.normalize("NFKC", name).split())
+
+
+def team_leagues(table: StatsTable) -> np.ndarray:
+    """League ("central"/"pacific", "" if unknown) of every row"""
+    leagues = np.full(len(table), "", dtype="U7")
+    if TEAM_COLUMN in table.arrays:
+        teams = table.column(TEAM_COLUMN)
+        for league, names in LEAGUE_TEAMS.items():
+            leagues[np.isin(teams, list(names))] = league
+    return leagues
+
+
+def numeric_columns(table: StatsTable) -> List[str]:
+    return [name for name in table.columns if table.kinds[name] != "str"]
+
+
+def row_positions(stats_type: str, table: StatsTable, fielding: StatsTable) -> np.ndarray:
+    """Position of every row; batters take the position they played most in the fielding table"""
+    if stats_type == "pitching":
+        return np.full(len(table), "投手")
+    if POSITION_COLUMN in table.arrays:
+        return table.column(POSITION_COLUMN).astype(str)
+
+    main_position: Dict[tuple, tuple] = {}
+    if len(fielding) and POSITION_COLUMN in fielding.arrays:
+        games = fielding.column(GAMES_COLUMN) if GAMES_COLUMN in fielding.arrays else np.zeros(len(fielding))
+        for name, team, position, played in zip(fielding.column(PLAYER_COLUMN).tolist(),
+                                                 fielding.column(TEAM_COLUMN).tolist(),
+                                                 fielding.column(POSITION_COLUMN).tolist(), games.tolist()):
+            key = (name_key(name), team)
+            if key not in main_position or played > main_position[key][1]:
+                main_position[key] = (position, played)
+
+    positions = [main_position.get((name_key(name), team), ("", 0))[0]
+                 for name, team in zip(table.column(PLAYER_COLUMN).tolist(), table.column(TEAM_COLUMN).tolist())]
+    return np.array(positions, dtype=str)
+
+
+def top_n(stats_type: str, table: StatsTable, season_games: float, n: int = TOP_N) -> Dict[str, np.ndarray]:
+    """Row indexes of the best ``n`` players for every numeric column, best first"""
+    boards = {}
+    lower = LOWER_IS_BETTER.get(stats_type, set())
+    qualifier = QUALIFIERS.get(stats_type)
+    for name in numeric_columns(table):
+        values = table.column(name).astype(float)
+        mask = ~np.isnan(values)
+        if qualifier and name in qualifier[2] and qualifier[0] in table.arrays:
+            mask &= table.column(qualifier[0]) >= qualifier[1] * season_games
+        index = sort_index(values, np.flatnonzero(mask), descending=name not in lower)
+        boards[name] = index[:n].astype(np.int32)
+    return boards
+
+
+def percentiles(values: np.ndarray, groups: np.ndarray, lower_is_better: bool) -> np.ndarray:
+    """Percentile rank (0-100) of every value within its group; NaN stays NaN"""
+    values = values.astype(float)
+    result = np.full(len(values), np.nan)
+    for group in np.unique(groups):
+        members = np.flatnonzero((groups == group) & ~np.isnan(values))
+        if not len(members):
+            continue
+        ordered = np.sort(values[members])
+        if lower_is_better:
+            beaten = len(ordered) - np.searchsorted(ordered, values[members], side="left")
+        else:
+            beaten = np.searchsorted(ordered, values[members], side="right")
+        result[members] = 100.0 * beaten / len(ordered)
+    return result
+
+
+def build_derived(individual: Dict[str, StatsTable], team_batting: Optional[StatsTable]) -> Dict[str, np.ndarray]:
+    """Ingest step: leaderboards, positions and percentile ranks for the individual tables.
+
+    Everything is returned as a flat ``{key: array}`` dict so it can be stored
+    in the snapshot's .pack with the tables themselves:
+    ``board/<type>/<column>``, ``position/<type>`` and ``pct/<type>/<league|position>/<column>``.
+    """
+    season_games = SEASON_GAMES
+    if team_batting is not None and GAMES_COLUMN in team_batting.arrays and len(team_batting):
+        season_games = float(np.nanmax(team_batting.column(GAMES_COLUMN)))
+
+    fielding = individual.get("fielding") or StatsTable([], [], [])
+    derived = {}
+    for stats_type, table in individual.items():
+        if not len(table) or PLAYER_COLUMN not in table.arrays:
+            continue
+        for name, index in top_n(stats_type, table, season_games).items():
+            derived[f"board/{stats_type}/{name}"] = index
+
+        leagues = team_leagues(table)
+        positions = row_positions(stats_type, table, fielding)
+        derived[f"position/{stats_type}"] = positions
+        league_positions = np.char.add(np.char.add(leagues, "/"), positions)
+        lower = LOWER_IS_BETTER.get(stats_type, set())
+        for name in numeric_columns(table):
+            values = table.column(name)
+            derived[f"pct/{stats_type}/league/{name}"] = percentiles(values, leagues, name in lower)
+            derived[f"pct/{stats_type}/position/{name}"] = percentiles(values, league_positions, name in lower)
+    return derived
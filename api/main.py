@@ -1,78 +1,71 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-import json
-from typing import Dict, List, Any
+# 起動時間の計測を始めるため、他のモジュールより先に読み込む
+from telemetry import PROFILE_DIR, RequestProfiler, TelemetryMiddleware, startup
+
+import importlib
+import logging
 import os
-from datetime import datetime
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional, Sequence
+from datasets import data_service
+from snapshot import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# 組み込むルーター（routers/<name>.py）。NPB_ROUTERS にカンマ区切りで指定すると、そのルーターだけを読み込む
+ROUTERS = ("players", "stats", "teams", "bundle", "history", "events", "metrics")
+ENABLED_ROUTERS = [name.strip() for name in os.environ.get("NPB_ROUTERS", ",".join(ROUTERS)).split(",")
+                   if name.strip()]
+
+# "1" のときは起動時にスナップショットを読み込み終えてからリクエストを受け付ける（"0" で最初のリクエスト時に読み込む）
+WARM_AT_STARTUP = os.environ.get("NPB_WARM", "1") == "1"
+
+def create_app(routers: Optional[Sequence[str]] = None, warm: bool = WARM_AT_STARTUP) -> FastAPI:
+    """Build the API: every router in ``routers`` sharing one DataService, warmed at startup"""
+    app = FastAPI(title="NPB Data API")
+
+    # CORS設定
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Total-Count", "ETag", "Last-Modified", "Server-Timing", "X-Search-Readings"],
+    )
 
-app = FastAPI(title="NPB Data API")
+    # ルートごとの所要時間・遅いリクエストのログ・サンプリングプロファイル
+    profiler = RequestProfiler(directory=PROFILE_DIR or os.path.join(DATA_DIR, "profiles"))
+    app.add_middleware(TelemetryMiddleware, profiler=profiler)
 
-# CORS設定
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to NPB Data API"}
 
-def get_latest_data() -> Dict[str, Any]:
-    """最新のデータファイルを読み込む"""
-    data_dir = "../data"
-    if not os.path.exists(data_dir):
-        return {}
-    
-    files = [f for f in os.listdir(data_dir) if f.startswith("npb_players_")]
-    if not files:
-        return {}
-    
-    latest_file = max(files, key=lambda x: os.path.getctime(os.path.join(data_dir, x)))
-    with open(os.path.join(data_dir, latest_file), 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # ルーターのモジュール（と、それが使うデータのモジュール）は組み込むものだけを import する
+    for name in ENABLED_ROUTERS if routers is None else routers:
+        if name not in ROUTERS:
+            raise ValueError(f"Unknown router: {name} (expected one of {', '.join(ROUTERS)})")
+        app.include_router(importlib.import_module(f"routers.{name}").router)
+    startup.mark("imported")
 
-@app.get("/")
-async def root():
-    return {"message": "Welcome to NPB Data API"}
+    service = data_service()
 
-@app.get("/teams")
-async def get_teams():
-    data = get_latest_data()
-    teams = []
-    for team_id, players in data.items():
-        if players:  # チームに選手が存在する場合
-            team_info = {
-                "id": team_id,
-                "name": players[0]["team"],
-                "league": players[0]["league"],
-                "player_count": len(players)
-            }
-            teams.append(team_info)
-    return teams
+    @app.on_event("startup")
+    async def start_service():
+        if warm:
+            warmed = await service.warm()
+            startup.mark("warmed")
+            logger.info("Warmed snapshots: " + (", ".join(f"{name} {seconds:.2f} s"
+                                                          for name, seconds in warmed.items()) or "none"))
+        # 新しいスナップショットの差分を SSE / WebSocket で配信する
+        service.watcher.start()
+        startup.mark("ready")
 
-@app.get("/players/{team_id}")
-async def get_team_players(team_id: str):
-    data = get_latest_data()
-    if team_id not in data:
-        raise HTTPException(status_code=404, detail="Team not found")
-    return data[team_id]
+    @app.on_event("shutdown")
+    async def stop_service():
+        await service.watcher.stop()
 
-@app.get("/player/{player_id}")
-async def get_player(player_id: str):
-    data = get_latest_data()
-    for team_players in data.values():
-        for player in team_players:
-            if player["id"] == player_id:
-                return player
-    raise HTTPException(status_code=404, detail="Player not found")
+    return app
 
-@app.get("/statistics")
-async def get_statistics():
-    data = get_latest_data()
-    stats = {
-        "total_players": sum(len(players) for players in data.values()),
-        "teams": len(data),
-        "last_updated": datetime.fromtimestamp(os.path.getctime("../data/" + 
-            max(os.listdir("../data"), key=lambda x: os.path.getctime("../data/" + x))
-        )).isoformat() if os.path.exists("../data") and os.listdir("../data") else None
-    }
-    return stats
\ No newline at end of file
+app = create_app()
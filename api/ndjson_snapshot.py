@@ -0,0 +1,43 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 選手データの NDJSON スナップショット（scraper/snapshot_writer.py が書く形式）の読み込み。
+# API とスクレイパーの両方が import する（scraper/ndjson_snapshot.py はこのファイルへのシンボリックリンク）
+FORMAT = "npb-players-ndjson"
+VERSION = 1
+
+
+def read_index(path: str) -> Dict[str, List[int]]:
+    """Team block offsets ([offset, length, count]) from the last line of an NDJSON snapshot"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, end - block)
+            f.seek(start)
+            tail = f.read(end - start).rstrip(b"\n")
+            # 末尾の改行の手前にもう一つ改行があれば最後の行が取り出せる
+            if b"\n" in tail or start == 0:
+                break
+            block *= 2
+    return json.loads(tail.rsplit(b"\n", 1)[-1])["index"]
+
+
+def read_team(path: str, team_id: str, index: Optional[Dict[str, List[int]]] = None) -> List[Dict[str, Any]]:
+    """Parse one team's block of an NDJSON snapshot, leaving the rest of the file alone"""
+    index = index or read_index(path)
+    if team_id not in index:
+        return []
+    offset, length, _ = index[team_id]
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        block = f.read(length)
+    return [json.loads(line)["player"] for line in block.splitlines() if line]
+
+
+def iter_teams(path: str) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Yield (team_id, players) one team at a time, in the order of the index"""
+    index = read_index(path)
+    for team_id in index:
+        yield team_id, read_team(path, team_id, index)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# レコードの JSON は orjson があればそれで読む
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NPBPACK1"
+
+# 各配列の先頭をそろえる境界（バイト）
+ALIGN = 64
+
+# NPB_PACK=0 で .pack を使わず、従来どおり各ワーカーがJSONを読み込む
+USE_PACKS = os.environ.get("NPB_PACK", "1") != "0"
+
+
+def pack_path(path: str) -> str:
+    """The .pack file kept next to a snapshot file"""
+    return os.path.splitext(path)[0] + ".pack"
+
+
+def pack_is_fresh(path: str) -> bool:
+    """True when ``path``'s pack exists and is not older than the snapshot itself"""
+    packed = pack_path(path)
+    return os.path.exists(packed) and os.path.getmtime(packed) >= os.path.getmtime(path)
+
+
+def write_pack(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Write arrays and a JSON header to a pack file (atomically, via a temp file).
+
+    Layout: magic, header length (uint64), header JSON, then every array's
+    raw bytes at a 64-byte aligned offset. The header records each array's
+    dtype, shape and offset, so a reader maps the file and wraps the bytes
+    without copying or parsing anything.
+    """
+    specs, offset = {}, 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError(f"Array {name} has object dtype and cannot be packed")
+        offset = -(-offset // ALIGN) * ALIGN
+        specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps({"meta": meta, "arrays": specs}, ensure_ascii=False).encode("utf-8")
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    # 複数ワーカーが同時に作っても一時ファイルが衝突しないよう PID を付ける
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(start + specs[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Pack:
+    """A pack file mapped read-only into memory.
+
+    Arrays are zero-copy views of the mapping, so every worker process that
+    opens the same file shares its pages through the OS page cache. The
+    mapping stays open as long as any array taken from it is referenced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a pack file")
+        (length,) = struct.unpack_from("<Q", self._map, len(MAGIC))
+        header = json.loads(self._map[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+        self.meta: Dict[str, Any] = header["meta"]
+        self._specs: Dict[str, Dict[str, Any]] = header["arrays"]
+        self._start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        spec = self._specs[name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        if count == 0:
+            return np.empty(spec["shape"], dtype=dtype)
+        array = np.frombuffer(self._map, dtype=dtype, count=count, offset=self._start + spec["offset"])
+        return array.reshape(spec["shape"])
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._map)
+
+
+def string_table(values: Sequence[str]) -> Dict[str, np.ndarray]:
+    """UTF-8 blob plus offsets for a list of strings (``.blob`` / ``.offsets`` arrays)"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"blob": np.frombuffer(b"".join(encoded), dtype=np.uint8), "offsets": offsets}
+
+
+class StringTable:
+    """Strings of a pack, decoded one at a time on access"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, pack: Pack, name: str) -> "StringTable":
+        return cls(pack[f"{name}.blob"], pack[f"{name}.offsets"])
+
+    def raw(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+
+def loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def add_strings(arrays: Dict[str, np.ndarray], name: str, values: Sequence[str]):
+    for part, array in string_table(values).items():
+        arrays[f"{name}.{part}"] = array
+
+
+def main(argv: Optional[List[str]] = None):
+    """Build the packs of the newest players and stats snapshots (run after a scrape)"""
+    from players import PlayerSnapshot
+    from snapshot import DATA_DIR, DirectorySource
+    from stats_snapshot import StatsSnapshot
+
+    parser = argparse.ArgumentParser(description="Build memory-mapped .pack files for the latest snapshots")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory holding the snapshot files")
+    args = parser.parse_args(argv)
+
+    for prefix, snapshot_type in (("npb_players_", PlayerSnapshot), ("npb_stats_", StatsSnapshot)):
+        path, _ = DirectorySource(prefix, args.data_dir).latest()
+        if path is None:
+            continue
+        snapshot_type.load(path)
+        logger.info(f"{pack_path(path)} is up to date ({os.path.getsize(pack_path(path)):,} bytes, "
+                    f"source {os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
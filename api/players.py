@@ -0,0 +1,311 @@
+import functools
+import json
+import logging
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from packfile import USE_PACKS, Pack, StringTable, add_strings, loads, pack_is_fresh, pack_path, write_pack
+from search import SearchIndex
+from ndjson_snapshot import iter_teams
+from snapshot import load_json
+from store import is_store_locator, read_players
+from timeseries import PlayerSeries, build_tables, tables_from_pack
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerSnapshot:
+    """Players data file with lookup indexes built once at load time"""
+
+    def __init__(self, rosters: Dict[str, List[Dict[str, Any]]]):
+        self.rosters = rosters
+        self.players_by_id: Dict[str, Dict[str, Any]] = {}
+        self.teams: Dict[str, Dict[str, Any]] = {}
+        self.teams_by_league: Dict[str, List[str]] = {}
+        self.players_by_position: Dict[str, List[Dict[str, Any]]] = {}
+        self.search = SearchIndex.empty()
+        # 年度別成績（表ごと: batting / pitching）
+        self.series: Optional[Dict[str, PlayerSeries]] = None
+
+        for team_id, players in rosters.items():
+            for player in players:
+                # 同じIDが複数チームに現れた場合は最初のものを優先する
+                self.players_by_id.setdefault(player.get("id", ""), player)
+                position = player.get("position")
+                if position:
+                    self.players_by_position.setdefault(position, []).append(player)
+
+            if players:  # チームに選手が存在する場合
+                self.teams[team_id] = _team_entry(team_id, players)
+                self.teams_by_league.setdefault(players[0]["league"].lower(), []).append(team_id)
+
+    @classmethod
+    def load(cls, path: str) -> "PlayerSnapshot":
+        if is_store_locator(path):
+            return cls(read_players(path))
+        if USE_PACKS and pack_is_fresh(path):
+            return PackedPlayerSnapshot(Pack(pack_path(path)))
+        if path.endswith(".ndjson"):
+            # チームごとのブロックを索引から1つずつ読む（ファイル全体を一度にパースしない）
+            teams = functools.partial(iter_teams, path)
+        else:
+            rosters = load_json(path)
+            teams = rosters.items
+        if not USE_PACKS:
+            return cls(dict(teams()))
+        try:
+            write_players_pack(pack_path(path), teams)
+        except OSError as e:
+            logger.warning(f"Could not write {pack_path(path)}: {e}")
+            return cls(dict(teams()))
+        # 作ったばかりの .pack をマップする（他のワーカーとページを共有する）
+        return PackedPlayerSnapshot(Pack(pack_path(path)))
+
+    @classmethod
+    def empty(cls) -> "PlayerSnapshot":
+        return cls({})
+
+    @staticmethod
+    def prepare(previous: Optional["PlayerSnapshot"], snapshot: "PlayerSnapshot"):
+        """Build the name search index (incrementally from the previous snapshot's) and the season series"""
+        snapshot.search = SearchIndex.build(snapshot.player_names(), previous.search if previous else None)
+        if snapshot.series is None:
+            snapshot.series = build_tables(snapshot.players_by_id)
+
+    def player_names(self) -> Dict[str, str]:
+        return {player_id: player.get("name", "") for player_id, player in self.players_by_id.items()}
+
+    @property
+    def player_count(self) -> int:
+        return sum(len(players) for players in self.rosters.values())
+
+    def league_teams(self, league: str) -> List[Dict[str, Any]]:
+        return [self.teams[team_id] for team_id in self.teams_by_league.get(league.lower(), [])]
+
+    def players_for(self, player_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """The player of each id, or None where the id is unknown"""
+        return [self.players_by_id.get(player_id) for player_id in player_ids]
+
+    def save_pack(self, path: str):
+        """Write the snapshot as a memory-mappable pack (see ``write_players_pack``)"""
+        write_players_pack(path, self.rosters.items, self.series)
+
+
+def _team_entry(team_id: str, players: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "id": team_id,
+        "name": players[0]["team"],
+        "league": players[0]["league"],
+        "player_count": len(players)
+    }
+
+
+def write_players_pack(path: str, teams: Callable[[], Iterable[Tuple[str, List[Dict[str, Any]]]]],
+                       series: Optional[Dict[str, PlayerSeries]] = None):
+    """Write players as a memory-mappable pack, reading ``teams()`` one team at a time.
+
+    Players are stored team by team as JSON records in a string table;
+    team and position are fixed-width codes per row, and sorted id and
+    position arrays give offset indexes for lookups.
+
+    ``teams()`` yields (team_id, players) and is called once for the rows
+    and once per season table (unless ``series`` is given), so only one
+    team's parsed players are held at a time. The records keep every field
+    verbatim (about the size of the source JSON) and the season series
+    arrays come on top, so the pack is larger than the file it was made
+    from: the trade is one copy in the page cache shared by all workers
+    instead of a parsed copy in each.
+    """
+    team_ids: List[str] = []
+    team_sizes: List[int] = []
+    team_column: List[int] = []
+    ids: List[str] = []
+    names: List[str] = []
+    records: List[str] = []
+    player_positions: List[Optional[str]] = []
+    team_entries: Dict[str, Dict[str, Any]] = {}
+    teams_by_league: Dict[str, List[str]] = {}
+    for team_id, players in teams():
+        team = len(team_ids)
+        team_ids.append(team_id)
+        team_sizes.append(len(players))
+        for player in players:
+            team_column.append(team)
+            ids.append(player.get("id", ""))
+            names.append(player.get("name", ""))
+            player_positions.append(player.get("position"))
+            records.append(json.dumps(player, ensure_ascii=False))
+        if players:
+            team_entries[team_id] = _team_entry(team_id, players)
+            teams_by_league.setdefault(players[0]["league"].lower(), []).append(team_id)
+
+    positions = sorted({position for position in player_positions if position})
+    position_codes = {position: i for i, position in enumerate(positions)}
+    id_bytes = np.array([player_id.encode("utf-8") for player_id in ids], dtype=bytes) \
+        if ids else np.array([], dtype="S1")
+    id_rows = np.argsort(id_bytes, kind="stable").astype(np.int32)
+    position_column = np.array([position_codes.get(position, -1) for position in player_positions], dtype=np.int16)
+    position_rows = np.argsort(position_column, kind="stable").astype(np.int32)
+    position_rows = position_rows[position_column[position_rows] >= 0]
+
+    arrays = {
+        "team": np.array(team_column, dtype=np.int16),
+        "position": position_column,
+        "team_offsets": np.cumsum([0] + team_sizes).astype(np.int64),
+        "id_sorted": id_bytes[id_rows],
+        "id_rows": id_rows,
+        "position_rows": position_rows,
+        "position_offsets": np.searchsorted(position_column[position_rows],
+                                            np.arange(len(positions) + 1)).astype(np.int64),
+    }
+    add_strings(arrays, "names", names)
+    add_strings(arrays, "records", records)
+    del records  # 文字列表にまとめたので、個々の文字列はここで手放す
+    meta = {"team_ids": team_ids, "positions": positions, "teams": team_entries,
+            "teams_by_league": teams_by_league}
+    if series is None:
+        series = build_tables(lambda: ((player.get("id", ""), player)
+                                       for _, players in teams() for player in players))
+    for table, table_series in series.items():
+        table_series.add_to_pack(arrays, meta, table)
+    write_pack(path, arrays, meta)
+
+
+class _Records:
+    """Player records of a pack, decoded from JSON only when a row is read"""
+
+    def __init__(self, pack: Pack):
+        self.table = StringTable.open(pack, "records")
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return loads(self.table.raw(i))
+
+    def rows(self, index: Any) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in index]
+
+
+class _Rosters(Mapping):
+    """team_id -> players, read from the team's contiguous block of rows"""
+
+    def __init__(self, records: _Records, team_ids: List[str], offsets: np.ndarray):
+        self.records = records
+        self.team_index = {team_id: i for i, team_id in enumerate(team_ids)}
+        self.offsets = offsets.tolist()
+
+    def __getitem__(self, team_id: str) -> List[Dict[str, Any]]:
+        i = self.team_index[team_id]
+        return self.records.rows(range(self.offsets[i], self.offsets[i + 1]))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.team_index)
+
+    def __len__(self) -> int:
+        return len(self.team_index)
+
+
+class _PlayersById(Mapping):
+    """player_id -> player via binary search over the sorted id column"""
+
+    def __init__(self, records: _Records, id_sorted: np.ndarray, id_rows: np.ndarray):
+        self.records = records
+        self.id_sorted = id_sorted
+        self.id_rows = id_rows
+
+    def _row(self, player_id: str) -> Optional[int]:
+        key = player_id.encode("utf-8")
+        i = int(np.searchsorted(self.id_sorted, key))
+        if i < len(self.id_sorted) and self.id_sorted[i] == key:
+            # 同じIDが複数あれば安定ソートで先頭に来る最初の行を使う
+            return int(self.id_rows[i])
+        return None
+
+    def __getitem__(self, player_id: str) -> Dict[str, Any]:
+        row = self._row(player_id)
+        if row is None:
+            raise KeyError(player_id)
+        return self.records.row(row)
+
+    def __contains__(self, player_id: object) -> bool:
+        return isinstance(player_id, str) and self._row(player_id) is not None
+
+    def rows_for(self, player_ids: List[str]) -> List[Optional[int]]:
+        """Record row of each id (None if unknown) with one vectorized binary search"""
+        if not player_ids or not len(self.id_sorted):
+            return [None] * len(player_ids)
+        keys = np.array([player_id.encode("utf-8") for player_id in player_ids])
+        i = np.searchsorted(self.id_sorted, keys)
+        found = i < len(self.id_sorted)
+        found[found] = self.id_sorted[i[found]] == keys[found]
+        rows = np.where(found, self.id_rows[np.minimum(i, len(self.id_sorted) - 1)], -1).tolist()
+        return [row if row >= 0 else None for row in rows]
+
+    def __iter__(self) -> Iterator[str]:
+        previous = None
+        for key in self.id_sorted.tolist():
+            if key != previous:
+                yield key.decode("utf-8")
+            previous = key
+
+    def __len__(self) -> int:
+        return len(np.unique(self.id_sorted))
+
+
+class _PlayersByPosition(Mapping):
+    """position -> players, from the position-sorted row index"""
+
+    def __init__(self, records: _Records, positions: List[str], rows: np.ndarray, offsets: np.ndarray):
+        self.records = records
+        self.positions = {position: i for i, position in enumerate(positions)}
+        self.rows = rows
+        self.offsets = offsets.tolist()
+
+    def __getitem__(self, position: str) -> List[Dict[str, Any]]:
+        i = self.positions[position]
+        return self.records.rows(self.rows[self.offsets[i]:self.offsets[i + 1]].tolist())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.positions)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class PackedPlayerSnapshot(PlayerSnapshot):
+    """A PlayerSnapshot read through a memory-mapped pack.
+
+    ``rosters``, ``players_by_id`` and ``players_by_position`` are read-only
+    mappings that decode just the rows a request touches; the pack pages
+    are shared by every worker process. Only the small team tables and the
+    name search index live in each process; the season series and its
+    aggregates are stored in the pack as well.
+    """
+
+    def __init__(self, pack: Pack):
+        self.pack = pack
+        records = _Records(pack)
+        meta = pack.meta
+        self.rosters = _Rosters(records, meta["team_ids"], pack["team_offsets"])
+        self.players_by_id = _PlayersById(records, pack["id_sorted"], pack["id_rows"])
+        self.players_by_position = _PlayersByPosition(records, meta["positions"], pack["position_rows"],
+                                                      pack["position_offsets"])
+        self.teams = meta["teams"]
+        self.teams_by_league = meta["teams_by_league"]
+        self.search = SearchIndex.empty()
+        self.series = tables_from_pack(pack)
+        self._names = StringTable.open(pack, "names")
+
+    def player_names(self) -> Dict[str, str]:
+        names = {}
+        for i, row in zip(self.players_by_id.id_sorted.tolist(), self.players_by_id.id_rows.tolist()):
+            names.setdefault(i.decode("utf-8"), self._names[row])
+        return names
+
+    @property
+    def player_count(self) -> int:
+        return len(self.pack["team"])
+
+    def players_for(self, player_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        records = self.players_by_id.records
+        return [None if row is None else records.row(row) for row in self.players_by_id.rows_for(player_ids)]
@@ -0,0 +1,89 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from columnar import StatsTable
+
+# 成績表の「チーム」列の表記からリーグを引くための対応表
+LEAGUE_TEAMS = {
+    "central": {"巨人", "阪神", "DeNA", "広島", "ヤクルト", "中日",
+                "読売ジャイアンツ", "阪神タイガース", "横浜DeNAベイスターズ", "広島東洋カープ",
+                "東京ヤクルトスワローズ", "中日ドラゴンズ"},
+    "pacific": {"ソフトバンク", "日本ハム", "ロッテ", "楽天", "オリックス", "西武",
+                "福岡ソフトバンクホークス", "北海道日本ハムファイターズ", "千葉ロッテマリーンズ",
+                "東北楽天ゴールデンイーグルス", "オリックス・バファローズ", "埼玉西武ライオンズ"}
+}
+
+TEAM_COLUMN = "チーム"
+PLATE_APPEARANCES_COLUMN = "打席"
+INNINGS_COLUMN = "投球回"
+
+
+class QueryError(ValueError):
+    """A query parameter that does not fit the table (unknown column etc.)"""
+
+
+def _require(table: StatsTable, name: str) -> np.ndarray:
+    if name not in table.arrays:
+        raise QueryError(f"Unknown column: {name}")
+    return table.column(name)
+
+
+def _require_numeric(table: StatsTable, name: str) -> np.ndarray:
+    column = _require(table, name)
+    # 数値以外の表記が混じった列は文字列のまま保持されるので、下限と比較できない
+    if column.dtype.kind not in "iuf":
+        raise QueryError(f"Column is not numeric: {name}")
+    return column
+
+
+def sort_index(values: np.ndarray, index: np.ndarray, descending: bool) -> np.ndarray:
+    """Stable argsort of ``values[index]``; NaN always sorts last"""
+    subset = values[index]
+    if subset.dtype.kind in "US":
+        # 文字列は順位に置き換えて降順でも安定ソートにする
+        subset = np.unique(subset, return_inverse=True)[1].reshape(-1)
+    if descending:
+        subset = -subset
+    return index[np.argsort(subset, kind="stable")]
+
+
+def query_table(table: StatsTable, sort: Optional[str] = None, descending: bool = True,
+                min_pa: Optional[float] = None, min_ip: Optional[float] = None,
+                team: Optional[str] = None, league: Optional[str] = None,
+                offset: int = 0, limit: Optional[int] = None) -> Tuple[int, np.ndarray]:
+    """Filter, sort and page a table with array operations.
+
+    Returns the number of matching rows and the row indexes of the requested page.
+    """
+    if len(table) == 0:
+        return 0, np.arange(0)
+
+    mask = np.ones(len(table), dtype=bool)
+    if min_pa is not None:
+        mask &= _require_numeric(table, PLATE_APPEARANCES_COLUMN) >= min_pa
+    if min_ip is not None:
+        mask &= _require_numeric(table, INNINGS_COLUMN) >= min_ip
+    if team is not None:
+        mask &= _require(table, TEAM_COLUMN) == team
+    if league is not None:
+        if league not in LEAGUE_TEAMS:
+            raise QueryError("Invalid league. Must be 'central' or 'pacific'")
+        mask &= np.isin(_require(table, TEAM_COLUMN), list(LEAGUE_TEAMS[league]))
+
+    index = np.flatnonzero(mask)
+    if sort is not None:
+        index = sort_index(_require(table, sort), index, descending)
+
+    end = None if limit is None else offset + limit
+    return len(index), index[offset:end]
+
+
+def parse_fields(table: StatsTable, fields: Optional[str]) -> Optional[List[str]]:
+    """Turn a comma-separated ``fields`` parameter into a column list"""
+    if not fields:
+        return None
+    columns = [name.strip() for name in fields.split(",") if name.strip()]
+    for name in columns:
+        _require(table, name)
+    return columns
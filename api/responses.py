@@ -0,0 +1,343 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from snapshot import CACHE_TTL, Snapshot, SnapshotCache, snapshot_time
+from telemetry import span
+
+# orjson / brotli はあれば使う（無ければ標準の json / gzip のみ）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 応答に使う圧縮方式（優先順）。圧縮版の ETag には "<etag>-gzip" のように付ける
+CODINGS = ("br", "gzip")
+
+JSON_TYPE = "application/json"
+NDJSON_TYPE = "application/x-ndjson"
+
+# ?format= の共通定義（json か、1行1件の ndjson）
+FORMAT_QUERY = Query(None, pattern="^(json|ndjson)$", description="ndjson streams one row per line")
+
+# これより小さい本文は圧縮しない
+COMPRESS_MIN_BYTES = 1024
+
+# NDJSON で一度に書き出す行数
+STREAM_CHUNK_ROWS = 500
+
+# ブラウザ・CDNはこの秒数だけ再検証せずに使い、その後は ETag で 304 を受け取る
+CACHE_CONTROL = f"public, max-age={int(CACHE_TTL)}, must-revalidate"
+
+_payload_caches: Dict[str, "PayloadCache"] = {}
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def build_body(build: Callable[[], Any]) -> bytes:
+    """``build()`` serialized to JSON, timing the lookup and the serialization separately"""
+    with span("response.build"):
+        value = build()
+    with span("response.serialize"):
+        return dumps(value)
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    with span("response.compress"):
+        if encoding == "br":
+            return brotli.compress(body, quality=5)
+        # mtime=0 にして同じ本文からは常に同じバイト列を作る
+        return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class Payload:
+    """Serialized response body with its compressed variants.
+
+    A variant is compressed the first time it is sent; payloads kept in a
+    PayloadCache are compressed in every encoding up front (``precompress``).
+    """
+
+    def __init__(self, body: bytes, media_type: str = JSON_TYPE, headers: Optional[Dict[str, str]] = None):
+        self.media_type = media_type
+        self.headers = headers or {}
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        # 返せる符号化方式（圧縮するのは選ばれたときだけ）
+        self.encodings = ["identity"]
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.encodings += ["gzip", "br"] if brotli is not None else ["gzip"]
+
+    def body(self, encoding: str) -> bytes:
+        body = self.bodies.get(encoding)
+        if body is None:
+            body = self.bodies[encoding] = _compress(encoding, self.bodies["identity"])
+        return body
+
+    def precompress(self) -> "Payload":
+        for encoding in self.encodings:
+            self.body(encoding)
+        return self
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+def accepted_encodings(request: Request) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def choose_encoding(request: Request, payload: Payload) -> str:
+    accepted = accepted_encodings(request)
+    for coding in CODINGS:
+        if coding in payload.encodings and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+class PayloadCache:
+    """Serialized responses of one snapshot, keyed by endpoint and parameters.
+
+    Entries belong to the snapshot they were built from; when the snapshot
+    cache swaps in a newer snapshot the whole cache is dropped. At most
+    ``max_entries`` payloads are kept (least recently used are evicted).
+    """
+
+    def __init__(self, name: str, snapshots: SnapshotCache, max_entries: int = 256):
+        self.name = name
+        self.snapshots = snapshots
+        self.max_entries = max_entries
+        self._snapshot: Optional[Snapshot] = None
+        self._entries: "OrderedDict[Hashable, Payload]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _payload_caches[name] = self
+
+    def get(self, snapshot: Snapshot, key: Hashable, build: Callable[[], Payload]) -> Payload:
+        with self._lock:
+            if snapshot is self._snapshot:
+                payload = self._entries.get(key)
+                if payload is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+
+        # 直列化と圧縮はロックの外で行う（同時に作られても結果は同じ）。保存するものは全ての符号化方式を先に圧縮しておく
+        payload = build().precompress()
+        with self._lock:
+            self.misses += 1
+            if snapshot is not self._snapshot:
+                if snapshot is not self.snapshots.current:
+                    # 入れ替え前のスナップショットを持っていたリクエストの結果は保存しない
+                    return payload
+                self._snapshot = snapshot
+                self._entries.clear()
+            self._entries[key] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": sum(payload.size for payload in self._entries.values()),
+            }
+
+
+def payload_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.metrics() for name, cache in _payload_caches.items()}
+
+
+def http_date(value) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _identity(snapshots: Iterable[Snapshot]) -> str:
+    return "|".join(f"{s.path}:{s.mtime}" for s in snapshots)
+
+
+def snapshot_version(*snapshots: Snapshot) -> str:
+    """Short id of the snapshots a response was built from; changes whenever any of them is replaced"""
+    return hashlib.sha1(_identity(snapshots).encode("utf-8")).hexdigest()[:16]
+
+
+def snapshot_validators(request: Request, *snapshots: Snapshot, variant: str = "json") -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control for a response built from ``snapshots``.
+
+    The ETag hashes each snapshot's identity (file path and mtime, or store
+    version) with the request path and query, so it is known before any data
+    is read. Last-Modified is the newest snapshot time.
+    """
+    identity = _identity(snapshots)
+    query = "&".join(sorted(request.url.query.split("&")))
+    digest = hashlib.sha1(f"{identity}|{request.url.path}?{query}|{variant}".encode("utf-8")).hexdigest()[:32]
+    validators = {"ETag": f'"{digest}"', "Cache-Control": CACHE_CONTROL}
+    times = [t for t in (snapshot_time(s) for s in snapshots) if t is not None]
+    if times:
+        validators["Last-Modified"] = http_date(max(times))
+    return validators
+
+
+def _matching_etag(header: str, etag: str) -> Optional[str]:
+    """The If-None-Match entry that names ``etag`` or one of its encoded variants"""
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # 付けている符号化方式の接尾辞だけを外し、それ以外は完全一致で比べる
+        if candidate == etag or candidate in [f'"{etag[1:-1]}-{coding}"' for coding in CODINGS]:
+            return candidate
+    return None
+
+
+def _http_date(value: str) -> Optional[datetime]:
+    """An HTTP date as an aware UTC datetime (None if unparsable)"""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    # "-0000" のようにタイムゾーンが不明な日時は naive になるので UTC とみなす
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+def not_modified(request: Request, validators: Dict[str, str]) -> Optional[Response]:
+    """A 304 response when the client's copy is still current, else None"""
+    headers = dict(validators)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        matched = _matching_etag(if_none_match, validators["ETag"])
+        if matched is None:
+            return None
+        headers["ETag"] = matched
+        if matched != validators["ETag"]:
+            headers["Vary"] = "Accept-Encoding"
+    elif "if-modified-since" in request.headers and "Last-Modified" in validators:
+        since = _http_date(request.headers["if-modified-since"])
+        modified = _http_date(validators["Last-Modified"])
+        if since is None or modified is None or modified > since:
+            return None
+    else:
+        return None
+    return Response(status_code=304, headers=headers)
+
+
+def payload_response(request: Request, payload: Payload, validators: Optional[Dict[str, str]] = None) -> Response:
+    """Send the variant of a payload that the client accepts"""
+    encoding = choose_encoding(request, payload)
+    response = Response(content=payload.body(encoding), media_type=payload.media_type, headers=payload.headers)
+    if len(payload.encodings) > 1:
+        response.headers["Vary"] = "Accept-Encoding"
+    for name, value in (validators or {}).items():
+        response.headers[name] = value
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+        if validators:
+            # 符号化ごとに別の表現なので強い ETag も分ける
+            response.headers["ETag"] = f'"{validators["ETag"][1:-1]}-{encoding}"'
+    return response
+
+
+def cached_response(request: Request, cache: PayloadCache, snapshot: Snapshot, key: Hashable,
+                    build: Callable[[], Any], others: Tuple[Snapshot, ...] = ()) -> Response:
+    """Serve ``build()`` as JSON from the payload cache, serializing it only on a miss.
+
+    Conditional requests that still match the snapshot get a 304 without
+    looking at the cache or the data. A body that also reads ``others``
+    (snapshots of other caches) is cached and validated per their identity too.
+    """
+    validators = snapshot_validators(request, snapshot, *others)
+    if others:
+        key = (key, _identity(others))
+    return not_modified(request, validators) or payload_response(
+        request, cache.get(snapshot, key, lambda: Payload(build_body(build))), validators)
+
+
+def json_response(request: Request, build: Callable[[], Any], *snapshots: Snapshot) -> Response:
+    """Uncached JSON response with snapshot validators (for small or per-item bodies)"""
+    validators = snapshot_validators(request, *snapshots)
+    return not_modified(request, validators) or payload_response(request, Payload(build_body(build)), validators)
+
+
+def vary(response: Response, *fields: str) -> Response:
+    """Add ``fields`` to the Vary header of ``response`` (keeping the ones already there)"""
+    present = [field.strip() for field in response.headers.get("vary", "").split(",") if field.strip()]
+    known = {field.lower() for field in present}
+    response.headers["Vary"] = ", ".join(present + [field for field in fields if field.lower() not in known])
+    return response
+
+
+def wants_ndjson(request: Request, format: Optional[str] = None) -> bool:
+    """``?format=ndjson`` or an Accept header that asks for NDJSON
+
+    Routes that negotiate with this send ``Vary: Accept`` (``vary``) on every
+    response, so caches keep the JSON and NDJSON representations apart.
+    """
+    if format is not None:
+        return format == "ndjson"
+    return NDJSON_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_chunks(chunks: Iterable[List[Any]]) -> Iterator[bytes]:
+    for rows in chunks:
+        if rows:
+            yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def ndjson_response(chunks: Iterable[List[Any]], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Stream rows as NDJSON, one chunk of rows at a time.
+
+    ``chunks`` is consumed lazily, so the first rows go out before the rest
+    of the collection has been built or serialized.
+    """
+    return StreamingResponse(_ndjson_chunks(chunks), media_type=NDJSON_TYPE, headers=headers)
+
+
+def streamed_response(request: Request, snapshot: Snapshot, chunks: Callable[[], Iterable[List[Any]]]) -> Response:
+    """NDJSON stream of ``chunks()`` with validators, or a 304 without building anything"""
+    validators = snapshot_validators(request, snapshot, variant="ndjson")
+    return not_modified(request, validators) or ndjson_response(chunks(), validators)
+
+
+def list_chunks(rows: List[Any], size: int = STREAM_CHUNK_ROWS) -> Iterator[List[Any]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
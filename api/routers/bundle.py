@@ -0,0 +1,64 @@
+import asyncio
+import os
+from fastapi import APIRouter, Request
+from typing import Dict, List, Any, Optional
+from datasets import data_service
+from snapshot import Snapshot, snapshot_time
+from responses import cached_response, snapshot_version
+from routers.players import comma_list
+
+router = APIRouter()
+
+service = data_service()
+
+# /bundle の選手一覧に含める項目（fields で変更できる）
+ROSTER_FIELDS = ["id", "name", "number", "position"]
+
+def describe(snapshot: Snapshot) -> Dict[str, Optional[str]]:
+    updated_at = snapshot_time(snapshot)
+    return {
+        "file": os.path.basename(snapshot.path) if snapshot.path else None,
+        "updated_at": updated_at.isoformat() if updated_at else None
+    }
+
+def stats_headers(stats: Any) -> Dict[str, Any]:
+    """成績データの列名・行数とリーダーズの項目名（行そのものは含めない）"""
+    tables: Dict[str, Dict[str, Any]] = {}
+    for key, table in stats.tables.items():
+        section, stats_type = key.split(".", 1)
+        tables.setdefault(section, {})[stats_type] = {"columns": table.columns, "rows": len(table)}
+    return {
+        "season": stats.season,
+        "tables": tables,
+        "leaders": {stats_type: [board["category"] for board in boards]
+                    for stats_type, boards in stats.leaderboards.items()}
+    }
+
+@router.get("/bundle")
+async def get_bundle(request: Request, fields: Optional[str] = None):
+    """ページの表示に必要なチーム・選手一覧・成績データの見出しを1回で返す（fields は選手一覧の項目）
+
+    選手一覧は列名（columns）と値の配列（チームごとの rows）で返す。
+    version は元にしたスナップショットのどれかが替わると変わる。
+    """
+    players, stats, teams = await asyncio.gather(service.players.aget(), service.stats.aget(), service.teams.aget())
+    columns = comma_list(fields) or ROSTER_FIELDS
+
+    def build() -> Dict[str, Any]:
+        data = players.data
+        rosters: Dict[str, List[List[Any]]] = {
+            team_id: [[player.get(column) for column in columns] for player in roster]
+            for team_id, roster in data.rosters.items()
+        }
+        return {
+            "version": snapshot_version(players, stats, teams),
+            "snapshots": {"players": describe(players), "stats": describe(stats), "teams": describe(teams)},
+            "statistics": {"total_players": data.player_count, "teams": len(data.rosters)},
+            "teams": list(data.teams.values()),
+            "leagues": teams.data,
+            "rosters": {"columns": columns, "teams": rosters},
+            "stats": stats_headers(stats.data)
+        }
+
+    return cached_response(request, service.players_payloads, players, ("bundle", tuple(columns)), build,
+                           others=(stats, teams))
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from datasets import data_service
+from events import sse_stream
+
+router = APIRouter()
+
+event_hub = data_service().events
+
+@router.get("/events")
+async def get_events(request: Request):
+    """スナップショット更新の差分を Server-Sent Events で配信（Last-Event-ID で取りこぼし分を再送）"""
+    return StreamingResponse(sse_stream(event_hub, request.headers.get("last-event-id")),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws/events")
+async def websocket_events(websocket: WebSocket):
+    """/events と同じイベントを WebSocket で配信"""
+    await websocket.accept()
+    try:
+        async for event in event_hub.events(websocket.query_params.get("last_event_id")):
+            if event is None:
+                await websocket.send_text('{"kind":"keepalive"}')
+            else:
+                await websocket.send_text(event.text)
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Any, Optional
+import store
+
+# SQLite への問い合わせはブロックするので、ハンドラーは同期関数にしてスレッドプールで実行させる
+router = APIRouter()
+
+def require_store():
+    if not store.store_exists():
+        raise HTTPException(status_code=404, detail="No snapshot store found")
+
+@router.get("/history/snapshots")
+def get_snapshots(kind: Optional[str] = Query(None, pattern="^(players|stats|teams)$"),
+                  limit: int = Query(100, ge=1, le=1000)) -> List[Dict[str, Any]]:
+    """List stored snapshots, newest first"""
+    require_store()
+    return store.list_snapshots(kind, limit)
+
+@router.get("/history/player/{player_id}")
+def get_player_history(player_id: str) -> Dict[str, Any]:
+    """Get a player's per-season statistics across all stored snapshots"""
+    require_store()
+    seasons = store.player_season_stats(player_id)
+    if not seasons:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return {"id": player_id, "seasons": seasons}
+
+@router.get("/history/individual/{stats_type}")
+def get_season_individual_stats(stats_type: str, season: int) -> List[Dict[str, Any]]:
+    """Get individual statistics of any stored season"""
+    require_store()
+    if stats_type not in ["batting", "pitching", "fielding"]:
+        raise HTTPException(status_code=400, detail="Invalid stats type")
+    return store.season_individual_stats(season, stats_type)
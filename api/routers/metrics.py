@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from datasets import data_service
+from snapshot import cache_metrics
+from responses import payload_metrics
+from telemetry import PROMETHEUS_TYPE, render_metrics, request_latency, span_latency, startup
+
+router = APIRouter()
+
+event_hub = data_service().events
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """スナップショットキャッシュのヒット/ミス/リロード回数と直列化済みレスポンスの状況"""
+    return {**cache_metrics(), "payloads": payload_metrics(), "events": event_hub.metrics()}
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus 形式のメトリクス（ルート・処理区間ごとの所要時間、キャッシュと配信の状況、起動時間。ワーカーごとの値）"""
+    caches, payloads, events = cache_metrics(), payload_metrics(), event_hub.metrics()
+    extra = [
+        (f"npb_snapshot_cache_{name}_total", "counter", f"Snapshot cache {name}",
+         {(("cache", cache),): values[name] for cache, values in caches.items()})
+        for name in ("hits", "misses", "reloads", "waits")
+    ] + [
+        (f"npb_payload_cache_{name}_total", "counter", f"Serialized response cache {name}",
+         {(("cache", cache),): values[name] for cache, values in payloads.items()})
+        for name in ("hits", "misses")
+    ] + [
+        ("npb_payload_cache_bytes", "gauge", "Bytes held by the serialized response cache",
+         {(("cache", cache),): values["bytes"] for cache, values in payloads.items()}),
+        ("npb_event_subscribers", "gauge", "Connected SSE / WebSocket clients", {(): events["subscribers"]}),
+        ("npb_events_published_total", "counter", "Snapshot events published", {(): events["published"]}),
+    ] + startup.samples()
+    return Response(render_metrics(extra), media_type=PROMETHEUS_TYPE)
+
+@router.get("/metrics/latency")
+async def get_latency_metrics():
+    """ルート・処理区間ごとの件数と p50/p95/p99（ミリ秒）"""
+    return {"requests": request_latency.summary(), "spans": span_latency.summary()}
+
+@router.get("/metrics/startup")
+async def get_startup_metrics():
+    """このワーカーの起動にかかった時間（モジュールの読み込み・スナップショットの事前読み込み）と最初のリクエストの所要時間"""
+    return startup.summary()
@@ -0,0 +1,243 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
+from typing import Dict, List, Any, Optional
+from datasets import data_service
+from snapshot import snapshot_time
+from players import PlayerSnapshot
+from timeseries import DEFAULT_WINDOW, TABLES, PlayerSeries, SeriesError
+from responses import (FORMAT_QUERY, Payload, build_body, cached_response, json_response, list_chunks,
+                       payload_response, snapshot_version, streamed_response, vary, wants_ndjson)
+from search import readings_available
+from telemetry import span
+
+router = APIRouter()
+
+service = data_service()
+players_cache = service.players
+players_payloads = service.players_payloads
+
+# /players:batchGet で一度に指定できるIDの数
+MAX_BATCH_IDS = 1000
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None
+
+def comma_list(value: Optional[str]) -> List[str]:
+    """カンマ区切りの値（空白と重複を除き、順序は保つ）"""
+    if not value:
+        return []
+    return list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+
+def project(player: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """fields の項目だけを残した選手（id は常に含める。持っていない項目は省く）"""
+    if not fields:
+        return player
+    return {"id": player.get("id", ""), **{field: player[field] for field in fields if field in player}}
+
+async def get_latest_data() -> PlayerSnapshot:
+    """最新のデータファイルを読み込む（キャッシュ済みのものを返す。読み込みはイベントループの外で行う）"""
+    return (await players_cache.aget()).data
+
+@router.get("/teams")
+async def get_teams(request: Request, league: Optional[str] = None):
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    if league:
+        return cached_response(request, players_payloads, snapshot, ("teams", league.lower()),
+                               lambda: data.league_teams(league))
+    return cached_response(request, players_payloads, snapshot, ("teams", None), lambda: list(data.teams.values()))
+
+@router.get("/players")
+async def get_players(request: Request, team_ids: Optional[str] = None, fields: Optional[str] = None):
+    """複数チームの選手を1回で取得（team_ids・fields はカンマ区切り。team_ids を省略すると全チーム）"""
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    teams = comma_list(team_ids) or list(data.rosters)
+    missing = [team_id for team_id in teams if team_id not in data.rosters]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Teams not found: {', '.join(missing)}")
+    columns = comma_list(fields)
+    return cached_response(request, players_payloads, snapshot, ("players_bulk", tuple(teams), tuple(columns)),
+                           lambda: {
+                               "version": snapshot_version(snapshot),
+                               "teams": {team_id: [project(player, columns) for player in data.rosters[team_id]]
+                                         for team_id in teams}
+                           })
+
+@router.post("/players:batchGet")
+async def batch_get_players(body: BatchGetRequest, request: Request):
+    """IDを指定して複数の選手を1回で取得（見つからなかったIDは missing に入る）"""
+    player_ids = list(dict.fromkeys(player_id.strip() for player_id in body.ids if player_id.strip()))
+    if len(player_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})")
+    snapshot = await players_cache.aget()
+
+    def build():
+        players = snapshot.data.players_for(player_ids)
+        return {
+            "version": snapshot_version(snapshot),
+            "players": [project(player, body.fields) for player in players if player is not None],
+            "missing": [player_id for player_id, player in zip(player_ids, players) if player is None]
+        }
+
+    # 本文ごとに内容が変わるので、ETag による 304 や直列化済みの再利用はしない
+    return payload_response(request, Payload(build_body(build)))
+
+@router.get("/players/{team_id}")
+async def get_team_players(team_id: str, request: Request, format: Optional[str] = FORMAT_QUERY):
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    if team_id not in data.rosters:
+        raise HTTPException(status_code=404, detail="Team not found")
+    if wants_ndjson(request, format):
+        return vary(streamed_response(request, snapshot, lambda: list_chunks(data.rosters[team_id])), "Accept")
+    return vary(cached_response(request, players_payloads, snapshot, ("players", team_id),
+                                lambda: data.rosters[team_id]), "Accept")
+
+@router.get("/player/{player_id}")
+async def get_player(player_id: str, request: Request):
+    snapshot = await players_cache.aget()
+    player = snapshot.data.players_by_id.get(player_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return json_response(request, lambda: player, snapshot)
+
+@router.get("/player/{player_id}/percentiles")
+async def get_player_percentiles(player_id: str, request: Request):
+    """選手の成績のリーグ内・ポジション内パーセンタイル（取り込み時に計算済み）"""
+    snapshot = await players_cache.aget()
+    player = snapshot.data.players_by_id.get(player_id)
+    if player is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    stats = await service.stats.aget()
+    return json_response(request, lambda: {
+        "id": player_id,
+        "name": player.get("name", ""),
+        "percentiles": stats.data.percentiles_for(player.get("name", ""), player.get("league", ""))
+    }, snapshot, stats)
+
+# 年度別成績の表（batting / pitching）を選ぶクエリ。省略時は選手のポジションから決める
+TABLE_PATTERN = f"^({'|'.join(TABLES)})$"
+TABLE_QUERY = Query(None, pattern=TABLE_PATTERN)
+
+# この守備位置の選手は投手成績の表を既定にする
+PITCHER_POSITION = "投手"
+
+def table_for(data: PlayerSnapshot, player_ids: List[str], table: Optional[str]) -> str:
+    """指定された表、省略時は全員が投手なら pitching、それ以外は batting"""
+    if table:
+        return table
+    players = [data.players_by_id.get(player_id) for player_id in player_ids]
+    if players and all(player is not None and player.get("position") == PITCHER_POSITION for player in players):
+        return "pitching"
+    return "batting"
+
+def series_of(data: PlayerSnapshot, stats: Optional[str], table: str) -> PlayerSeries:
+    """スナップショットの表ごとの年度別成績（stats の列名を確認してから返す）"""
+    series = (data.series or {}).get(table) or PlayerSeries.empty()
+    try:
+        series.stat_columns(stats)
+    except SeriesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return series
+
+@router.get("/player/{player_id}/trend")
+async def get_player_trend(player_id: str, request: Request, stats: Optional[str] = None,
+                           window: int = Query(DEFAULT_WINDOW, ge=1, le=20), table: Optional[str] = TABLE_QUERY):
+    """選手の年度別成績の推移（移動平均・前年比・通算。stats はカンマ区切りの列名、table は表）"""
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    table = table_for(data, [player_id], table)
+    series = series_of(data, stats, table)
+    player = data.players_by_id.get(player_id)
+    if player is None or player_id not in series.index:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return json_response(request, lambda: {
+        "id": player_id,
+        "name": player.get("name", ""),
+        "table": table,
+        **series.trend(player_id, stats, window)
+    }, snapshot)
+
+@router.get("/compare")
+async def compare_players(request: Request, ids: str = Query(..., min_length=1), stats: Optional[str] = None,
+                          table: Optional[str] = TABLE_QUERY):
+    """複数選手の年度別成績と通算の比較（ids はカンマ区切り、最大20人）"""
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    player_ids = comma_list(ids)
+    if len(player_ids) > 20:
+        raise HTTPException(status_code=400, detail="Too many ids (max 20)")
+    table = table_for(data, player_ids, table)
+    series = series_of(data, stats, table)
+    missing = [player_id for player_id in player_ids if player_id not in series.index]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Players not found: {', '.join(missing)}")
+
+    def build():
+        result = {"table": table, **series.compare(player_ids, stats)}
+        for entry in result["players"]:
+            entry["name"] = data.players_by_id[entry["id"]].get("name", "")
+        return result
+
+    return json_response(request, build, snapshot)
+
+@router.get("/trends/teams")
+async def get_team_trends(request: Request, season: Optional[int] = None, team: Optional[str] = None,
+                          stats: Optional[str] = None, table: str = Query("batting", pattern=TABLE_PATTERN)):
+    """選手の年度別成績を表・所属球団・年度ごとに集計したもの（スナップショットごとに計算済み）"""
+    snapshot = await players_cache.aget()
+    series = series_of(snapshot.data, stats, table)
+    return cached_response(request, players_payloads, snapshot, ("team_trends", table, season, team, stats),
+                           lambda: series.team_seasons(season, team, stats))
+
+@router.get("/search")
+async def search_players(request: Request, q: str = Query(..., min_length=1),
+                         limit: int = Query(10, ge=1, le=100)):
+    """選手名の検索（漢字・ひらがな・カタカナ・ローマ字、全角/半角を区別しない）
+
+    漢字の読みを索引に持たない（pykakasi が無い）ときは X-Search-Readings: unavailable を返す。
+    """
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+
+    def build():
+        results = []
+        with span("search.lookup"):
+            matches = data.search.search(q, limit)
+        for player_id, match in matches:
+            player = data.players_by_id[player_id]
+            results.append({
+                "id": player_id,
+                "name": player.get("name", ""),
+                "team": player.get("team", ""),
+                "league": player.get("league", ""),
+                "position": player.get("position", ""),
+                "number": player.get("number", ""),
+                "match": match
+            })
+        return results
+
+    response = json_response(request, build, snapshot)
+    response.headers["X-Search-Readings"] = "available" if readings_available() else "unavailable"
+    return response
+
+@router.get("/positions/{position}")
+async def get_position_players(position: str, request: Request, format: Optional[str] = FORMAT_QUERY):
+    snapshot = await players_cache.aget()
+    players = snapshot.data.players_by_position.get(position, [])
+    if wants_ndjson(request, format):
+        return vary(streamed_response(request, snapshot, lambda: list_chunks(players)), "Accept")
+    return vary(cached_response(request, players_payloads, snapshot, ("positions", position), lambda: players),
+                "Accept")
+
+@router.get("/statistics")
+async def get_statistics(request: Request):
+    snapshot = await players_cache.aget()
+    data = snapshot.data
+    return json_response(request, lambda: {
+        "total_players": data.player_count,
+        "teams": len(data.rosters),
+        "last_updated": snapshot_time(snapshot).isoformat() if snapshot.path else None
+    }, snapshot)
@@ -1,63 +1,121 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, List, Any
-import json
-import os
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Dict, List, Any, Optional
+from datasets import data_service
+from snapshot import Snapshot, snapshot_time
+from query import QueryError, parse_fields, query_table
+from responses import (FORMAT_QUERY, Payload, build_body, cached_response, json_response, ndjson_response,
+                       not_modified, payload_response, snapshot_validators, vary, wants_ndjson)
+from telemetry import span
 
 router = APIRouter()
 
-def get_latest_stats_file() -> str:
-    """Get the path to the latest stats JSON file"""
-    data_dir = "../data"
-    stats_files = [f for f in os.listdir(data_dir) if f.startswith("npb_stats_")]
-    if not stats_files:
+STATS_TYPES = ["batting", "pitching", "fielding"]
+
+stats_cache = data_service().stats
+stats_payloads = data_service().stats_payloads
+
+async def get_latest_stats() -> Snapshot:
+    """Get the latest stats snapshot (columnar, cached per file, loaded off the event loop)"""
+    snapshot = await stats_cache.aget()
+    if snapshot.path is None:
         raise HTTPException(status_code=404, detail="No statistics data found")
-    return os.path.join(data_dir, sorted(stats_files)[-1])
+    return snapshot
+
+def check_stats_type(stats_type: str):
+    if stats_type not in STATS_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid stats type")
 
 @router.get("/team/{stats_type}")
-async def get_team_stats(stats_type: str) -> List[Dict[str, Any]]:
+async def get_team_stats(stats_type: str, request: Request) -> List[Dict[str, Any]]:
     """Get team statistics for batting/pitching/fielding"""
-    if stats_type not in ["batting", "pitching", "fielding"]:
-        raise HTTPException(status_code=400, detail="Invalid stats type")
-    
-    try:
-        with open(get_latest_stats_file(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data["team"][stats_type]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    check_stats_type(stats_type)
+    snapshot = await get_latest_stats()
+    return cached_response(request, stats_payloads, snapshot, ("team", stats_type),
+                           lambda: snapshot.data.table("team", stats_type).to_rows())
 
 @router.get("/individual/{stats_type}")
-async def get_individual_stats(stats_type: str) -> List[Dict[str, Any]]:
-    """Get individual player statistics for batting/pitching/fielding"""
-    if stats_type not in ["batting", "pitching", "fielding"]:
-        raise HTTPException(status_code=400, detail="Invalid stats type")
-    
-    try:
-        with open(get_latest_stats_file(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data["individual"][stats_type]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_individual_stats(
+    stats_type: str,
+    request: Request,
+    sort: Optional[str] = Query(None, description="Column to sort by, e.g. 打率"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    min_pa: Optional[float] = Query(None, description="Minimum plate appearances (打席)"),
+    min_ip: Optional[float] = Query(None, description="Minimum innings pitched (投球回)"),
+    team: Optional[str] = None,
+    league: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    limit: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = FORMAT_QUERY
+) -> List[Dict[str, Any]]:
+    """Get individual player statistics for batting/pitching/fielding
+
+    Filtering, sorting and paging run on the columnar table; the total number
+    of matching rows is returned in the X-Total-Count header. JSON bodies are
+    cached per parameter combination; NDJSON is streamed in chunks.
+    """
+    check_stats_type(stats_type)
+    snapshot = await get_latest_stats()
+    table = snapshot.data.table("individual", stats_type)
+
+    def run_query():
+        try:
+            columns = parse_fields(table, fields)
+            with span("stats.query"):
+                total, index = query_table(table, sort, order == "desc", min_pa, min_ip,
+                                           team, league, offset, limit)
+        except QueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return columns, total, index
+
+    ndjson = wants_ndjson(request, format)
+    validators = snapshot_validators(request, snapshot, variant="ndjson" if ndjson else "json")
+    cached = not_modified(request, validators)
+    if cached is not None:
+        return vary(cached, "Accept")
+
+    if ndjson:
+        columns, total, index = run_query()
+        return vary(ndjson_response(table.iter_rows(index, columns),
+                                    headers={"X-Total-Count": str(total), **validators}), "Accept")
+
+    def build() -> Payload:
+        columns, total, index = run_query()
+        return Payload(build_body(lambda: table.to_rows(index, columns)), headers={"X-Total-Count": str(total)})
+
+    key = ("individual", stats_type, sort, order, min_pa, min_ip, team, league, fields, limit, offset)
+    return vary(payload_response(request, stats_payloads.get(snapshot, key, build), validators), "Accept")
 
 @router.get("/leaders/{stats_type}")
-async def get_leaders(stats_type: str) -> List[Dict[str, Any]]:
-    """Get statistical leaders for batting/pitching/fielding"""
-    if stats_type not in ["batting", "pitching", "fielding"]:
-        raise HTTPException(status_code=400, detail="Invalid stats type")
-    
-    try:
-        with open(get_latest_stats_file(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data["leaders"][stats_type]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_leaders(
+    stats_type: str,
+    request: Request,
+    category: Optional[str] = Query(None, description="Only this column, e.g. 本塁打"),
+    source: str = Query("computed", pattern="^(computed|npb)$")
+) -> List[Dict[str, Any]]:
+    """Get statistical leaders for batting/pitching/fielding
+
+    By default these are the top-N leaderboards precomputed at ingest for every
+    numeric column of the individual table; ``source=npb`` returns the
+    categories of the scraped NPB leaders page instead.
+    """
+    check_stats_type(stats_type)
+    snapshot = await get_latest_stats()
+
+    def build() -> List[Dict[str, Any]]:
+        stats = snapshot.data
+        if source == "npb":
+            boards = stats.leader_rows(stats_type)
+        else:
+            boards = stats.leaderboards.get(stats_type, [])
+        if category is not None:
+            boards = [board for board in boards if board["category"] == category]
+        return boards
+
+    return cached_response(request, stats_payloads, snapshot, ("leaders", stats_type, category, source), build)
 
 @router.get("/last_updated")
-async def get_last_updated() -> Dict[str, str]:
+async def get_last_updated(request: Request) -> Dict[str, str]:
     """Get the timestamp of the last statistics update"""
-    try:
-        latest_file = get_latest_stats_file()
-        timestamp = os.path.basename(latest_file).split("_")[2].split(".")[0]
-        dt = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
-        return {"last_updated": dt.isoformat()}
\ No newline at end of file
+    snapshot = await get_latest_stats()
+    return json_response(request, lambda: {"last_updated": snapshot_time(snapshot).isoformat()}, snapshot)
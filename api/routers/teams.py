@@ -1,46 +1,41 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import Dict, List, Any
-import json
-import os
-from datetime import datetime
+from datasets import data_service
+from snapshot import Snapshot, snapshot_time
+from responses import cached_response, json_response
 
 router = APIRouter()
 
-def get_latest_teams_file() -> str:
-    """Get the path to the latest teams JSON file"""
-    data_dir = "../data"
-    team_files = [f for f in os.listdir(data_dir) if f.startswith("npb_teams_")]
-    if not team_files:
-        raise HTTPException(status_code=404, detail="No team data found")
-    return os.path.join(data_dir, sorted(team_files)[-1])
+LEAGUES = ["central", "pacific"]
 
-@router.get("/teams/{league}")
-async def get_teams(league: str) -> List[Dict[str, Any]]:
-    """Get teams by league (central/pacific)"""
-    if league not in ["central", "pacific"]:
-        raise HTTPException(status_code=400, detail="Invalid league. Must be 'central' or 'pacific'")
-    
-    try:
-        with open(get_latest_teams_file(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data[league]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+teams_cache = data_service().teams
+teams_payloads = data_service().teams_payloads
+
+async def get_latest_teams() -> Snapshot:
+    """Get the latest teams snapshot (cached per file, loaded off the event loop)"""
+    snapshot = await teams_cache.aget()
+    if snapshot.path is None:
+        raise HTTPException(status_code=404, detail="No team data found")
+    return snapshot
 
-@router.get("/teams")
-async def get_all_teams() -> Dict[str, List[Dict[str, Any]]]:
-    """Get all teams from both leagues"""
-    try:
-        with open(get_latest_teams_file(), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# /teams/{league} より先に登録する（後だと leagues・last_updated がリーグ名として扱われる）
+@router.get("/teams/leagues")
+async def get_all_teams(request: Request) -> Dict[str, List[Dict[str, Any]]]:
+    """Get all teams from both leagues ({"central": [...], "pacific": [...]})"""
+    snapshot = await get_latest_teams()
+    return cached_response(request, teams_payloads, snapshot, ("leagues",), lambda: snapshot.data)
 
 @router.get("/teams/last_updated")
-async def get_last_updated() -> Dict[str, str]:
+async def get_last_updated(request: Request) -> Dict[str, str]:
     """Get the timestamp of the last team data update"""
-    try:
-        latest_file = get_latest_teams_file()
-        timestamp = os.path.basename(latest_file).split("_")[2].split(".")[0]
-        dt = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
-        return {"last_updated": dt.isoformat()}
\ No newline at end of file
+    snapshot = await get_latest_teams()
+    return json_response(request, lambda: {"last_updated": snapshot_time(snapshot).isoformat()}, snapshot)
+
+@router.get("/teams/{league}")
+async def get_league_teams(league: str, request: Request) -> List[Dict[str, Any]]:
+    """Get teams by league (central/pacific) from the scraped teams page"""
+    if league not in LEAGUES:
+        raise HTTPException(status_code=400, detail="Invalid league. Must be 'central' or 'pacific'")
+    snapshot = await get_latest_teams()
+    return cached_response(request, teams_payloads, snapshot, ("league", league),
+                           lambda: snapshot.data.get(league, []))
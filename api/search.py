@@ -0,0 +1,241 @@
+import functools
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ヘボン式・訓令式のローマ字からひらがなへの対応（長いものから順に照合する）
+ROMAJI = {
+    "kya": "きゃ", "kyu": "きゅ", "kyo": "きょ", "sha": "しゃ", "shu": "しゅ", "sho": "しょ", "she": "しぇ",
+    "sya": "しゃ", "syu": "しゅ", "syo": "しょ", "cha": "ちゃ", "chu": "ちゅ", "cho": "ちょ", "che": "ちぇ",
+    "tya": "ちゃ", "tyu": "ちゅ", "tyo": "ちょ", "nya": "にゃ", "nyu": "にゅ", "nyo": "にょ",
+    "hya": "ひゃ", "hyu": "ひゅ", "hyo": "ひょ", "mya": "みゃ", "myu": "みゅ", "myo": "みょ",
+    "rya": "りゃ", "ryu": "りゅ", "ryo": "りょ", "gya": "ぎゃ", "gyu": "ぎゅ", "gyo": "ぎょ",
+    "bya": "びゃ", "byu": "びゅ", "byo": "びょ", "pya": "ぴゃ", "pyu": "ぴゅ", "pyo": "ぴょ",
+    "jya": "じゃ", "jyu": "じゅ", "jyo": "じょ", "shi": "し", "chi": "ち", "tsu": "つ",
+    "ja": "じゃ", "ju": "じゅ", "jo": "じょ", "je": "じぇ", "ji": "じ", "fa": "ふぁ", "fi": "ふぃ", "fe": "ふぇ",
+    "fo": "ふぉ", "fu": "ふ", "ti": "てぃ", "di": "でぃ", "tu": "つ", "si": "し", "zi": "じ", "hu": "ふ",
+    "va": "ゔぁ", "vi": "ゔぃ", "vu": "ゔ", "ve": "ゔぇ", "vo": "ゔぉ", "wi": "うぃ", "we": "うぇ",
+    "ka": "か", "ki": "き", "ku": "く", "ke": "け", "ko": "こ", "sa": "さ", "su": "す", "se": "せ", "so": "そ",
+    "ta": "た", "te": "て", "to": "と", "na": "な", "ni": "に", "nu": "ぬ", "ne": "ね", "no": "の",
+    "ha": "は", "hi": "ひ", "he": "へ", "ho": "ほ", "ma": "ま", "mi": "み", "mu": "む", "me": "め", "mo": "も",
+    "ya": "や", "yu": "ゆ", "yo": "よ", "ra": "ら", "ri": "り", "ru": "る", "re": "れ", "ro": "ろ",
+    "wa": "わ", "wo": "を", "ga": "が", "gi": "ぎ", "gu": "ぐ", "ge": "げ", "go": "ご",
+    "za": "ざ", "zu": "ず", "ze": "ぜ", "zo": "ぞ", "da": "だ", "de": "で", "do": "ど", "du": "づ",
+    "ba": "ば", "bi": "び", "bu": "ぶ", "be": "べ", "bo": "ぼ", "pa": "ぱ", "pi": "ぴ", "pu": "ぷ", "pe": "ぺ",
+    "po": "ぽ", "la": "ら", "li": "り", "lu": "る", "le": "れ", "lo": "ろ",
+    "a": "あ", "i": "い", "u": "う", "e": "え", "o": "お", "n": "ん",
+}
+_ROMAJI_MAX = max(len(k) for k in ROMAJI)
+
+# 長音の表記ゆれ（「おお」「おう」「ー」、ローマ字の oh/ou）を畳むための規則
+_LONG_VOWELS = [(re.compile(r"([おこそとのほもよろごぞどぼぽょ])[おう]"), r"\1"),
+                (re.compile(r"([うくすつぬふむゆるぐずづぶぷゅ])う"), r"\1"),
+                (re.compile(r"ー"), "")]
+
+MATCH_SCORES = {"exact": 3, "prefix": 2, "substring": 1}
+
+
+def to_hiragana(text: str) -> str:
+    """Fold katakana to hiragana (ァ-ヶ → ぁ-ゖ)"""
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+
+
+def romaji_to_hiragana(text: str) -> str:
+    """Convert Hepburn/Kunrei romaji to hiragana; other characters are kept"""
+    result = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        # 促音（kk, tt, tch ...）
+        if c.isalpha() and c not in "aiueon" and i + 1 < len(text) and (text[i + 1] == c or text[i:i + 3] == "tch"):
+            result.append("っ")
+            i += 1
+            continue
+        if c == "h" and result and result[-1] in "おう":
+            # 「oh」「uh」は長音の表記（Ohtani）
+            i += 1
+            continue
+        if c == "m" and i + 1 < len(text) and text[i + 1] in "bmp":
+            result.append("ん")
+            i += 1
+            continue
+        for length in range(_ROMAJI_MAX, 0, -1):
+            kana = ROMAJI.get(text[i:i + length])
+            if kana is not None:
+                if kana == "ん" and text[i + 1:i + 2] in ("a", "i", "u", "e", "o", "y"):
+                    continue
+                result.append(kana)
+                i += length
+                break
+        else:
+            if c == "'":
+                i += 1
+                continue
+            result.append(c)
+            i += 1
+    return "".join(result)
+
+
+def normalize(text: str) -> str:
+    """NFKC width folding, lower case, no spaces or dots, hiragana, long vowels folded"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[\s・.･]", "", text)
+    text = to_hiragana(text)
+    for pattern, replacement in _LONG_VOWELS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def query_forms(query: str) -> List[str]:
+    """Normalized forms of a query: as typed and, when it has latin letters, read as romaji"""
+    forms = [normalize(query)]
+    base = unicodedata.normalize("NFKC", query).lower()
+    if re.search(r"[a-z]", base):
+        # Ō, û などの長音記号は外す（ラテン文字の結合記号だけを落とし、濁点は残す）
+        latin = "".join(c for c in unicodedata.normalize("NFD", base) if not "\u0300" <= c <= "\u036f")
+        latin = unicodedata.normalize("NFC", latin)
+        forms.append(normalize(romaji_to_hiragana(re.sub(r"[\s・.]", "", latin))))
+    return [form for i, form in enumerate(forms) if form and form not in forms[:i]]
+
+
+def grams(key: str) -> Set[str]:
+    """Single characters and bigrams of an index key"""
+    return set(key) | {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+class SearchIndex:
+    """N-gram index over player names (and their readings when pykakasi is installed).
+
+    Every player has a few normalized keys; postings map each character and
+    bigram of those keys to player ids. A query intersects the postings of
+    its bigrams, checks the remaining candidates by substring and ranks
+    exact > prefix > substring matches.
+    """
+
+    def __init__(self, keys: Dict[str, Tuple[str, ...]], postings: Dict[str, Set[str]],
+                 readings: Dict[str, str]):
+        self.keys = keys
+        self.postings = postings
+        self.readings = readings
+
+    @classmethod
+    def empty(cls) -> "SearchIndex":
+        return cls({}, {}, {})
+
+    @classmethod
+    def build(cls, names: Dict[str, str], previous: Optional["SearchIndex"] = None) -> "SearchIndex":
+        """Index ``names`` (player id -> name), reusing ``previous`` for players whose name did not change.
+
+        Only postings of added, removed or renamed players are copied and
+        changed, so the previous index stays valid for requests still using it.
+        """
+        previous = previous or cls.empty()
+        readings = dict(previous.readings)
+        keys = {}
+        for player_id, name in names.items():
+            if name not in readings:
+                readings[name] = _reading(name)
+            keys[player_id] = _keys(name, readings[name])
+
+        postings = dict(previous.postings)
+        copied: Set[str] = set()
+
+        def change(gram: str) -> Set[str]:
+            if gram not in copied:
+                postings[gram] = set(postings.get(gram, ()))
+                copied.add(gram)
+            return postings[gram]
+
+        for player_id in previous.keys.keys() - keys.keys():
+            for gram in _key_grams(previous.keys[player_id]):
+                change(gram).discard(player_id)
+        for player_id, player_keys in keys.items():
+            old_keys = previous.keys.get(player_id)
+            if old_keys == player_keys:
+                continue
+            old_grams = _key_grams(old_keys) if old_keys else set()
+            new_grams = _key_grams(player_keys)
+            for gram in old_grams - new_grams:
+                change(gram).discard(player_id)
+            for gram in new_grams - old_grams:
+                change(gram).add(player_id)
+        for gram in copied:
+            if not postings[gram]:
+                del postings[gram]
+
+        used_names = set(names.values())
+        return cls(keys, postings, {name: readings[name] for name in used_names})
+
+    def _candidates(self, form: str) -> Set[str]:
+        query_grams = [form[i:i + 2] for i in range(len(form) - 1)] or [form]
+        lists = sorted((self.postings.get(gram, set()) for gram in set(query_grams)), key=len)
+        if not lists or not lists[0]:
+            return set()
+        return set(lists[0]).intersection(*lists[1:])
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """Ranked (player_id, match) pairs for a query"""
+        best: Dict[str, Tuple[int, int]] = {}
+        for form in query_forms(query):
+            for player_id in self._candidates(form):
+                for key in self.keys[player_id]:
+                    if key == form:
+                        match = "exact"
+                    elif key.startswith(form):
+                        match = "prefix"
+                    elif form in key:
+                        match = "substring"
+                    else:
+                        continue
+                    rank = (MATCH_SCORES[match], -len(key))
+                    if player_id not in best or rank > best[player_id]:
+                        best[player_id] = rank
+        ordered = sorted(best.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        names = {score: match for match, score in MATCH_SCORES.items()}
+        return [(player_id, names[rank[0]]) for player_id, rank in ordered[:limit]]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _keys(name: str, reading: str) -> Tuple[str, ...]:
+    keys = [normalize(name)]
+    if reading:
+        keys.append(normalize(reading))
+    return tuple(key for i, key in enumerate(keys) if key and key not in keys[:i])
+
+
+def _key_grams(keys: Iterable[str]) -> Set[str]:
+    result: Set[str] = set()
+    for key in keys:
+        result |= grams(key)
+    return result
+
+
+# 漢字の読みは pykakasi があれば索引に加える（無ければ表記とカナのみで検索）。
+# 辞書の読み込みが重いので、索引を作るときに初めて import する
+@functools.lru_cache(maxsize=None)
+def _kakasi() -> Optional[Any]:
+    try:
+        import pykakasi
+    except ImportError:
+        logger.warning("pykakasi is not installed: kana/romaji queries will not match kanji names "
+                       "(pip install -r requirements.txt)")
+        return None
+    return pykakasi.kakasi()
+
+
+def readings_available() -> bool:
+    """Whether names are indexed with their kana readings (pykakasi is installed)"""
+    return _kakasi() is not None
+
+
+def _reading(name: str) -> str:
+    """Hiragana reading of a name (empty without pykakasi)"""
+    kakasi = _kakasi() if name else None
+    if kakasi is None:
+        return ""
+    return "".join(item["hira"] for item in kakasi.convert(name))
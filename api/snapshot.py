@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# スナップショットの置き場所（既定はリポジトリ直下の data。起動したディレクトリには依存しない）
+DATA_DIR = os.path.abspath(os.environ.get("NPB_DATA_DIR") or
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data"))
+
+# スナップショットとして扱う拡張子（書き込み途中の *.tmp は含めない）
+SNAPSHOT_SUFFIXES = (".json", ".ndjson")
+
+# 新しいファイルの有無を確認する間隔（秒）
+CACHE_TTL = float(os.environ.get("NPB_CACHE_TTL", "5"))
+
+_caches: Dict[str, "SnapshotCache"] = {}
+
+# ファイルの走査・読み込みはイベントループの外のこのスレッドで行う
+_loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="snapshot-loader")
+
+
+def load_json(path: str) -> Any:
+    """Read a JSON snapshot file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One loaded data file. Handlers keep a reference for the whole request."""
+    path: Optional[str]
+    mtime: Optional[float]
+    data: Any
+
+
+class DirectorySource:
+    """Latest ``<prefix>*<suffix>`` file in the data directory"""
+
+    def __init__(self, prefix: str, data_dir: str = DATA_DIR,
+                 suffix: Union[str, Tuple[str, ...]] = SNAPSHOT_SUFFIXES):
+        self.prefix = prefix
+        self.data_dir = data_dir
+        self.suffix = suffix
+
+    def stamp(self, current: Optional[Snapshot]) -> Any:
+        """Cheap change marker: directory mtime plus the current file's mtime"""
+        return _mtime(self.data_dir), _mtime(current.path) if current and current.path else None
+
+    def latest(self) -> Tuple[Optional[str], Optional[float]]:
+        if not os.path.exists(self.data_dir):
+            return None, None
+        files = [f for f in os.listdir(self.data_dir) if f.startswith(self.prefix) and f.endswith(self.suffix)]
+        if not files:
+            return None, None
+        latest = max(files, key=lambda x: os.path.getctime(os.path.join(self.data_dir, x)))
+        path = os.path.join(self.data_dir, latest)
+        return path, _mtime(path)
+
+
+class SnapshotCache:
+    """Process-wide cache of the latest snapshot with a given prefix.
+
+    The latest snapshot is loaded once. After ``ttl`` seconds the source is
+    checked again (directory mtime, or the newest version in the SQLite
+    store), and the cache is swapped only when a newer snapshot has appeared.
+    The swap replaces a single reference, so requests that already hold the
+    previous ``Snapshot`` keep reading it undisturbed.
+
+    Async handlers use ``aget``: checking and loading run on a loader
+    thread, and concurrent callers share a single in-flight refresh.
+    """
+
+    def __init__(self, prefix: str, loader: Callable[[str], Any] = load_json,
+                 empty: Callable[[], Any] = dict, data_dir: str = DATA_DIR,
+                 ttl: float = CACHE_TTL, suffix: Union[str, Tuple[str, ...]] = SNAPSHOT_SUFFIXES, source: Any = None,
+                 prepare: Optional[Callable[[Any, Any], None]] = None):
+        self.prefix = prefix
+        self.loader = loader
+        self.empty = empty
+        self.prepare = prepare
+        self.source = source or DirectorySource(prefix, data_dir, suffix)
+        self.ttl = ttl
+        self._current: Optional[Snapshot] = None
+        self._stamp: Any = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Optional[Future] = None
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.waits = 0
+        _caches[prefix] = self
+
+    def get(self) -> Snapshot:
+        """Return the current snapshot, loading a newer one if it exists"""
+        current = self._current
+        if current is not None and time.monotonic() - self._checked_at < self.ttl:
+            self.hits += 1
+            return current
+
+        with self._lock:
+            current = self._current
+            if current is not None and time.monotonic() - self._checked_at < self.ttl:
+                self.hits += 1
+                return current
+            snapshot = self._refresh(current)
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    async def aget(self) -> Snapshot:
+        """``get`` for async handlers, without blocking the event loop.
+
+        Once a snapshot is loaded it is returned immediately and an expired
+        TTL only starts a background refresh; the first load is awaited.
+        Either way at most one refresh runs at a time.
+        """
+        current = self._current
+        if current is not None and time.monotonic() - self._checked_at < self.ttl:
+            self.hits += 1
+            return current
+        future = self._start_refresh()
+        if current is not None:
+            self.hits += 1
+            return current
+        self.waits += 1
+        with span("snapshot.wait"):
+            return await asyncio.wrap_future(future)
+
+    def _start_refresh(self) -> Future:
+        """Submit a refresh to the loader thread unless one is already running"""
+        with self._inflight_lock:
+            if self._inflight is None or self._inflight.done():
+                # リクエストのコンテキストで実行し、読み込みの区間が Server-Timing に入るようにする
+                self._inflight = _loader.submit(contextvars.copy_context().run, self.refresh)
+                self._inflight.add_done_callback(self._log_failure)
+            return self._inflight
+
+    def _log_failure(self, future: Future):
+        if future.exception() is not None:
+            logger.error(f"Error loading {self.prefix} snapshot: {str(future.exception())}")
+
+    def refresh(self) -> Snapshot:
+        """Check the source now, regardless of the TTL"""
+        with self._lock:
+            snapshot = self._refresh(self._current)
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    @property
+    def current(self) -> Optional[Snapshot]:
+        """The snapshot most recently loaded, without checking for a newer one"""
+        return self._current
+
+    def _refresh(self, current: Optional[Snapshot]) -> Snapshot:
+        with span("snapshot.check"):
+            stamp = self.source.stamp(current)
+            if current is not None and stamp == self._stamp:
+                self.hits += 1
+                return current
+            path, mtime = self.source.latest()
+        if current is not None and path == current.path and mtime == current.mtime:
+            self._stamp = stamp
+            self.hits += 1
+            return current
+
+        self.misses += 1
+        with span("snapshot.load"):
+            data = self.loader(path) if path else self.empty()
+        if self.prepare is not None:
+            # 新しいデータを公開する前に、前のデータを元にした派生データ（索引など）を作る
+            with span("snapshot.prepare"):
+                self.prepare(current.data if current is not None else None, data)
+        snapshot = Snapshot(path=path, mtime=mtime, data=data)
+        if current is not None:
+            self.reloads += 1
+        self._current = snapshot
+        # 次回の確認で新しいスナップショットを基準に一度だけ再走査する
+        self._stamp = None
+        return snapshot
+
+    def metrics(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "waits": self.waits,
+            "file": os.path.basename(current.path) if current and current.path else None,
+        }
+
+
+def cache_metrics() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss/reload counters of every snapshot cache in this process"""
+    return {prefix.rstrip("_"): cache.metrics() for prefix, cache in _caches.items()}
+
+
+def snapshot_time(snapshot: Snapshot) -> Optional[datetime]:
+    """When a snapshot was taken: the npb_*_YYYYmmdd_HHMMSS name if present, else its mtime"""
+    if snapshot.path is None:
+        return None
+    stem = os.path.splitext(os.path.basename(snapshot.path))[0]
+    try:
+        return datetime.strptime("_".join(stem.split("_")[-2:]), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return datetime.fromtimestamp(snapshot.mtime) if snapshot.mtime else None
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,171 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from columnar import StatsTable
+from leaderboards import PLAYER_COLUMN, build_derived, name_key, team_leagues
+from packfile import USE_PACKS, Pack, pack_is_fresh, pack_path, write_pack
+from query import TEAM_COLUMN
+from snapshot import load_json
+from store import is_store_locator, read_stats
+
+logger = logging.getLogger(__name__)
+
+
+class StatsSnapshot:
+    """All tables of one npb_stats_*.json in columnar form.
+
+    Leaderboards and percentile ranks are computed once at ingest
+    (``build_derived``) and stored with the tables, so requests only look
+    them up.
+    """
+
+    SECTIONS = ("team", "individual")
+
+    def __init__(self, tables: Dict[str, StatsTable], leaders: Dict[str, List[Tuple[str, StatsTable]]],
+                 season: Optional[int] = None, errors: Optional[List[Dict[str, Any]]] = None,
+                 derived: Optional[Dict[str, np.ndarray]] = None):
+        self.tables = tables
+        self.leaders = leaders
+        self.season = season
+        self.errors = errors or []
+        if derived is None:
+            individual = {key.split(".", 1)[1]: table for key, table in tables.items()
+                          if key.startswith("individual.")}
+            derived = build_derived(individual, tables.get("team.batting"))
+        self.derived = derived
+        self.leaderboards: Dict[str, List[Dict[str, Any]]] = {}
+        self.player_percentiles: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        self._materialize()
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "StatsSnapshot":
+        tables = {}
+        for section in cls.SECTIONS:
+            for stats_type, rows in data.get(section, {}).items():
+                tables[f"{section}.{stats_type}"] = StatsTable.from_rows(rows)
+        leaders = {
+            stats_type: [(c["category"], StatsTable.from_rows(c["rankings"])) for c in categories]
+            for stats_type, categories in data.get("leaders", {}).items()
+        }
+        return cls(tables, leaders, data.get("season"), data.get("errors"))
+
+    @classmethod
+    def empty(cls) -> "StatsSnapshot":
+        return cls({}, {})
+
+    @classmethod
+    def load(cls, path: str) -> "StatsSnapshot":
+        """Map the .pack next to a stats JSON file, building it on first use"""
+        if is_store_locator(path):
+            return cls.from_json(read_stats(path))
+        if not USE_PACKS:
+            return cls.from_json(load_json(path))
+        if pack_is_fresh(path):
+            return cls.load_pack(pack_path(path))
+        snapshot = cls.from_json(load_json(path))
+        try:
+            snapshot.save_pack(pack_path(path))
+        except OSError as e:
+            logger.warning(f"Could not write {pack_path(path)}: {e}")
+            return snapshot
+        # 以降はマップした配列を使い、ワーカー間でページを共有する
+        return cls.load_pack(pack_path(path))
+
+    def table(self, section: str, stats_type: str) -> StatsTable:
+        return self.tables.get(f"{section}.{stats_type}") or StatsTable([], [], [])
+
+    def leader_rows(self, stats_type: str) -> List[Dict[str, Any]]:
+        """Leader categories as published on the NPB leaders page"""
+        return [{"category": category, "rankings": table.to_rows()}
+                for category, table in self.leaders.get(stats_type, [])]
+
+    def _materialize(self):
+        """Turn the derived arrays into the dicts served by the API"""
+        for key, index in self.derived.items():
+            kind, stats_type, *rest = key.split("/")
+            if kind != "board":
+                continue
+            column = rest[0]
+            table = self.table("individual", stats_type)
+            values = table.column(column)[index]
+            rows = table.to_rows(index, [PLAYER_COLUMN, TEAM_COLUMN, column])
+            # 同じ値は同順位にする（1, 2, 2, 4 ...）
+            rank = 0
+            for i, row in enumerate(rows):
+                if i == 0 or values[i] != values[i - 1]:
+                    rank = i + 1
+                rows[i] = {"順位": rank, **row}
+            self.leaderboards.setdefault(stats_type, []).append({"category": column, "rankings": rows})
+
+        for key, table in self.tables.items():
+            section, stats_type = key.split(".", 1)
+            if section != "individual" or f"position/{stats_type}" not in self.derived:
+                continue
+            positions = self.derived[f"position/{stats_type}"].tolist()
+            leagues = team_leagues(table).tolist()
+            columns = [c for c in table.columns if f"pct/{stats_type}/league/{c}" in self.derived]
+            by_league = {c: self.derived[f"pct/{stats_type}/league/{c}"].tolist() for c in columns}
+            by_position = {c: self.derived[f"pct/{stats_type}/position/{c}"].tolist() for c in columns}
+            entries = {}
+            for i, name in enumerate(table.column(PLAYER_COLUMN).tolist()):
+                entries[(name_key(name), leagues[i])] = {
+                    "team": table.column(TEAM_COLUMN)[i].item(),
+                    "position": positions[i],
+                    "league": {c: _round(by_league[c][i]) for c in columns},
+                    "position_group": {c: _round(by_position[c][i]) for c in columns}
+                }
+            self.player_percentiles[stats_type] = entries
+
+    def percentiles_for(self, name: str, league: str) -> Dict[str, Any]:
+        """Percentile ranks of one player in every individual table they appear in"""
+        key = (name_key(name), league.lower())
+        return {stats_type: entries[key] for stats_type, entries in self.player_percentiles.items()
+                if key in entries}
+
+    def save_pack(self, path: str):
+        """Write every column, leader table and derived array to a memory-mappable pack"""
+        arrays = {}
+        meta = {"season": self.season, "errors": self.errors, "tables": {}, "leaders": {},
+                "derived": list(self.derived)}
+
+        def add(key: str, table: StatsTable):
+            meta["tables"][key] = {"columns": table.columns, "kinds": [table.kinds[c] for c in table.columns]}
+            for i, name in enumerate(table.columns):
+                arrays[f"{key}.{i}"] = table.arrays[name]
+
+        for key, table in self.tables.items():
+            add(key, table)
+        for stats_type, categories in self.leaders.items():
+            meta["leaders"][stats_type] = []
+            for i, (category, table) in enumerate(categories):
+                key = f"leaders.{stats_type}.{i}"
+                add(key, table)
+                meta["leaders"][stats_type].append({"category": category, "key": key})
+        for i, key in enumerate(self.derived):
+            arrays[f"derived.{i}"] = self.derived[key]
+        write_pack(path, arrays, meta)
+
+    @classmethod
+    def load_pack(cls, path: str) -> "StatsSnapshot":
+        """Wrap the columns of a pack without copying (read-only arrays over the mapping)"""
+        pack = Pack(path)
+        meta = pack.meta
+
+        def table(key: str) -> StatsTable:
+            spec = meta["tables"][key]
+            arrays = [pack[f"{key}.{i}"] for i in range(len(spec["columns"]))]
+            return StatsTable(spec["columns"], arrays, spec["kinds"])
+
+        tables = {key: table(key) for key in meta["tables"] if not key.startswith("leaders.")}
+        leaders = {
+            stats_type: [(c["category"], table(c["key"])) for c in categories]
+            for stats_type, categories in meta["leaders"].items()
+        }
+        derived = {key: pack[f"derived.{i}"] for i, key in enumerate(meta["derived"])}
+        return cls(tables, leaders, meta.get("season"), meta.get("errors"), derived)
+
+
+def _round(value: float) -> Optional[float]:
+    return None if value != value else round(value, 1)
@@ -0,0 +1,182 @@
+import json
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from snapshot import DATA_DIR, DirectorySource, Snapshot
+
+# スクレイパーが書き込む SQLite ストア（存在すればJSONファイルの代わりに使う）
+DB_PATH = os.environ.get("NPB_DB", os.path.join(DATA_DIR, "npb.db"))
+POOL_SIZE = int(os.environ.get("NPB_DB_POOL", "4"))
+
+# ファイル名の先頭と snapshots.kind の対応
+PREFIX_KINDS = {"npb_players_": "players", "npb_stats_": "stats", "npb_teams_": "teams"}
+
+
+class ConnectionPool:
+    """Fixed-size pool of read-only SQLite connections shared by all handlers"""
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._idle.get()
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+def store_exists() -> bool:
+    return os.path.exists(DB_PATH)
+
+
+class StoreSource:
+    """Latest snapshot of one kind in the SQLite store.
+
+    Snapshots are addressed as ``<db path>#<version>``.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def stamp(self, current: Optional[Snapshot]) -> Any:
+        with pool.connection() as conn:
+            return conn.execute("SELECT MAX(version) FROM snapshots WHERE kind = ?", (self.kind,)).fetchone()[0]
+
+    def latest(self) -> Tuple[Optional[str], Optional[float]]:
+        with pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version, created_at FROM snapshots WHERE kind = ? ORDER BY version DESC LIMIT 1",
+                (self.kind,)).fetchone()
+        if row is None:
+            return None, None
+        return f"{DB_PATH}#{row['version']}", datetime.fromisoformat(row['created_at']).timestamp()
+
+
+class LatestSource:
+    """Newest snapshot of one kind, from the SQLite store or the JSON files.
+
+    Whether the store exists is checked on every staleness check, so a
+    store created after startup is picked up, and a file written with
+    ``--no-db`` after the store's newest snapshot is not hidden by it.
+    """
+
+    def __init__(self, prefix: str):
+        self.store = StoreSource(PREFIX_KINDS[prefix])
+        self.files = DirectorySource(prefix)
+
+    def stamp(self, current: Optional[Snapshot]) -> Any:
+        return self.files.stamp(current), self.store.stamp(current) if store_exists() else None
+
+    def latest(self) -> Tuple[Optional[str], Optional[float]]:
+        path, mtime = self.files.latest()
+        if not store_exists():
+            return path, mtime
+        locator, created_at = self.store.latest()
+        # ストアの created_at は秒単位なので、ファイルは秒が変わるほど新しいときだけ優先する
+        if locator is None or (path is not None and int(mtime) > created_at):
+            return path, mtime
+        return locator, created_at
+
+
+def source_for(prefix: str) -> LatestSource:
+    """The newest snapshot across the SQLite store (when it exists) and the JSON files"""
+    return LatestSource(prefix)
+
+
+def is_store_locator(path: str) -> bool:
+    return "#" in path and path.rsplit("#", 1)[0] == DB_PATH
+
+
+def _version(locator: str) -> int:
+    return int(locator.rsplit("#", 1)[1])
+
+
+def read_players(locator: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Rebuild the team_id -> roster dict of one players snapshot"""
+    rosters: Dict[str, List[Dict[str, Any]]] = {}
+    with pool.connection() as conn:
+        for row in conn.execute("SELECT team_id, data FROM players WHERE snapshot = ? ORDER BY rowid",
+                                (_version(locator),)):
+            rosters.setdefault(row['team_id'], []).append(json.loads(row['data']))
+    return rosters
+
+
+def read_stats(locator: str) -> Dict[str, Any]:
+    """Rebuild the npb_stats_*.json layout of one stats snapshot"""
+    version = _version(locator)
+    with pool.connection() as conn:
+        snapshot = conn.execute("SELECT season, meta FROM snapshots WHERE version = ?", (version,)).fetchone()
+        meta = json.loads(snapshot['meta']) if snapshot['meta'] else {}
+        data = {"season": snapshot['season'], "team": {}, "individual": {}, "leaders": {},
+                "errors": meta.get("errors", [])}
+        for section, table in (("team", "team_stats"), ("individual", "individual_stats")):
+            for row in conn.execute(f"SELECT stats_type, data FROM {table} WHERE snapshot = ? ORDER BY rowid",
+                                    (version,)):
+                data[section].setdefault(row['stats_type'], []).append(json.loads(row['data']))
+        categories: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for row in conn.execute("SELECT stats_type, category_row, category, data FROM leaders "
+                                "WHERE snapshot = ? ORDER BY rowid", (version,)):
+            key = (row['stats_type'], row['category_row'])
+            if key not in categories:
+                categories[key] = {"category": row['category'], "rankings": []}
+                data["leaders"].setdefault(row['stats_type'], []).append(categories[key])
+            categories[key]["rankings"].append(json.loads(row['data']))
+    return data
+
+
+def read_teams(locator: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Rebuild the league -> teams dict of one teams snapshot"""
+    leagues: Dict[str, List[Dict[str, Any]]] = {}
+    with pool.connection() as conn:
+        for row in conn.execute("SELECT league, data FROM teams WHERE snapshot = ? ORDER BY rowid",
+                                (_version(locator),)):
+            leagues.setdefault(row['league'], []).append(json.loads(row['data']))
+    return leagues
+
+
+def list_snapshots(kind: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    with pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT version, kind, season, created_at, source FROM snapshots "
+            "WHERE (? IS NULL OR kind = ?) ORDER BY version DESC LIMIT ?", (kind, kind, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def player_season_stats(player_id: str) -> List[Dict[str, Any]]:
+    """Season rows of a player from the newest snapshot that has each season"""
+    with pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT ps.season, ps.snapshot, ps.data FROM player_stats ps "
+            "JOIN (SELECT season, MAX(snapshot) AS snapshot FROM player_stats WHERE player_id = ? GROUP BY season) latest "
+            "ON ps.season IS latest.season AND ps.snapshot = latest.snapshot "
+            "WHERE ps.player_id = ? ORDER BY ps.season, ps.row", (player_id, player_id)).fetchall()
+    return [dict(json.loads(row['data']), snapshot=row['snapshot']) for row in rows]
+
+
+def season_individual_stats(season: int, stats_type: str) -> List[Dict[str, Any]]:
+    """Individual stats of a past season from the newest snapshot of that season"""
+    with pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT data FROM individual_stats WHERE season = ? AND stats_type = ? AND snapshot = "
+            "(SELECT MAX(snapshot) FROM individual_stats WHERE season = ? AND stats_type = ?) ORDER BY row",
+            (season, stats_type, season, stats_type)).fetchall()
+    return [json.loads(row['data']) for row in rows]
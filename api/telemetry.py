@@ -0,0 +1,342 @@
+import bisect
+import contextvars
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# これより時間のかかったリクエストは処理区間の内訳付きでログに出す（ミリ秒、0 で無効）
+SLOW_REQUEST_MS = float(os.environ.get("NPB_SLOW_MS", "500"))
+
+# N件に1件のリクエストをプロファイルする（0 で無効）
+PROFILE_SAMPLE = int(os.environ.get("NPB_PROFILE_SAMPLE", "0"))
+
+# "1" のときは X-Profile: 1 ヘッダーの付いたリクエストもプロファイルする
+PROFILE_HEADER = os.environ.get("NPB_PROFILE_HEADER", "0") == "1"
+
+# プロファイルの出力先（未指定なら data/profiles。アプリの生成時に決める）
+PROFILE_DIR = os.environ.get("NPB_PROFILE_DIR")
+
+# ヒストグラムのバケット境界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# パーセンタイルの計算に使う直近の観測数（系列ごと）
+RESERVOIR_SIZE = 2048
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# pyinstrument があれば非同期処理も追えるそちらでプロファイルする（無ければ cProfile）。
+# ワーカーの起動を軽くするため、最初にプロファイルするときに import する
+@functools.lru_cache(maxsize=None)
+def _pyinstrument() -> Optional[Tuple[Any, Any]]:
+    """(Profiler, SpeedscopeRenderer) if pyinstrument is installed"""
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:
+        return None
+    return Profiler, SpeedscopeRenderer
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram plus a window of recent samples for quantiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, reservoir: int = RESERVOIR_SIZE):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: deque = deque(maxlen=reservoir)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self.recent.append(seconds)
+
+    def quantiles(self, qs: Iterable[float] = QUANTILES) -> Dict[float, float]:
+        """Nearest-rank quantiles of the recent samples"""
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return {}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        with self._lock:
+            return list(itertools.accumulate(self.counts)), self.count, self.sum
+
+
+class HistogramFamily:
+    """Histograms of one metric name, one per label combination"""
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.series: Dict[Labels, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        key = tuple(zip(self.label_names, values))
+        histogram = self.series.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.series.setdefault(key, Histogram())
+        return histogram
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        quantile_lines = [f"# HELP {self.name}_quantile {self.help} (recent {RESERVOIR_SIZE} samples)",
+                          f"# TYPE {self.name}_quantile gauge"]
+        for key, histogram in sorted(self.series.items()):
+            cumulative, count, total = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', repr(bound)),))} {value}")
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(key)} {count}")
+            for q, value in histogram.quantiles().items():
+                quantile_lines.append(f"{self.name}_quantile{_labels(key + (('quantile', str(q)),))} {value:.6f}")
+        return lines + quantile_lines
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Count and p50/p95/p99 in milliseconds per series (for /metrics/cache style JSON)"""
+        result = {}
+        for key, histogram in sorted(self.series.items()):
+            name = " ".join(value for _, value in key)
+            result[name] = {"count": histogram.count,
+                            **{f"p{int(q * 100)}_ms": round(v * 1000, 3) for q, v in histogram.quantiles().items()}}
+        return result
+
+
+def _labels(pairs: Labels) -> str:
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+request_latency = HistogramFamily("npb_request_duration_seconds", "Time from request to the last response byte",
+                                  ("method", "route", "status"))
+span_latency = HistogramFamily("npb_span_duration_seconds", "Time spent in a named processing step", ("span",))
+
+# リクエスト中に計測した処理区間（遅いリクエストのログと Server-Timing ヘッダーに使う）
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block into npb_span_duration_seconds{span=name} and the current request's breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        span_latency.labels(name).observe(elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+class StartupTimer:
+    """Boot phases of this worker, in seconds since the telemetry module was imported.
+
+    ``main`` imports this module before anything else, so ``imported`` covers
+    loading the application modules, ``warmed`` the snapshot warm-up and
+    ``ready`` the whole boot. The first request served afterwards is kept too.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.warm: Dict[str, float] = {}
+        self.first_request: Optional[Dict[str, Any]] = None
+
+    def mark(self, phase: str):
+        self.phases[phase] = time.perf_counter() - self.started
+
+    def request_done(self, method: str, route: str, seconds: float):
+        if self.first_request is None:
+            self.first_request = {"route": f"{method} {route}", "seconds": seconds,
+                                  "after_start": time.perf_counter() - self.started - seconds}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **{f"{phase}_sec": round(seconds, 3) for phase, seconds in self.phases.items()},
+            "warm_sec": {name: round(seconds, 3) for name, seconds in self.warm.items()},
+            "first_request": None if self.first_request is None else {
+                "route": self.first_request["route"],
+                "ms": round(self.first_request["seconds"] * 1000, 3),
+                "after_start_sec": round(self.first_request["after_start"], 3),
+            },
+        }
+
+    def samples(self) -> List[Tuple[str, str, str, Dict[Labels, float]]]:
+        """Gauges for ``render_metrics``"""
+        extra = [
+            ("npb_startup_seconds", "gauge", "Seconds from worker start to each boot phase",
+             {(("phase", phase),): round(seconds, 6) for phase, seconds in self.phases.items()}),
+            ("npb_warmup_seconds", "gauge", "Seconds spent loading each snapshot at startup",
+             {(("cache", name),): round(seconds, 6) for name, seconds in self.warm.items()}),
+        ]
+        if self.first_request is not None:
+            extra.append(("npb_first_request_seconds", "gauge", "Duration of the first request this worker served",
+                          {(): round(self.first_request["seconds"], 6)}))
+        return extra
+
+
+startup = StartupTimer()
+
+
+def render_metrics(extra: Iterable[Tuple[str, str, str, Dict[Labels, float]]] = ()) -> str:
+    """Prometheus text exposition of the latency histograms and ``extra`` (name, type, help, samples)"""
+    lines = request_latency.render() + span_latency.render()
+    for name, kind, help, samples in extra:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_labels(key)} {value}" for key, value in samples.items()]
+    return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """Profile sampled requests and write flamegraph-ready output to PROFILE_DIR.
+
+    With pyinstrument the output is a speedscope JSON file (open it at
+    https://www.speedscope.app); otherwise a cProfile ``.prof`` file for
+    snakeviz / flameprof. Only one request is profiled at a time.
+    """
+
+    def __init__(self, sample: int = PROFILE_SAMPLE, header: bool = PROFILE_HEADER,
+                 directory: Optional[str] = PROFILE_DIR):
+        self.sample = sample
+        self.header = header
+        self.directory = directory
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return (self.sample > 0 or self.header) and self.directory is not None
+
+    def wanted(self, headers: Dict[bytes, bytes]) -> bool:
+        if self.header and headers.get(b"x-profile") == b"1":
+            return True
+        return self.sample > 0 and next(self._counter) % self.sample == 0
+
+    def start(self) -> Optional[Any]:
+        if not self._busy.acquire(blocking=False):
+            return None
+        pyinstrument = _pyinstrument()
+        try:
+            if pyinstrument is not None:
+                profiler = pyinstrument[0](async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except (RuntimeError, ValueError):
+            # 他のプロファイラが動いている
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler: Any, method: str, path: str) -> Optional[str]:
+        pyinstrument = _pyinstrument()
+        try:
+            if pyinstrument is not None:
+                profiler.stop()
+            else:
+                profiler.disable()
+        finally:
+            self._busy.release()
+        os.makedirs(self.directory, exist_ok=True)
+        stem = f"{time.strftime('%Y%m%d_%H%M%S')}_{method}_{path.strip('/').replace('/', '_') or 'root'}"
+        try:
+            if pyinstrument is not None:
+                filename = os.path.join(self.directory, stem + ".speedscope.json")
+                with open(filename, "w", encoding="utf-8") as f:
+                    f.write(profiler.output(pyinstrument[1]()))
+            else:
+                filename = os.path.join(self.directory, stem + ".prof")
+                profiler.dump_stats(filename)
+        except OSError as e:
+            logger.warning(f"Could not write profile for {method} {path}: {e}")
+            return None
+        logger.info(f"Profiled {method} {path} -> {filename}")
+        return filename
+
+
+class TelemetryMiddleware:
+    """ASGI middleware: per-route latency histograms, slow-request log, Server-Timing and sampled profiles.
+
+    The route label is the path template (``/player/{player_id}``), so
+    histograms do not grow with every id requested. Event streams are not
+    timed, since they stay open for as long as the client listens.
+    """
+
+    def __init__(self, app, slow_ms: float = SLOW_REQUEST_MS, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.profiler = profiler or RequestProfiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+        streaming = False
+        profiler = None
+        if self.profiler.enabled and self.profiler.wanted(dict(scope.get("headers") or [])):
+            profiler = self.profiler.start()
+
+        async def timed_send(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                streaming = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                for name, value in headers)
+                if spans:
+                    timing = ", ".join(f"{name.replace('.', '-')};dur={elapsed * 1000:.2f}" for name, elapsed in spans)
+                    headers.append((b"server-timing", timing.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_spans.reset(token)
+            path = scope.get("path", "")
+            if profiler is not None:
+                self.profiler.stop(profiler, scope.get("method", ""), path)
+            if not streaming:
+                route = scope.get("route")
+                template = getattr(route, "path", None) or "unmatched"
+                request_latency.labels(scope.get("method", ""), template, str(status)).observe(elapsed)
+                startup.request_done(scope.get("method", ""), template, elapsed)
+                if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+                    breakdown = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in spans) or "no spans"
+                    query = scope.get("query_string", b"").decode("latin-1")
+                    logger.warning(f"Slow request {scope.get('method')} {path}{'?' + query if query else ''} "
+                                   f"{status} {elapsed * 1000:.1f} ms ({breakdown})")
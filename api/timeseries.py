@@ -0,0 +1,370 @@
+from collections.abc import Mapping
+from itertools import chain, repeat
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from columnar import INNINGS_COLUMNS, MISSING
+from packfile import Pack, StringTable, add_strings
+
+SEASON_COLUMN = "年度"
+TEAM_SEASON_COLUMN = "所属球団"
+
+# 率の指標は合計・移動平均・チーム集計のたびに構成要素から計算し直す（分子の列, 分母の列, 係数）
+RATE_FORMULAS = {
+    "打率": (("安打",), ("打数",), 1.0),
+    "長打率": (("塁打",), ("打数",), 1.0),
+    "出塁率": (("安打", "四球", "死球"), ("打数", "四球", "死球", "犠飛"), 1.0),
+    "防御率": (("自責点",), ("投球回",), 9.0),
+    "勝率": (("勝利",), ("勝利", "敗北"), 1.0),
+}
+
+# 何シーズン分の移動平均を返すか（既定）
+DEFAULT_WINDOW = 3
+
+# 年度別成績の表の種類。打撃と投手の表は 安打・本塁打 などの同じ列名を別の意味で使う（打った安打と打たれた安打）
+# ので、表ごとに別の系列にし、同じ列構成の行だけを合算する
+TABLES = ("batting", "pitching")
+
+# 投手成績の表にだけある列（行の見出しにどれかがあれば投手成績の行）
+PITCHING_COLUMNS = frozenset({"登板", "投球回", "防御率"})
+
+
+class SeriesError(ValueError):
+    """A trend/compare parameter that does not fit the data (unknown stat etc.)"""
+
+
+def _season(value: Any) -> Optional[int]:
+    value = str(value).strip()
+    return int(value) if value.isdigit() else None
+
+
+def table_of(row: Dict[str, Any]) -> str:
+    """Which profile table a statistics row came from, judged by its headers"""
+    return "pitching" if PITCHING_COLUMNS.intersection(row) else "batting"
+
+
+def _parse_column(name: str, raw: List[Any]) -> Optional[Tuple[np.ndarray, str]]:
+    """One stat over every row as floats (NaN where missing), or None if it is not numeric"""
+    text = np.char.strip(np.array(raw, dtype=str))
+    missing = np.isin(text, list(MISSING))
+    present = text[~missing]
+    if present.size == 0:
+        return None
+    try:
+        numbers = np.array(present.tolist(), dtype=np.float64)
+    except ValueError:
+        return None
+    if not np.isfinite(numbers).all():
+        return None
+    if name in INNINGS_COLUMNS:
+        # 「123.1」は 123回1/3
+        whole = np.floor(numbers)
+        numbers, kind = whole + np.round((numbers - whole) * 10) / 3, "innings"
+    elif name in RATE_FORMULAS or (np.char.find(present, ".") >= 0).any():
+        kind = "rate"
+    else:
+        kind = "count"
+    column = np.full(len(text), np.nan)
+    column[~missing] = numbers
+    return column, kind
+
+
+def _formula_columns(stat_index: Dict[str, int]) -> List[Tuple[int, List[int], List[int], float]]:
+    return [(stat_index[name], [stat_index[c] for c in num], [stat_index[c] for c in den], scale)
+            for name, (num, den, scale) in RATE_FORMULAS.items()
+            if name in stat_index and all(c in stat_index for c in num + den)]
+
+
+def _apply_formulas(formulas: List[Tuple[int, List[int], List[int], float]], result: np.ndarray,
+                    sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Overwrite rate columns of ``result`` with numerator / denominator of the summed components"""
+    for k, num, den, scale in formulas:
+        numerator = sums[..., num].sum(axis=-1)
+        denominator = sums[..., den].sum(axis=-1)
+        complete = (counts[..., num] > 0).all(axis=-1) & (counts[..., den] > 0).all(axis=-1) & (denominator > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = numerator / denominator * scale
+        result[..., k] = np.where(complete, rate, result[..., k])
+    return result
+
+
+class PlayerSeries:
+    """Every player's per-season statistics as one (player, season, stat) float array.
+
+    Built once per players snapshot from the ``statistics`` rows of each
+    player (missing values are NaN). Counting stats are summed and rate
+    stats are recomputed from their components (``RATE_FORMULAS``) when
+    seasons, windows or teams are combined; other rates are averaged.
+    Career totals and team/season aggregates are computed at build time.
+    """
+
+    def __init__(self, player_ids: List[str], seasons: np.ndarray, stats: List[str], kinds: List[str],
+                 values: np.ndarray, teams: np.ndarray, team_names: List[str],
+                 career: Optional[np.ndarray] = None, group_keys: Optional[np.ndarray] = None,
+                 group_values: Optional[np.ndarray] = None):
+        self.player_ids = player_ids
+        self.index = {player_id: i for i, player_id in enumerate(player_ids)}
+        self.seasons = seasons
+        self.stats = stats
+        self.stat_index = {name: k for k, name in enumerate(stats)}
+        self.kinds = kinds
+        self.values = values
+        self.teams = teams
+        self.team_names = team_names
+        self._rates = np.array([kind == "rate" for kind in kinds], dtype=bool)
+        self._formulas = _formula_columns(self.stat_index)
+        self.career = self._reduce(values, axis=1) if career is None else career
+        if group_keys is None:
+            group_keys, group_values = self._team_seasons()
+        self.group_keys = group_keys
+        self.group_values = group_values
+
+    @classmethod
+    def empty(cls) -> "PlayerSeries":
+        return cls([], np.zeros(0, dtype=np.int32), [], [], np.zeros((0, 0, 0)), np.zeros((0, 0), dtype=np.int32), [])
+
+    @classmethod
+    def build(cls, players: Union[Mapping, Iterable[Tuple[str, Dict[str, Any]]]],
+              table: str = "batting") -> "PlayerSeries":
+        """Normalize the ``statistics`` rows of one table (``table_of``) of ``players`` into the array
+
+        ``players`` is id -> player or a stream of (id, player) pairs; only
+        the rows of ``table`` are kept, not the players themselves.
+        """
+        player_ids: List[str] = []
+        seen = set()
+        owners: List[int] = []
+        years: List[int] = []
+        rows: List[Dict[str, str]] = []
+        for player_id, player in (players.items() if isinstance(players, Mapping) else players):
+            # 同じIDが複数回現れた場合は最初のものを使う（players_by_id と同じ）
+            if player_id in seen:
+                continue
+            seen.add(player_id)
+            p = len(player_ids)
+            player_ids.append(player_id)
+            for row in player.get("statistics", []) or []:
+                season = _season(row.get(SEASON_COLUMN, ""))
+                # 「通算」などの行は自前で集計する。もう一方の表の行は混ぜない
+                if season is not None and table_of(row) == table:
+                    owners.append(p)
+                    years.append(season)
+                    rows.append(row)
+
+        seasons, row_seasons = np.unique(np.array(years, dtype=np.int32), return_inverse=True)
+        row_players = np.array(owners, dtype=np.int64)
+        names = [name for name in dict.fromkeys(chain.from_iterable(rows))
+                 if name not in (SEASON_COLUMN, TEAM_SEASON_COLUMN)]
+
+        # 全ての値が数値として読める列だけを対象にする（列ごとにまとめて変換）
+        stats, kinds, columns = [], [], []
+        for name in names:
+            parsed = _parse_column(name, list(map(dict.get, rows, repeat(name), repeat(""))))
+            if parsed is not None:
+                stats.append(name)
+                kinds.append(parsed[1])
+                columns.append(parsed[0])
+
+        shape = (len(player_ids), len(seasons), len(stats))
+        sums = np.zeros(shape)
+        seen = np.zeros(shape, dtype=np.int32)
+        cells = row_players * len(seasons) + row_seasons
+        for k, column in enumerate(columns):
+            present = ~np.isnan(column)
+            # 同じシーズンの複数行（移籍など）は合計する
+            sums[..., k].flat = np.bincount(cells[present], column[present], shape[0] * shape[1])
+            seen[..., k].flat = np.bincount(cells[present], minlength=shape[0] * shape[1])
+        values = np.where(seen > 0, sums, np.nan)
+
+        team_names: List[str] = []
+        team_codes: Dict[str, int] = {}
+        codes = []
+        for row in rows:
+            team = str(row.get(TEAM_SEASON_COLUMN, "")).strip()
+            if team and team not in team_codes:
+                team_codes[team] = len(team_names)
+                team_names.append(team)
+            codes.append(team_codes[team] if team else -1)
+        teams = np.full(shape[:2], -1, dtype=np.int32)
+        codes = np.array(codes, dtype=np.int32)
+        named = codes >= 0
+        teams[row_players[named], row_seasons[named]] = codes[named]
+
+        duplicated = (seen > 1).any(axis=-1)
+        if duplicated.any():
+            # 合計した行の率は構成要素から計算し直す（構成要素が無い率は平均）
+            rates = np.array([kind == "rate" for kind in kinds], dtype=bool)
+            merged = np.where(rates & (seen > 1), values / np.maximum(seen, 1), values)
+            merged = _apply_formulas(_formula_columns({name: k for k, name in enumerate(stats)}), merged, sums, seen)
+            values = np.where(duplicated[..., None], merged, values)
+        return cls(player_ids, seasons, stats, kinds, values, teams, team_names)
+
+    def _combine(self, sums: np.ndarray, counts: np.ndarray, mean_counts: bool = False) -> np.ndarray:
+        """Aggregate from per-stat sums and value counts: totals (or means) for counts, means for rates,
+        then rates recomputed from their summed components"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        if mean_counts:
+            result = means
+        else:
+            result = np.where(self._rates, means, sums)
+        result = np.where(counts > 0, result, np.nan)
+        return _apply_formulas(self._formulas, result, sums, counts)
+
+    def _reduce(self, values: np.ndarray, axis: int) -> np.ndarray:
+        present = ~np.isnan(values)
+        return self._combine(np.where(present, values, 0.0).sum(axis=axis), present.sum(axis=axis))
+
+    def _team_seasons(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(team, season) keys and their aggregated stats over every player of that team and season"""
+        n_seasons = len(self.seasons)
+        flat = self.values.reshape(self.teams.size, len(self.stats))
+        keys = (self.teams.astype(np.int64) * n_seasons + np.arange(n_seasons)).reshape(-1)
+        valid = self.teams.reshape(-1) >= 0
+        groups, inverse = np.unique(keys[valid], return_inverse=True)
+        rows = flat[valid]
+        present = ~np.isnan(rows)
+        sums = np.zeros((len(groups), len(self.stats)))
+        counts = np.zeros((len(groups), len(self.stats)))
+        for k in range(len(self.stats)):
+            sums[:, k] = np.bincount(inverse, np.where(present[:, k], rows[:, k], 0.0), len(groups))
+            counts[:, k] = np.bincount(inverse[present[:, k]], minlength=len(groups))
+        group_keys = np.stack([groups // max(n_seasons, 1), groups % max(n_seasons, 1)], axis=1).astype(np.int32)
+        return group_keys.reshape(-1, 2), self._combine(sums, counts)
+
+    def rolling(self, values: np.ndarray, window: int) -> np.ndarray:
+        """Moving average over the last ``window`` seasons along the season axis (-2)
+
+        Counting stats are averaged per season played; rates come from the
+        summed components of the window.
+        """
+        present = ~np.isnan(values)
+        shape = list(values.shape)
+        shape[-2] = 1
+        sums = np.concatenate([np.zeros(shape), np.cumsum(np.where(present, values, 0.0), axis=-2)], axis=-2)
+        counts = np.concatenate([np.zeros(shape), np.cumsum(present, axis=-2)], axis=-2)
+        end = np.arange(1, values.shape[-2] + 1)
+        start = np.maximum(0, end - window)
+        window_sums = sums[..., end, :] - sums[..., start, :]
+        window_counts = counts[..., end, :] - counts[..., start, :]
+        result = self._combine(window_sums, window_counts, mean_counts=True)
+        return np.where(present, result, np.nan)
+
+    @staticmethod
+    def deltas(values: np.ndarray) -> np.ndarray:
+        """Change from the previous calendar season (NaN when either season is missing)"""
+        delta = np.full(values.shape, np.nan)
+        delta[..., 1:, :] = values[..., 1:, :] - values[..., :-1, :]
+        return delta
+
+    def stat_columns(self, names: Optional[str]) -> List[int]:
+        if not names:
+            return list(range(len(self.stats)))
+        columns = []
+        for name in (n.strip() for n in names.split(",")):
+            if name and name not in self.stat_index:
+                raise SeriesError(f"Unknown stat: {name}")
+            if name:
+                columns.append(self.stat_index[name])
+        return columns
+
+    def trend(self, player_id: str, stats: Optional[str] = None, window: int = DEFAULT_WINDOW) -> Dict[str, Any]:
+        """Seasons played, per-season values, moving averages, year-over-year changes and career totals"""
+        p = self.index[player_id]
+        columns = self.stat_columns(stats)
+        values = self.values[p]
+        played = np.flatnonzero(~np.isnan(values).all(axis=1))
+        rolling = self.rolling(values, window)
+        delta = self.deltas(values)
+        columns = [k for k in columns if not np.isnan(values[played, k]).all()] if stats is None else columns
+        return {
+            "seasons": self.seasons[played].tolist(),
+            "teams": [self.team_names[t] if t >= 0 else None for t in self.teams[p, played].tolist()],
+            "window": window,
+            "stats": {self.stats[k]: {"values": _jsonable(values[played, k]),
+                                      "rolling": _jsonable(rolling[played, k]),
+                                      "delta": _jsonable(delta[played, k])} for k in columns},
+            "career": {self.stats[k]: _value(self.career[p, k]) for k in columns},
+        }
+
+    def compare(self, player_ids: Sequence[str], stats: Optional[str] = None) -> Dict[str, Any]:
+        """Several players side by side over the union of their seasons"""
+        rows = [self.index[player_id] for player_id in player_ids]
+        columns = self.stat_columns(stats)
+        if stats is None:
+            columns = [k for k in columns if not np.isnan(self.values[rows, :, k]).all()]
+        values = self.values[rows][:, :, columns]
+        played = np.flatnonzero(~np.isnan(values).all(axis=(0, 2))) if rows else np.zeros(0, dtype=np.int64)
+        return {
+            "seasons": self.seasons[played].tolist(),
+            "stats": [self.stats[k] for k in columns],
+            "players": [{
+                "id": player_id,
+                "values": {self.stats[k]: _jsonable(values[i, played, j]) for j, k in enumerate(columns)},
+                "career": {self.stats[k]: _value(self.career[rows[i], k]) for k in columns},
+            } for i, player_id in enumerate(player_ids)],
+        }
+
+    def team_seasons(self, season: Optional[int] = None, team: Optional[str] = None,
+                     stats: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Precomputed team/season aggregates, optionally for one season or team"""
+        columns = self.stat_columns(stats)
+        mask = np.ones(len(self.group_keys), dtype=bool)
+        if season is not None:
+            mask &= self.seasons[self.group_keys[:, 1]] == season
+        if team is not None:
+            code = self.team_names.index(team) if team in self.team_names else -2
+            mask &= self.group_keys[:, 0] == code
+        result = []
+        for g in np.flatnonzero(mask).tolist():
+            t, s = self.group_keys[g].tolist()
+            result.append({"team": self.team_names[t], "season": int(self.seasons[s]),
+                           **{self.stats[k]: _value(self.group_values[g, k]) for k in columns}})
+        return result
+
+    def add_to_pack(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], table: str):
+        """Store the arrays and precomputed aggregates of one table in a players pack"""
+        prefix = f"series.{table}"
+        add_strings(arrays, f"{prefix}.ids", self.player_ids)
+        arrays.update({f"{prefix}.seasons": self.seasons, f"{prefix}.values": self.values,
+                       f"{prefix}.teams": self.teams, f"{prefix}.career": self.career,
+                       f"{prefix}.group_keys": self.group_keys, f"{prefix}.group_values": self.group_values})
+        meta.setdefault("series", {})[table] = {"stats": self.stats, "kinds": self.kinds,
+                                                "team_names": self.team_names}
+
+    @classmethod
+    def from_pack(cls, pack: Pack, table: str) -> Optional["PlayerSeries"]:
+        prefix = f"series.{table}"
+        if f"{prefix}.values" not in pack:
+            return None
+        meta = pack.meta["series"][table]
+        return cls(list(StringTable.open(pack, f"{prefix}.ids")), pack[f"{prefix}.seasons"], meta["stats"],
+                   meta["kinds"], pack[f"{prefix}.values"], pack[f"{prefix}.teams"], meta["team_names"],
+                   pack[f"{prefix}.career"], pack[f"{prefix}.group_keys"], pack[f"{prefix}.group_values"])
+
+
+def build_tables(players: Union[Mapping, Callable[[], Iterable[Tuple[str, Dict[str, Any]]]]]
+                 ) -> Dict[str, PlayerSeries]:
+    """One PlayerSeries per profile table (batting, pitching)
+
+    ``players`` is id -> player, or a function returning a fresh stream of
+    (id, player) pairs, called once per table.
+    """
+    return {table: PlayerSeries.build(players() if callable(players) else players, table) for table in TABLES}
+
+
+def tables_from_pack(pack: Pack) -> Optional[Dict[str, PlayerSeries]]:
+    """The per-table series stored by ``add_to_pack``, or None for a pack written without them"""
+    tables = {table: PlayerSeries.from_pack(pack, table) for table in TABLES}
+    if any(series is None for series in tables.values()):
+        return None
+    return tables
+
+
+def _value(value: float) -> Optional[float]:
+    return None if value != value else round(float(value), 3)
+
+
+def _jsonable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if v != v else round(v, 3) for v in values.tolist()]
@@ -0,0 +1,152 @@
+"""Load-test the API with many concurrent clients while snapshots are replaced.
+
+Starts uvicorn on a temporary data directory filled with synthetic
+snapshots, keeps writing new players snapshots during the run so that
+workers have to reload, and reports throughput and latency percentiles:
+
+    python benchmarks/bench_api_load.py --clients 200 --duration 20
+
+``--app-dir`` points at another checkout's api/ directory to compare
+revisions under the same load.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import TEAMS, make_players, make_stats, write_snapshot  # noqa: E402
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(session: aiohttp.ClientSession, base: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(base + "/") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not start")
+
+async def client(session: aiohttp.ClientSession, base: str, urls: list, deadline: float,
+                 latencies: list, errors: list):
+    rng = random.Random()
+    while time.monotonic() < deadline:
+        url = base + rng.choice(urls)
+        start = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 500:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+async def rotate_snapshots(data_dir: str, players: dict, interval: float, deadline: float) -> int:
+    """Drop a new players snapshot every ``interval`` seconds"""
+    count = 0
+    stamp = int(time.time())
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        count += 1
+        players[TEAMS[0]][0]["number"] = str(count)
+        await asyncio.to_thread(write_snapshot, data_dir, "npb_players_", players, stamp + count)
+    return count
+
+async def run_load(base: str, data_dir: str, players: dict, clients: int, duration: float,
+                   rotate: float) -> dict:
+    urls = ["/teams", "/statistics", "/player/giants000", "/player/hawks010/percentiles"]
+    urls += [f"/players/{team}" for team in TEAMS]
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, base)
+        latencies, errors = [], []
+        deadline = time.monotonic() + duration
+        start = time.perf_counter()
+        rotations = asyncio.create_task(rotate_snapshots(data_dir, players, rotate, deadline))
+        await asyncio.gather(*(client(session, base, urls, deadline, latencies, errors)
+                               for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        rotated = await rotations
+        async with session.get(base + "/metrics/cache") as response:
+            cache = await response.json() if response.status == 200 else None
+
+    latencies.sort()
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "snapshots_written": rotated,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        "cache": cache,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--rotate", type=float, default=1.0, help="seconds between new players snapshots")
+    parser.add_argument("--players-per-team", type=int, default=80)
+    parser.add_argument("--seasons", type=int, default=15, help="statistics rows per player")
+    parser.add_argument("--ttl", type=float, default=0.5, help="NPB_CACHE_TTL for the server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--app-dir", default=os.path.join(ROOT, "api"), help="api/ directory to serve")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data")
+        cwd = os.path.join(tmp, "api")
+        os.makedirs(data_dir)
+        os.makedirs(cwd)
+        players = make_players(args.players_per_team, args.seasons, seed=1)
+        write_snapshot(data_dir, "npb_players_", players, int(time.time()))
+        write_snapshot(data_dir, "npb_stats_", make_stats(), int(time.time()))
+
+        port = free_port()
+        env = dict(os.environ, NPB_CACHE_TTL=str(args.ttl), NPB_DATA_DIR=data_dir,
+                   NPB_DB=os.path.join(data_dir, "none.db"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.abspath(args.app_dir),
+             "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=cwd, env=env)
+        try:
+            result = asyncio.run(run_load(f"http://127.0.0.1:{port}", data_dir, players,
+                                          args.clients, args.duration, args.rotate))
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+    print(f"{result['clients']} clients, {result['requests']} requests, {result['errors']} errors, "
+          f"{result['snapshots_written']} snapshots written")
+    print(f"{result['requests_per_sec']:.1f} req/sec  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+          f"p99 {result['p99_ms']} ms  max {result['max_ms']} ms")
+
+if __name__ == "__main__":
+    main()
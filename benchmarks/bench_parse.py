@@ -0,0 +1,75 @@
+"""Compare HTML parse throughput (pages/sec) for each parse mode.
+
+Parses the saved pages in benchmarks/fixtures inline and through the
+process pool, once per installed BeautifulSoup backend:
+
+    python benchmarks/bench_parse.py --rounds 20 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+
+from parsers import (ParseStage, parse_leaders, parse_player_details,  # noqa: E402
+                     parse_player_list, parse_stats_table, resolve_parser)
+
+PAGES = {
+    "roster.html": parse_player_list,
+    "profile.html": parse_player_details,
+    "stats_team_batting.html": parse_stats_table,
+    "stats_individual_batting.html": parse_stats_table,
+    "stats_individual_pitching.html": parse_stats_table,
+    "stats_individual_fielding.html": parse_stats_table,
+    "leaders_batting.html": parse_leaders,
+}
+
+def load_pages():
+    pages = []
+    for filename, func in PAGES.items():
+        with open(os.path.join(FIXTURES, filename), encoding="utf-8") as f:
+            pages.append((func, f.read()))
+    return pages
+
+async def run_mode(pages, rounds: int, workers: int, parser: str) -> float:
+    stage = ParseStage(workers, parser)
+    try:
+        # プロセス起動のコストは計測から除外する
+        await asyncio.gather(*(stage.run(func, html) for func, html in pages))
+        jobs = pages * rounds
+        start = time.perf_counter()
+        await asyncio.gather(*(stage.run(func, html) for func, html in jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        stage.close()
+    return len(jobs) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="times each fixture page is parsed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    backends = sorted({"html.parser", resolve_parser("lxml")})
+    results = []
+    for backend in backends:
+        for workers in (0, args.workers):
+            rate = asyncio.run(run_mode(pages, args.rounds, workers, backend))
+            results.append({"parser": backend, "workers": workers, "pages_per_sec": round(rate, 1)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        mode = "inline" if r["workers"] == 0 else f"pool x{r['workers']}"
+        print(f"{r['parser']:<12} {mode:<10} {r['pages_per_sec']:>8.1f} pages/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Compare wall time and peak RSS of the team scraper's HTTP path and browser path.
+
+Serves benchmarks/fixtures/teams.html from a local server and runs
+NPBTeamScraper in a child process once per path (``--browser never`` and
+``--browser always``), sampling the RSS of the child and everything it
+starts (Playwright driver, Chromium) while it runs:
+
+    python benchmarks/bench_team_scraper.py --rounds 5
+
+Each child scrapes ``--rounds`` times; the browser path reuses its pooled
+browser after the first round, so cold and warm times are reported
+separately.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+
+def tree_rss_bytes(pid: int) -> int:
+    """RSS of ``pid`` and all its descendants (Linux /proc)"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents[int(entry)] = int(fields[1])
+        except (OSError, IndexError):
+            continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent and child not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            continue
+    return total
+
+async def serve_fixture() -> web.AppRunner:
+    with open(os.path.join(FIXTURES, "teams.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    async def teams(request):
+        return web.Response(text=html, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/teams/", teams)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    return runner
+
+async def measure(url: str, browser: str, rounds: int) -> dict:
+    """Run one child scraper and sample its process tree until it exits"""
+    start = time.perf_counter()
+    child = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--child", url, "--browser", browser, "--rounds", str(rounds),
+        stdout=asyncio.subprocess.PIPE)
+    peak = 0
+    read = asyncio.create_task(child.stdout.read())
+    while child.returncode is None:
+        if sys.platform.startswith("linux"):
+            peak = max(peak, tree_rss_bytes(child.pid))
+        try:
+            await asyncio.wait_for(child.wait(), 0.02)
+        except asyncio.TimeoutError:
+            pass
+    wall = time.perf_counter() - start
+    output = await read
+    result = json.loads(output) if child.returncode == 0 and output else {"error": f"exit {child.returncode}"}
+    return {"path": "browser" if browser == "always" else "http", "wall_sec": round(wall, 3),
+            "peak_rss_mb": round(peak / 2 ** 20, 1) if peak else None, **result}
+
+async def child_main(url: str, browser: str, rounds: int):
+    """One scraper process: import, scrape ``rounds`` times with a shared browser pool, report timings"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    import team_scraper
+
+    team_scraper.NPBTeamScraper.BASE_URL = url
+    if browser == "always" and team_scraper.async_playwright is None:
+        print(json.dumps({"error": "playwright is not installed"}))
+        return
+    pool = team_scraper.shared_browser_pool()
+    times, teams = [], 0
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            async with team_scraper.NPBTeamScraper(browser=browser, browser_pool=pool) as scraper:
+                data = await scraper.scrape_teams()
+            times.append(time.perf_counter() - start)
+            teams = sum(len(t) for t in data.values())
+    finally:
+        await pool.close()
+    print(json.dumps({"teams": teams, "cold_sec": round(times[0], 3),
+                      "warm_sec": round(sum(times[1:]) / len(times[1:]), 4) if len(times) > 1 else None,
+                      "browser_launches": pool.launches}))
+
+async def run(rounds: int, paths: list) -> list:
+    runner = await serve_fixture()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        return [await measure(f"http://127.0.0.1:{port}/teams/", browser, rounds) for browser in paths]
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="scrapes per child process")
+    parser.add_argument("--paths", default="never,always", help="--browser modes to compare")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--browser", default="never", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child_main(args.child, args.browser, args.rounds))
+        return
+
+    results = asyncio.run(run(args.rounds, args.paths.split(",")))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        if "error" in r:
+            print(f"{r['path']:<8} {r['error']}")
+            continue
+        warm = f"{r['warm_sec'] * 1000:.1f} ms" if r["warm_sec"] is not None else "-"
+        print(f"{r['path']:<8} {r['teams']} teams  process {r['wall_sec']:.2f} s  first scrape {r['cold_sec'] * 1000:.1f} ms  "
+              f"later scrapes {warm}  peak RSS {r['peak_rss_mb']} MiB  browser launches {r['browser_launches']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Local stand-in for npb.jp serving the recorded pages, for offline crawl benchmarks.
+
+Routes mirror the URLs the scrapers request:
+
+    /bis/players/?team=<id>          roster (``--players-per-team`` entries)
+    /bis/players/<player_id>.html    profile (``--seasons`` statistics rows)
+    /bis/<season>/stats/<page>.html  recorded stats / leaders pages
+    /teams/                          recorded teams page
+
+Stats pages without a recording of their own (team pitching/fielding,
+pitching/fielding leaders) are served the batting recording of the same
+kind. ``--latency-ms`` delays every response to imitate a remote server:
+
+    python benchmarks/fixture_server.py --port 8765 --players-per-team 70
+"""
+import argparse
+import asyncio
+from typing import Dict, Tuple
+
+from aiohttp import web
+
+from synthetic import PageFactory, read_fixture
+
+# 録画したページ（無い種類は同じ区分の打撃のページで代用する）
+STATS_PAGES = {
+    "idb1t1.html": "stats_team_batting.html",
+    "idp1t1.html": "stats_team_batting.html",
+    "idf1t1.html": "stats_team_batting.html",
+    "idb1i1.html": "stats_individual_batting.html",
+    "idp1i1.html": "stats_individual_pitching.html",
+    "idf1i1.html": "stats_individual_fielding.html",
+    "idb1l1.html": "leaders_batting.html",
+    "idp1l1.html": "leaders_batting.html",
+    "idf1l1.html": "leaders_batting.html",
+}
+
+class FixtureServer:
+    """aiohttp app serving npb.jp-shaped pages; counts the requests and bytes it served"""
+
+    def __init__(self, players_per_team: int = 70, seasons: int = 10, latency_ms: float = 0.0):
+        self.pages = PageFactory(players_per_team, seasons)
+        self.latency = latency_ms / 1000
+        self.stats = {name: read_fixture(fixture) for name, fixture in STATS_PAGES.items()}
+        self.teams = read_fixture("teams.html")
+        self.requests = 0
+        self.bytes = 0
+        self._profiles: Dict[str, str] = {}
+        self._runner = None
+
+    async def _respond(self, body: str) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.bytes += len(body.encode("utf-8"))
+        return web.Response(text=body, content_type="text/html")
+
+    async def roster(self, request: web.Request) -> web.Response:
+        team = request.query.get("team")
+        if not team:
+            raise web.HTTPNotFound()
+        return await self._respond(self.pages.roster(team))
+
+    async def profile(self, request: web.Request) -> web.Response:
+        player_id = request.match_info["player_id"]
+        if player_id not in self._profiles:
+            self._profiles[player_id] = self.pages.profile(player_id)
+        return await self._respond(self._profiles[player_id])
+
+    async def stats_page(self, request: web.Request) -> web.Response:
+        body = self.stats.get(request.match_info["page"])
+        if body is None:
+            raise web.HTTPNotFound()
+        return await self._respond(body)
+
+    async def teams_page(self, request: web.Request) -> web.Response:
+        return await self._respond(self.teams)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/bis/players/", self.roster)
+        app.router.add_get("/bis/players/{player_id}.html", self.profile)
+        app.router.add_get("/bis/{season}/stats/{page}", self.stats_page)
+        app.router.add_get("/teams/", self.teams_page)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving in the running loop; returns the base URL"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = site._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset(self) -> Tuple[int, int]:
+        """Requests and bytes served since the last reset"""
+        counts = (self.requests, self.bytes)
+        self.requests = self.bytes = 0
+        return counts
+
+async def serve(args):
+    server = FixtureServer(args.players_per_team, args.seasons, args.latency_ms)
+    base = await server.start(args.host, args.port)
+    print(f"Serving npb.jp fixtures at {base}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--players-per-team", type=int, default=70)
+    parser.add_argument("--seasons", type=int, default=10, help="statistics rows per profile page")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
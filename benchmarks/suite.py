@@ -0,0 +1,332 @@
+"""Run the offline benchmark suite and compare it with a stored baseline.
+
+Everything runs locally: the scrapers crawl benchmarks/fixture_server.py
+instead of npb.jp, and the API is started with uvicorn on synthetic
+snapshots (benchmarks/synthetic.py). Measured:
+
+    crawl.players.*   NPBScraper over every team roster and profile page
+    crawl.stats.*     NPBStatsScraper over all stats pages of --stats-seasons seasons
+    parse.*           HTML parse rate per backend, inline and in the process pool
+    api.<scale>.*     per endpoint requests/sec and p50/p95/p99 under --clients concurrent clients
+
+Scales are ``<teams>x<players per team>x<seasons>`` (e.g. 12x70x15,
+24x200x50). Results are printed as a table (``--json`` for the full JSON,
+``--output`` to write it). When a baseline exists (``--baseline``, default
+benchmarks/baseline.json) every metric is compared with it and those worse
+by more than ``--tolerance`` are flagged. No baseline is committed since the
+numbers only compare on the machine that produced them; create one first:
+
+    python benchmarks/suite.py --save-baseline     # on the reference revision
+    python benchmarks/suite.py --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+
+from bench_api_load import client, free_port, wait_ready  # noqa: E402
+from bench_parse import load_pages, run_mode  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+from synthetic import make_players, make_stats, write_snapshot  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# 各スケールで計測するエンドポイント（{player} は最初のチームの選手、{team} は最初のチーム）
+API_ENDPOINTS = [
+    "/teams",
+    "/players/{team}",
+    "/players?team_ids={team}&fields=name,number",
+    "/bundle",
+    "/player/{player}",
+    "/player/{player}/trend",
+    "/player/{player}/percentiles",
+    "/compare?ids={player},{other}",
+    "/trends/teams?season=2024",
+    "/positions/投手",
+    "/search?q=選手",
+    "/statistics",
+    "/individual/batting?sort=打率&limit=50",
+    "/leaders/batting",
+]
+
+def metric(value: float, unit: str, better: str) -> Dict[str, Any]:
+    return {"value": value, "unit": unit, "better": better}
+
+async def bench_crawl(players_per_team: int, seasons: int, stats_seasons: int, concurrency: int,
+                      parse_workers: int, latency_ms: float) -> Dict[str, Dict[str, Any]]:
+    """Crawl the fixture server with both scrapers; pages/sec and players/sec"""
+    from scraper import NPBScraper
+    from stats_scraper import NPBStatsScraper
+
+    server = FixtureServer(players_per_team, seasons, latency_ms)
+    base = await server.start()
+    metrics = {}
+    try:
+        class LocalScraper(NPBScraper):
+            BASE_URL = base
+            PLAYERS_URL = base + "/bis/players/"
+
+        class LocalStatsScraper(NPBStatsScraper):
+            BASE_URL = base + "/bis/{season}/stats/"
+
+        start = time.perf_counter()
+        async with LocalScraper(concurrency, concurrency, None, parse_workers) as scraper:
+            players = await scraper.get_all_players()
+        elapsed = time.perf_counter() - start
+        pages, size = server.reset()
+        count = sum(len(roster) for roster in players.values())
+        metrics["crawl.players.pages_per_sec"] = metric(round(pages / elapsed, 1), "pages/s", "higher")
+        metrics["crawl.players.players_per_sec"] = metric(round(count / elapsed, 1), "players/s", "higher")
+        metrics["crawl.players.wall_sec"] = metric(round(elapsed, 3), "s", "lower")
+        metrics["crawl.players.mib_per_sec"] = metric(round(size / 2 ** 20 / elapsed, 2), "MiB/s", "higher")
+
+        seasons_list = list(range(2024 - stats_seasons + 1, 2025))
+        start = time.perf_counter()
+        async with LocalStatsScraper(seasons_list[-1], concurrency, concurrency, None, parse_workers) as scraper:
+            await scraper.get_seasons_stats(seasons_list)
+        elapsed = time.perf_counter() - start
+        pages, _ = server.reset()
+        metrics["crawl.stats.pages_per_sec"] = metric(round(pages / elapsed, 1), "pages/s", "higher")
+        metrics["crawl.stats.wall_sec"] = metric(round(elapsed, 3), "s", "lower")
+    finally:
+        await server.stop()
+    return metrics
+
+def bench_parse(rounds: int, workers: int) -> Dict[str, Dict[str, Any]]:
+    from parsers import resolve_parser
+
+    pages = load_pages()
+    metrics = {}
+    for backend in sorted({"html.parser", resolve_parser("lxml")}):
+        for mode, pool in (("inline", 0), ("pool", workers)):
+            rate = asyncio.run(run_mode(pages, rounds, pool, backend))
+            metrics[f"parse.{backend}.{mode}.pages_per_sec"] = metric(round(rate, 1), "pages/s", "higher")
+    return metrics
+
+async def load_endpoint(session: aiohttp.ClientSession, base: str, path: str, clients: int,
+                        duration: float) -> Optional[Dict[str, Any]]:
+    """Requests/sec and latency percentiles of one endpoint, or None if it does not answer 200"""
+    async with session.get(base + path) as response:
+        await response.read()
+        if response.status != 200:
+            return None
+    latencies: List[float] = []
+    errors: List[Any] = []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(session, base, [path], deadline, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+
+    return {"rps": round(len(latencies) / elapsed, 1), "p50_ms": pct(0.50), "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99), "errors": len(errors)}
+
+async def bench_api_scale(base: str, players: Dict[str, Any], clients: int, duration: float,
+                          started: float) -> Dict[str, Any]:
+    first_team = next(iter(players))
+    roster = players[first_team]
+    values = {"team": first_team, "player": roster[0]["id"], "other": roster[-1]["id"]}
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, base, timeout=300.0)
+        ready = time.perf_counter() - started
+        # 起動時に読み込まないリビジョンでは、最初のリクエストでスナップショットの読み込み（と .pack の作成）が行われる
+        start = time.perf_counter()
+        async with session.get(base + "/statistics") as response:
+            await response.read()
+        first = time.perf_counter() - start
+        results = {"startup_sec": round(ready, 3), "first_request_sec": round(first, 3), "endpoints": {}}
+        async with session.get(base + "/metrics/startup") as response:
+            if response.status == 200:
+                results["server"] = await response.json()
+        for template in API_ENDPOINTS:
+            path = template.format(**values)
+            results["endpoints"][template] = await load_endpoint(session, base, path, clients, duration)
+    return results
+
+def bench_api(scale: str, clients: int, duration: float, workers: int, app_dir: str) -> Dict[str, Dict[str, Any]]:
+    teams, players_per_team, seasons = (int(v) for v in scale.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data")
+        cwd = os.path.join(tmp, "api")
+        os.makedirs(data_dir)
+        os.makedirs(cwd)
+        players = make_players(players_per_team, seasons, seed=1, teams=teams)
+        write_snapshot(data_dir, "npb_players_", players, int(time.time()))
+        write_snapshot(data_dir, "npb_stats_", make_stats(), int(time.time()))
+
+        port = free_port()
+        env = dict(os.environ, NPB_DATA_DIR=data_dir, NPB_DB=os.path.join(data_dir, "none.db"), NPB_SLOW_MS="0")
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.abspath(app_dir),
+             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+            cwd=cwd, env=env)
+        try:
+            results = asyncio.run(bench_api_scale(f"http://127.0.0.1:{port}", players, clients, duration, started))
+        finally:
+            server.terminate()
+            server.wait()
+
+    prefix = f"api.{scale}"
+    metrics = {
+        f"{prefix}.startup_sec": metric(results["startup_sec"], "s", "lower"),
+        f"{prefix}.first_request_sec": metric(results["first_request_sec"], "s", "lower"),
+    }
+    server_startup = results.get("server")
+    if server_startup:
+        # サーバー側で計測した起動の内訳（モジュールの読み込み・スナップショットの事前読み込み）
+        for phase in ("imported", "ready"):
+            if f"{phase}_sec" in server_startup:
+                metrics[f"{prefix}.server.{phase}_sec"] = metric(server_startup[f"{phase}_sec"], "s", "lower")
+        for name, seconds in server_startup.get("warm_sec", {}).items():
+            metrics[f"{prefix}.server.warm.{name}_sec"] = metric(seconds, "s", "lower")
+    for template, result in results["endpoints"].items():
+        if result is None:
+            # このリビジョンには無いエンドポイント
+            continue
+        metrics[f"{prefix}.{template}.rps"] = metric(result["rps"], "req/s", "higher")
+        for name in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"{prefix}.{template}.{name}"] = metric(result[name], "ms", "lower")
+        if result["errors"]:
+            metrics[f"{prefix}.{template}.errors"] = metric(result["errors"], "errors", "lower")
+    return metrics
+
+def compare(metrics: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> Dict[str, Any]:
+    """Relative change of every metric against the baseline; worse than ``tolerance`` is a regression"""
+    changes, regressions, improvements = {}, [], []
+    for name, current in metrics.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"] or current["value"] is None:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        changes[name] = round(change, 4)
+        gain = change if current["better"] == "higher" else -change
+        if gain < -tolerance:
+            regressions.append(name)
+        elif gain > tolerance:
+            improvements.append(name)
+    return {"tolerance": tolerance, "changes": changes, "regressions": regressions, "improvements": improvements,
+            "missing": sorted(set(baseline) - set(metrics))}
+
+def environment() -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                  text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": revision, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def print_table(metrics: Dict[str, Dict[str, Any]], comparison: Optional[Dict[str, Any]]):
+    changes = comparison["changes"] if comparison else {}
+    flagged = set(comparison["regressions"]) if comparison else set()
+    width = max(len(name) for name in metrics) if metrics else 10
+    for name, m in metrics.items():
+        line = f"{name:<{width}}  {m['value']:>10} {m['unit']:<9}"
+        if name in changes:
+            line += f" {changes[name] * 100:+7.1f}%"
+            if name in flagged:
+                line += "  REGRESSION"
+        print(line)
+    if comparison:
+        if comparison["config_mismatch"]:
+            print(f"\nwarning: baseline was run with different {', '.join(comparison['config_mismatch'])}")
+        print(f"\n{len(comparison['regressions'])} regressions, {len(comparison['improvements'])} improvements "
+              f"beyond ±{comparison['tolerance'] * 100:.0f}% against the baseline")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default="crawl,parse,api", help="comma-separated stages to run")
+    parser.add_argument("--quick", action="store_true", help="small sizes and short load (smoke run)")
+    parser.add_argument("--players-per-team", type=int, default=70, help="roster size served to NPBScraper")
+    parser.add_argument("--seasons", type=int, default=10, help="statistics rows per served profile page")
+    parser.add_argument("--stats-seasons", type=int, default=3, help="seasons crawled by NPBStatsScraper")
+    parser.add_argument("--concurrency", type=int, default=16, help="scraper concurrency (no rate limit)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added by the fixture server")
+    parser.add_argument("--parse-workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--parse-rounds", type=int, default=20)
+    parser.add_argument("--scales", default="12x70x1,12x70x15,24x200x50",
+                        help="API data sizes as <teams>x<players per team>x<seasons>")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent API clients")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds of load per endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--app-dir", default=os.path.join(ROOT, "api"), help="api/ directory to serve")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON to compare with (not committed; create it with --save-baseline "
+                             "on the reference revision of this machine)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a metric regressed")
+    parser.add_argument("--output", default=None, help="also write the JSON result to this file")
+    parser.add_argument("--json", action="store_true", help="print the JSON result instead of a table")
+    args = parser.parse_args()
+    if args.quick:
+        args.players_per_team, args.seasons, args.stats_seasons = 20, 5, 1
+        args.parse_rounds, args.scales, args.clients, args.duration = 3, "12x20x5", 10, 0.5
+
+    # スクレイパーの進捗ログは計測の邪魔になるので抑える
+    logging.disable(logging.INFO)
+    stages = args.stages.split(",")
+    metrics: Dict[str, Dict[str, Any]] = {}
+    if "crawl" in stages:
+        metrics.update(asyncio.run(bench_crawl(args.players_per_team, args.seasons, args.stats_seasons,
+                                               args.concurrency, args.parse_workers, args.latency_ms)))
+    if "parse" in stages:
+        metrics.update(bench_parse(args.parse_rounds, args.parse_workers))
+    if "api" in stages:
+        for scale in args.scales.split(","):
+            metrics.update(bench_api(scale, args.clients, args.duration, args.workers, args.app_dir))
+
+    config = {name: value for name, value in vars(args).items()
+              if name not in ("baseline", "save_baseline", "fail_on_regression", "output", "json")}
+    result = {"environment": environment(), "config": config, "metrics": metrics}
+    comparison = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare(metrics, baseline["metrics"], args.tolerance)
+        comparison["baseline"] = {"path": args.baseline, **baseline.get("environment", {})}
+        # 条件の違う実行同士の比較は参考程度にしかならない
+        comparison["config_mismatch"] = sorted(name for name, value in config.items()
+                                               if baseline.get("config", {}).get(name, value) != value)
+        result["comparison"] = comparison
+    elif not args.save_baseline:
+        print(f"note: no baseline at {args.baseline}; run with --save-baseline on the reference revision "
+              f"to create one", file=sys.stderr)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.json:
+        print(text)
+    else:
+        print_table(metrics, comparison)
+    if args.fail_on_regression and comparison and comparison["regressions"]:
+        sys.exit(1)
+    if args.fail_on_regression and comparison is None and not args.save_baseline:
+        # 比較対象が無いまま成功扱いにしない
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
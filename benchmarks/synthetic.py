@@ -0,0 +1,167 @@
+"""Synthetic snapshots and npb.jp pages for the benchmarks.
+
+Players get per-season batting or pitching rows shaped like the profile
+page's statistics table, so the API's season series and percentiles have
+real work to do. Sizes scale from the 12 NPB teams with one season up to
+any number of extra teams, players per team and seasons (1-50 and beyond).
+"""
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+
+from parsers import parse_leaders, parse_stats_table  # noqa: E402
+
+TEAMS = ["giants", "tigers", "baystars", "carp", "swallows", "dragons",
+         "hawks", "fighters", "marines", "eagles", "buffaloes", "lions"]
+LEAGUES = {team: ("Central" if i < 6 else "Pacific") for i, team in enumerate(TEAMS)}
+POSITIONS = ["投手", "捕手", "内野手", "外野手"]
+
+BATTING_COLUMNS = ["年度", "所属球団", "試合", "打席", "打数", "得点", "安打", "二塁打", "三塁打", "本塁打", "塁打",
+                   "打点", "盗塁", "盗塁刺", "犠打", "犠飛", "四球", "死球", "三振", "併殺打", "打率", "長打率", "出塁率"]
+PITCHING_COLUMNS = ["年度", "所属球団", "登板", "勝利", "敗北", "セーブ", "ホールド", "完投", "完封", "投球回",
+                    "打者", "被安打", "被本塁打", "与四球", "奪三振", "失点", "自責点", "防御率", "勝率"]
+
+LAST_SEASON = 2024
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def team_ids(count: int = len(TEAMS)) -> List[str]:
+    """The 12 NPB team ids, then synthetic ``team13``... for larger leagues"""
+    return TEAMS[:count] + [f"team{i + 1}" for i in range(len(TEAMS), count)]
+
+def league_of(team_id: str) -> str:
+    return LEAGUES.get(team_id) or ("Central" if int(team_id[4:]) % 2 else "Pacific")
+
+def _rate(value: float) -> str:
+    return f"{value:.3f}".lstrip("0") if value < 1 else f"{value:.3f}"
+
+def batting_row(rng: random.Random, season: int, team: str) -> Dict[str, str]:
+    pa = rng.randint(1, 650)
+    walks, hbp, sf, sh = rng.randint(0, pa // 8), rng.randint(0, 10), rng.randint(0, 8), rng.randint(0, 10)
+    ab = max(1, pa - walks - hbp - sf - sh)
+    hits = rng.randint(0, ab // 3)
+    doubles, triples = rng.randint(0, hits // 4), rng.randint(0, hits // 20)
+    homers = rng.randint(0, max(0, hits - doubles - triples) // 3)
+    bases = hits + doubles + 2 * triples + 3 * homers
+    row = {"年度": str(season), "所属球団": team, "試合": str(rng.randint(1, 143)), "打席": str(pa),
+           "打数": str(ab), "得点": str(rng.randint(0, 100)), "安打": str(hits), "二塁打": str(doubles),
+           "三塁打": str(triples), "本塁打": str(homers), "塁打": str(bases), "打点": str(rng.randint(0, 110)),
+           "盗塁": str(rng.randint(0, 40)), "盗塁刺": str(rng.randint(0, 10)), "犠打": str(sh), "犠飛": str(sf),
+           "四球": str(walks), "死球": str(hbp), "三振": str(rng.randint(0, pa // 4)),
+           "併殺打": str(rng.randint(0, 20))}
+    row["打率"] = _rate(hits / ab)
+    row["長打率"] = _rate(bases / ab)
+    row["出塁率"] = _rate((hits + walks + hbp) / (ab + walks + hbp + sf))
+    return row
+
+def pitching_row(rng: random.Random, season: int, team: str) -> Dict[str, str]:
+    outs = rng.randint(1, 600)
+    wins, losses = rng.randint(0, 15), rng.randint(0, 12)
+    earned = rng.randint(0, outs // 5)
+    row = {"年度": str(season), "所属球団": team, "登板": str(rng.randint(1, 60)), "勝利": str(wins),
+           "敗北": str(losses), "セーブ": str(rng.randint(0, 30)), "ホールド": str(rng.randint(0, 30)),
+           "完投": str(rng.randint(0, 3)), "完封": str(rng.randint(0, 2)), "投球回": f"{outs // 3}.{outs % 3}",
+           "打者": str(outs + rng.randint(0, outs)), "被安打": str(rng.randint(0, outs // 2)),
+           "被本塁打": str(rng.randint(0, 25)), "与四球": str(rng.randint(0, 70)), "奪三振": str(rng.randint(0, 200)),
+           "失点": str(earned + rng.randint(0, 10)), "自責点": str(earned)}
+    row["防御率"] = f"{earned * 27 / outs:.2f}"
+    row["勝率"] = _rate(wins / (wins + losses)) if wins + losses else "----"
+    return row
+
+def player_statistics(rng: random.Random, position: str, seasons: int, team: str) -> List[Dict[str, str]]:
+    """``seasons`` consecutive seasons ending in LAST_SEASON"""
+    make = pitching_row if position == "投手" else batting_row
+    return [make(rng, season, team) for season in range(LAST_SEASON - seasons + 1, LAST_SEASON + 1)]
+
+def make_players(players_per_team: int, seasons: int, seed: int, teams: int = len(TEAMS)) -> Dict[str, Any]:
+    """Synthetic npb_players_*.json content: ``teams`` rosters of ``players_per_team``"""
+    rng = random.Random(seed)
+    data = {}
+    for team in team_ids(teams):
+        roster = []
+        for i in range(players_per_team):
+            position = rng.choice(POSITIONS)
+            roster.append({
+                "id": f"{team}{i:03d}",
+                "name": f"選手{team}{i}",
+                "number": str(rng.randint(0, 99)),
+                "position": position,
+                "team": team,
+                "league": league_of(team),
+                "statistics": player_statistics(rng, position, seasons, team),
+            })
+        data[team] = roster
+    return data
+
+def make_stats() -> Dict[str, Any]:
+    """npb_stats_*.json content parsed from the recorded stats pages"""
+    stats_types = ["batting", "pitching", "fielding"]
+    return {
+        "season": LAST_SEASON,
+        "team": {t: parse_stats_table(read_fixture("stats_team_batting.html")) for t in stats_types},
+        "individual": {t: parse_stats_table(read_fixture(f"stats_individual_{t}.html")) for t in stats_types},
+        "leaders": {t: parse_leaders(read_fixture("leaders_batting.html")) for t in stats_types},
+        "errors": [],
+    }
+
+def write_snapshot(data_dir: str, prefix: str, data: Dict[str, Any], stamp: int):
+    name = f"{prefix}{time.strftime('%Y%m%d_%H%M%S', time.localtime(stamp))}.json"
+    tmp_path = os.path.join(data_dir, name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(data_dir, name))
+
+class PageFactory:
+    """Roster and profile pages in the markup of the recorded fixtures, at any size.
+
+    The roster page repeats the fixture's ``player_entry`` block once per
+    player; profile pages keep the fixture's profile table and replace its
+    statistics table with ``seasons`` generated rows.
+    """
+
+    def __init__(self, players_per_team: int, seasons: int, seed: int = 1):
+        self.players_per_team = players_per_team
+        self.seasons = seasons
+        self.seed = seed
+        roster = read_fixture("roster.html")
+        entries = list(re.finditer(r'<div class="player_entry".*?\n</div>', roster, re.S))
+        self._roster_head, self._roster_tail = roster[:entries[0].start()], roster[entries[-1].end():]
+        profile = read_fixture("profile.html")
+        stats = re.search(r'<table class="stats">.*?</table>', profile, re.S)
+        self._profile_head, self._profile_tail = profile[:stats.start()], profile[stats.end():]
+
+    def roster(self, team_id: str) -> str:
+        rng = random.Random(f"{self.seed}:{team_id}")
+        entries = []
+        for i in range(self.players_per_team):
+            player_id = f"{team_id}{i:03d}"
+            entries.append(f'<div class="player_entry" id="{player_id}">\n'
+                           f'  <a href="/bis/players/{player_id}.html"><h4 class="name">選手{team_id}{i}</h4></a>\n'
+                           f'  <div class="number">{rng.randint(0, 99)}</div>\n'
+                           f'  <div class="position">{self.position(player_id)}</div>\n</div>')
+        return self._roster_head + "\n".join(entries) + self._roster_tail
+
+    def position(self, player_id: str) -> str:
+        return random.Random(f"{self.seed}:{player_id}:position").choice(POSITIONS)
+
+    def profile(self, player_id: str) -> str:
+        rng = random.Random(f"{self.seed}:{player_id}")
+        position = self.position(player_id)
+        rows = player_statistics(rng, position, self.seasons, "巨人")
+        columns = PITCHING_COLUMNS if position == "投手" else BATTING_COLUMNS
+        table = ['<table class="stats">', "  <tr>" + "".join(f"<th>{c}</th>" for c in columns) + "</tr>"]
+        for row in rows:
+            table.append("  <tr>" + "".join(f"<td>{html.escape(row[c])}</td>" for c in columns) + "</tr>")
+        table.append("</table>")
+        return self._profile_head + "\n".join(table) + self._profile_tail
@@ -8,6 +8,7 @@ import {
   StatHelpText,
   useColorModeValue,
 } from '@chakra-ui/react';
+import { fetchBundle } from '../lib/bundle';
 
 interface Statistics {
   total_players: number;
@@ -20,17 +21,16 @@ export function Statistics() {
   const bgColor = useColorModeValue('white', 'gray.800');
 
   useEffect(() => {
-    async function fetchStatistics() {
-      try {
-        const response = await fetch('http://localhost:8000/statistics');
-        const data = await response.json();
-        setStats(data);
-      } catch (error) {
+    fetchBundle()
+      .then((bundle) => {
+        setStats({
+          ...bundle.statistics,
+          last_updated: bundle.snapshots.players.updated_at ?? '',
+        });
+      })
+      .catch((error) => {
         console.error('Error fetching statistics:', error);
-      }
-    }
-
-    fetchStatistics();
+      });
   }, []);
 
   if (!stats) return null;
@@ -19,6 +19,7 @@ import {
   Text,
   useColorModeValue
 } from '@chakra-ui/react';
+import { fetchBundle } from '../lib/bundle';
 
 type StatsType = 'batting' | 'pitching' | 'fielding';
 type ViewType = 'team' | 'individual' | 'leaders';
@@ -40,9 +41,12 @@ export default function StatsViewer() {
 
   useEffect(() => {
     fetchStats();
-    fetchLastUpdated();
   }, [viewType, statsType]);
 
+  useEffect(() => {
+    fetchLastUpdated();
+  }, []);
+
   const fetchStats = async () => {
     setIsLoading(true);
     setError(null);
@@ -62,10 +66,9 @@ export default function StatsViewer() {
 
   const fetchLastUpdated = async () => {
     try {
-      const response = await fetch('http://localhost:8000/last_updated');
-      if (response.ok) {
-        const result = await response.json();
-        setLastUpdated(new Date(result.last_updated).toLocaleString());
+      const bundle = await fetchBundle();
+      if (bundle.snapshots.stats.updated_at) {
+        setLastUpdated(new Date(bundle.snapshots.stats.updated_at).toLocaleString());
       }
     } catch (err) {
       console.error('Failed to fetch last updated timestamp:', err);
@@ -16,6 +16,7 @@ import {
   AlertIcon,
   useColorModeValue,
 } from '@chakra-ui/react';
+import { fetchBundle } from '../lib/bundle';
 
 interface TeamData {
   name: {
@@ -45,37 +46,24 @@ export default function TeamInfo({ league }: TeamInfoProps) {
   const borderColor = useColorModeValue('gray.200', 'gray.700');
 
   useEffect(() => {
-    fetchTeams();
-    fetchLastUpdated();
+    fetchBundle()
+      .then((bundle) => {
+        setTeams({
+          central: bundle.leagues.central ?? [],
+          pacific: bundle.leagues.pacific ?? [],
+        });
+        if (bundle.snapshots.teams.updated_at) {
+          setLastUpdated(new Date(bundle.snapshots.teams.updated_at).toLocaleString());
+        }
+      })
+      .catch((err) => {
+        setError(err instanceof Error ? err.message : 'An error occurred');
+      })
+      .finally(() => {
+        setIsLoading(false);
+      });
   }, []);
 
-  const fetchTeams = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/teams');
-      if (!response.ok) {
-        throw new Error('Failed to fetch team data');
-      }
-      const data = await response.json();
-      setTeams(data);
-    } catch (err) {
-      setError(err instanceof Error ? err.message : 'An error occurred');
-    } finally {
-      setIsLoading(false);
-    }
-  };
-
-  const fetchLastUpdated = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/teams/last_updated');
-      if (response.ok) {
-        const data = await response.json();
-        setLastUpdated(new Date(data.last_updated).toLocaleString());
-      }
-    } catch (err) {
-      console.error('Failed to fetch last updated timestamp:', err);
-    }
-  };
-
   const renderTeamCard = (team: TeamData) => (
     <Box
       p={6}
@@ -0,0 +1,65 @@
+export interface SnapshotInfo {
+  file: string | null;
+  updated_at: string | null;
+}
+
+export interface Bundle {
+  version: string;
+  snapshots: {
+    players: SnapshotInfo;
+    stats: SnapshotInfo;
+    teams: SnapshotInfo;
+  };
+  statistics: {
+    total_players: number;
+    teams: number;
+  };
+  teams: { id: string; name: string; league: string; player_count: number }[];
+  leagues: { [league: string]: any[] };
+  rosters: {
+    columns: string[];
+    teams: { [teamId: string]: any[][] };
+  };
+  stats: {
+    season: number | null;
+    tables: { [section: string]: { [statsType: string]: { columns: string[]; rows: number } } };
+    leaders: { [statsType: string]: string[] };
+  };
+}
+
+let bundleRequest: Promise<Bundle> | null = null;
+let snapshotEvents: EventSource | null = null;
+
+// /events がこれらのスナップショットの更新を通知したら、次の呼び出しで /bundle を取得し直す
+const BUNDLE_EVENTS = ['players', 'stats'];
+
+function watchSnapshots() {
+  // サーバー側のレンダリングでは EventSource が無いので監視しない
+  if (snapshotEvents || typeof EventSource === 'undefined') {
+    return;
+  }
+  snapshotEvents = new EventSource('http://localhost:8000/events');
+  for (const kind of BUNDLE_EVENTS) {
+    snapshotEvents.addEventListener(kind, () => {
+      bundleRequest = null;
+    });
+  }
+}
+
+// チーム・選手一覧・成績の見出しは /bundle の1回のリクエストで取得し、ページ内のコンポーネントで共有する
+export function fetchBundle(): Promise<Bundle> {
+  watchSnapshots();
+  if (!bundleRequest) {
+    bundleRequest = fetch('http://localhost:8000/bundle').then((response) => {
+      if (!response.ok) {
+        throw new Error('Failed to fetch data');
+      }
+      return response.json();
+    });
+    // 失敗した場合は次の呼び出しで取得し直す
+    bundleRequest.catch(() => {
+      bundleRequest = null;
+    });
+  }
+  return bundleRequest;
+}
@@ -0,0 +1,180 @@
+import asyncio
+import aiohttp
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from http_cache import HTTPCache
+
+logger = logging.getLogger(__name__)
+
+# 一時的な失敗とみなして再試行するステータス
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Space request starts so that at most `rate` requests begin per second"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def pause(self, seconds: float):
+        """Hold back every later request to this host for ``seconds`` (429 / Retry-After)"""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            self._next_slot = max(self._next_slot, now + seconds)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After when the server sends one"""
+
+    def __init__(self, retries: int = 4, base_delay: float = 0.5, max_delay: float = 60.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            return min(self.max_delay, max(retry_after, backoff))
+        return backoff
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or an HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+class CrawlStats:
+    """Retries and failures per URL over one crawl"""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries: Dict[str, List[str]] = {}
+        self.failures: Dict[str, str] = {}
+
+    def retried(self, url: str, error: BaseException):
+        self.retries.setdefault(url, []).append(_describe(error))
+
+    def failed(self, url: str, error: BaseException):
+        self.failures[url] = _describe(error)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": sum(len(errors) for errors in self.retries.values()),
+            "retried_urls": {url: errors for url, errors in self.retries.items()},
+            "failed_urls": dict(self.failures),
+        }
+
+    def log_summary(self):
+        s = self.summary()
+        logger.info(f"Crawl: {s['requests']} requests, {s['retries']} retries on {len(s['retried_urls'])} URLs, "
+                    f"{len(s['failed_urls'])} failed")
+        for url, error in s['failed_urls'].items():
+            logger.warning(f"Failed: {url} ({error})")
+
+def _describe(error: BaseException) -> str:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return f"HTTP {error.status}"
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+class Fetcher:
+    """Shared HTTP GET with a global concurrency cap, a per-host cap and a per-host rate limit.
+
+    With an ``HTTPCache`` every request is conditional and a 304 is answered
+    from the cached body. Transient failures (connection errors, timeouts,
+    408/429/5xx) are retried with backoff; the wait happens outside the
+    concurrency slots, and a Retry-After also pauses the whole host.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, concurrency: int = 8,
+                 per_host_limit: int = 4, rate_limit: Optional[float] = 5.0,
+                 cache: Optional[HTTPCache] = None, retry: Optional[RetryPolicy] = None):
+        self.session = session
+        self.cache = cache
+        self.retry = retry or RetryPolicy()
+        self.stats = CrawlStats()
+        self.per_host_limit = per_host_limit
+        self.rate_limit = rate_limit
+        self._global = asyncio.Semaphore(concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def _host(self, url: str) -> str:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+            self._limiters[host] = RateLimiter(self.rate_limit)
+        return host
+
+    async def get_text(self, url: str) -> str:
+        """Fetch a page body, waiting for a free slot and the host's rate limit"""
+        host = self._host(url)
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(url, host)
+            except Exception as e:
+                if not is_transient(e) or attempt >= self.retry.retries:
+                    self.stats.failed(url, e)
+                    raise
+                retry_after = None
+                if isinstance(e, aiohttp.ClientResponseError) and e.headers:
+                    retry_after = retry_after_seconds(e.headers.get('Retry-After'))
+                delay = self.retry.delay(attempt, retry_after)
+                self.stats.retried(url, e)
+                logger.warning(f"Retrying {url} in {delay:.1f}s after {_describe(e)} (attempt {attempt + 1})")
+                if retry_after is not None:
+                    await self._limiters[host].pause(retry_after)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, url: str, host: str) -> str:
+        async with self._global, self._hosts[host]:
+            await self._limiters[host].wait()
+            self.stats.requests += 1
+            headers = self.cache.conditional_headers(url) if self.cache else {}
+            body = await self._get(url, headers)
+            if body is None:
+                # 304 だがキャッシュ本体が消えていた場合は通常のGETでやり直す
+                body = await self._get(url, {})
+            return body
+
+    async def _get(self, url: str, headers: Dict[str, str]) -> Optional[str]:
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and self.cache:
+                return self.cache.get(url)
+            response.raise_for_status()
+            body = await response.text()
+            if self.cache:
+                self.cache.store(url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return body
+
+def create_session(concurrency: int = 8, per_host_limit: int = 4) -> aiohttp.ClientSession:
+    """Create a client session whose connection pool matches the fetch limits"""
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host_limit)
+    return aiohttp.ClientSession(connector=connector)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows ではロックせず、キャッシュを共有しない前提で動かす
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 本文ファイルの名前（URL の SHA-1）
+BODY_NAME = re.compile(r"^[0-9a-f]{40}$")
+
+class HTTPCache:
+    """On-disk cache of page bodies keyed by URL, revalidated with ETag / Last-Modified.
+
+    Bodies are stored as one file per URL next to an ``index.json`` holding the
+    validators, size and last access time of every entry. When the total size
+    exceeds ``max_bytes`` the least recently used entries are evicted.
+
+    Every change is appended to ``index.log`` as it happens, so a run that
+    crashes loses nothing, and ``save`` folds the log into ``index.json``.
+    Scrapers sharing the directory take ``index.lock`` around each change, so
+    they merge into one index instead of overwriting each other's. Body files
+    that no index entry points at (left by a crash before the log existed)
+    are removed on load.
+    """
+
+    INDEX_FILE = "index.json"
+    LOG_FILE = "index.log"
+    LOCK_FILE = "index.lock"
+
+    def __init__(self, directory: str = "data/http_cache", max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self.entries: Dict[str, Dict[str, Any]] = self._load_index()
+            self._sweep()
+        self.total_bytes = sum(entry["size"] for entry in self.entries.values())
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the directory lock (a no-op where fcntl is unavailable)"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(self.LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """index.json with the changes logged since it was written replayed on top"""
+        try:
+            with open(self._path(self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        try:
+            with open(self._path(self.LOG_FILE), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中で止まった最後の行
+                        continue
+                    if record["entry"] is None:
+                        entries.pop(record["url"], None)
+                    else:
+                        entries[record["url"]] = record["entry"]
+        except OSError:
+            pass
+        return entries
+
+    def _sweep(self):
+        """Delete body files the index does not know and drop entries whose body is gone"""
+        known = {os.path.basename(self._body_path(url)): url for url in self.entries}
+        names = set(os.listdir(self.directory))
+        for name in names:
+            if BODY_NAME.match(name) and name not in known:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+        for name, url in known.items():
+            if name not in names:
+                del self.entries[url]
+
+    def _log(self, url: str, entry: Optional[Dict[str, Any]]):
+        with open(self._path(self.LOG_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"url": url, "entry": entry}, ensure_ascii=False) + "\n")
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Request headers that let the server answer 304 for a cached URL"""
+        entry = self.entries.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get(self, url: str) -> Optional[str]:
+        """Return the cached body after a 304, or None if it is gone from disk"""
+        entry = self.entries.get(url)
+        if not entry:
+            return None
+        try:
+            with open(self._body_path(url), 'r', encoding='utf-8') as f:
+                body = f.read()
+        except OSError:
+            with self._locked():
+                self._remove(url)
+            return None
+        entry["accessed"] = time.time()
+        with self._locked():
+            self._log(url, entry)
+        self.hits += 1
+        self.bytes_saved += entry["size"]
+        return body
+
+    def store(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        """Save a freshly downloaded body; responses without validators are not cached"""
+        self.misses += 1
+        if not etag and not last_modified:
+            return
+        data = body.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        with self._locked():
+            self._remove(url)
+            with open(self._body_path(url), 'wb') as f:
+                f.write(data)
+            self.entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": len(data),
+                "accessed": time.time()
+            }
+            self._log(url, self.entries[url])
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _remove(self, url: str):
+        entry = self.entries.pop(url, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry["size"]
+        try:
+            os.remove(self._body_path(url))
+        except OSError:
+            pass
+        self._log(url, None)
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for url in sorted(self.entries, key=lambda u: self.entries[u]["accessed"]):
+            self._remove(url)
+            if self.total_bytes <= self.max_bytes:
+                break
+
+    def save(self):
+        """Fold the change log into index.json, merged with what other scrapers logged"""
+        with self._locked():
+            # 他のプロセスが追加・削除したエントリも取り込んでから容量上限を適用する
+            self.entries = self._load_index()
+            self.total_bytes = sum(entry["size"] for entry in self.entries.values())
+            self._evict()
+            path = self._path(self.INDEX_FILE)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            # 索引に反映済みの変更ログは空にする
+            open(self._path(self.LOG_FILE), 'w').close()
+
+    def summary(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "requests": requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": len(self.entries),
+            "cache_bytes": self.total_bytes
+        }
+
+    def log_summary(self):
+        s = self.summary()
+        logger.info(
+            f"HTTP cache: {s['hits']}/{s['requests']} revalidated (hit rate {s['hit_rate']:.1%}), "
+            f"{s['bytes_saved'] / 1024:.0f} KiB not downloaded, {s['entries']} entries / {s['cache_bytes'] / 1024:.0f} KiB on disk"
+        )
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class CrawlJournal:
+    """Append-only checkpoint of a crawl in progress (one JSON record per line)
+
+    Each roster list and each player profile is appended as soon as it has
+    been fetched, so a crawl that dies midway can be restarted and only
+    fetches what is missing. The journal is removed once the snapshot has
+    been saved. Journals older than ``max_age`` are not resumed.
+    """
+
+    def __init__(self, path: str = "data/crawl_journal.jsonl", kind: str = "players",
+                 max_age: timedelta = timedelta(hours=24), resume: bool = True):
+        self.path = path
+        self.kind = kind
+        self.rosters: Dict[str, List[Dict[str, Any]]] = {}
+        self.details: Dict[str, Dict[str, Any]] = {}
+        self.resumed = 0
+        if resume:
+            self._load(max_age)
+        else:
+            self.discard()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        new = not os.path.exists(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        if new:
+            self._append({"type": "start", "kind": kind, "started_at": datetime.now().isoformat(timespec='seconds')})
+
+    def _load(self, max_age: timedelta):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # 書き込み途中で止まった最後の行は捨てる
+                continue
+        start = records[0] if records and records[0].get("type") == "start" else None
+        if start is None or start.get("kind") != self.kind or \
+                datetime.fromisoformat(start["started_at"]) < datetime.now() - max_age:
+            logger.info(f"Ignoring stale crawl journal {self.path}")
+            self.discard()
+            return
+        for record in records[1:]:
+            if record["type"] == "roster":
+                self.rosters[record["team_id"]] = record["players"]
+            elif record["type"] == "details":
+                self.details[record["url"]] = record["details"]
+        logger.info(f"Resuming crawl from {self.path} (started {start['started_at']}): "
+                    f"{len(self.rosters)} rosters, {len(self.details)} profiles already fetched")
+
+    def _append(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def roster(self, team_id: str) -> Optional[List[Dict[str, Any]]]:
+        players = self.rosters.get(team_id)
+        if players is None:
+            return None
+        self.resumed += 1
+        return [dict(player) for player in players]
+
+    def record_roster(self, team_id: str, players: List[Dict[str, Any]]):
+        self.rosters[team_id] = players
+        self._append({"type": "roster", "team_id": team_id, "players": players})
+
+    def player_details(self, url: str) -> Optional[Dict[str, Any]]:
+        details = self.details.get(url)
+        if details is None:
+            return None
+        self.resumed += 1
+        return dict(details)
+
+    def record_details(self, url: str, details: Dict[str, Any]):
+        self.details[url] = details
+        self._append({"type": "details", "url": url, "details": details})
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        """Remove the journal (after the snapshot has been saved, or to start over)"""
+        if hasattr(self, "_file"):
+            self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
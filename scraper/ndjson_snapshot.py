@@ -0,0 +1 @@
+../api/ndjson_snapshot.py
\ No newline at end of file
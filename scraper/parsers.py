@@ -0,0 +1,168 @@
+import asyncio
+import re
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 速い順に試すパーサー（lxml が無ければ標準の html.parser を使う）
+PARSER_PREFERENCE = ["lxml", "html.parser"]
+
+# チーム一覧ページのリーグ見出し
+LEAGUE_HEADINGS = {"central": "CENTRAL LEAGUE", "pacific": "PACIFIC LEAGUE"}
+
+def resolve_parser(name: Optional[str] = None) -> str:
+    """Return the BeautifulSoup tree builder to use, falling back to html.parser"""
+    candidates = [name] if name else PARSER_PREFERENCE
+    for candidate in candidates:
+        if builder_registry.lookup(candidate):
+            return candidate
+    return "html.parser"
+
+def _text(element) -> str:
+    return element.text.strip() if element else ''
+
+def parse_player_list(html: str, parser: str = "html.parser") -> List[Dict[str, Any]]:
+    """Parse a team roster page into raw player entries"""
+    soup = BeautifulSoup(html, parser)
+    players = []
+    for entry in soup.find_all('div', class_='player_entry'):
+        link = entry.find('a')
+        players.append({
+            'id': entry.get('id', ''),
+            'name': _text(entry.find('h4', class_='name')),
+            'number': _text(entry.find('div', class_='number')),
+            'position': _text(entry.find('div', class_='position')),
+            'href': link['href'] if link else None
+        })
+    return players
+
+def parse_player_details(html: str, parser: str = "html.parser") -> Dict[str, Any]:
+    """Parse a player profile page into its profile fields and statistics rows"""
+    soup = BeautifulSoup(html, parser)
+
+    details = {}
+    profile_table = soup.find('table', class_='profile')
+    if profile_table:
+        for row in profile_table.find_all('tr'):
+            details[_text(row.find('th'))] = _text(row.find('td'))
+
+    # Extract statistics
+    stats_tables = soup.find_all('table', class_='stats')
+    if stats_tables:
+        stats = []
+        for table in stats_tables:
+            headers = [th.text.strip() for th in table.find_all('th')]
+            for row in table.find_all('tr')[1:]:  # Skip header row
+                values = [td.text.strip() for td in row.find_all('td')]
+                if len(headers) == len(values):
+                    stats.append(dict(zip(headers, values)))
+        details['statistics'] = stats
+
+    return details
+
+def parse_stats_table(html: str, parser: str = "html.parser") -> List[Dict[str, Any]]:
+    """Parse a team or individual stats page (the `tablesorter` table)"""
+    soup = BeautifulSoup(html, parser)
+    table = soup.find('table', class_='tablesorter')
+    if not table:
+        return []
+
+    headers = [th.text.strip() for th in table.find('thead').find_all('th')]
+    stats = []
+    for row in table.find('tbody').find_all('tr'):
+        values = [td.text.strip() for td in row.find_all('td')]
+        if len(headers) == len(values):
+            stats.append(dict(zip(headers, values)))
+    return stats
+
+def parse_leaders(html: str, parser: str = "html.parser") -> List[Dict[str, Any]]:
+    """Parse a leaders page into one ranking list per category"""
+    soup = BeautifulSoup(html, parser)
+    leaders = []
+    for section in soup.find_all('div', class_='leader_section'):
+        category = section.find('h3').text.strip()
+        table = section.find('table')
+        if table:
+            headers = [th.text.strip() for th in table.find_all('th')]
+            rows = []
+            for tr in table.find_all('tr')[1:]:  # Skip header row
+                values = [td.text.strip() for td in tr.find_all('td')]
+                if len(headers) == len(values):
+                    rows.append(dict(zip(headers, values)))
+            leaders.append({
+                "category": category,
+                "rankings": rows
+            })
+    return leaders
+
+def split_team_name(text: str) -> Dict[str, str]:
+    """Split a heading like "読売ジャイアンツYomiuri Giants" into its Japanese and English names"""
+    # 英語名は末尾の ASCII 部分（「横浜DeNAベイスターズ」のように日本語名にも大文字が入る）
+    match = re.match(r"(.*?)\s*([A-Z][\x20-\x7e]*)$", text.strip(), re.S)
+    if not match:
+        return {"ja": text.strip(), "en": ""}
+    return {"ja": match.group(1).strip(), "en": match.group(2).strip()}
+
+def parse_teams(html: str, parser: str = "html.parser") -> Dict[str, List[Dict[str, Any]]]:
+    """Parse the teams page into league -> teams (name, details, logo_url)
+
+    Each league heading (h3) is followed by a div with one table per team,
+    and every table is preceded by the team's h4 heading. The logo URL is
+    returned as written in the page; the caller resolves it.
+    """
+    soup = BeautifulSoup(html, parser)
+    teams_data = {}
+    for league, heading in LEAGUE_HEADINGS.items():
+        teams_data[league] = []
+        h3 = soup.find(lambda tag: tag.name == 'h3' and heading in tag.get_text())
+        container = h3.find_next_sibling('div') if h3 else None
+        if not container:
+            continue
+        for table in container.find_all('table'):
+            title = table.find_previous_sibling()
+            if not title or title.name != 'h4':
+                continue
+            team = {"name": split_team_name(title.get_text()), "details": {}}
+            for row in table.find_all('tr'):
+                cells = row.find_all('td')
+                if len(cells) == 2:
+                    key, value = _text(cells[0]), _text(cells[1])
+                    # 本拠地の場合、球場名のみを抽出
+                    if "本拠地" in key:
+                        value = value.split("/")[0].strip()
+                    team["details"][key] = value
+            block = table.find_parent('div')
+            img = block.find('img') if block else None
+            if img and img.get('src'):
+                team["logo_url"] = img['src']
+            teams_data[league].append(team)
+    return teams_data
+
+class ParseStage:
+    """Run the parse functions above off the event loop.
+
+    With ``workers`` > 0 (or None for one per CPU) raw HTML is sent to a
+    process pool and plain dicts come back; with ``workers=0`` parsing runs
+    inline, as it did before.
+    """
+
+    def __init__(self, workers: Optional[int] = None, parser: Optional[str] = None):
+        self.parser = resolve_parser(parser)
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+
+    async def run(self, func: Callable[[str, str], Any], html: str) -> Any:
+        if self._pool is None:
+            return func(html, self.parser)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, html, self.parser)
+
+    async def run_batch(self, jobs: List[Tuple[Callable[[str, str], Any], str]]) -> List[Any]:
+        """Parse several pages at once; a failed page yields its exception instead of a result"""
+        return await asyncio.gather(*(self.run(func, html) for func, html in jobs), return_exceptions=True)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
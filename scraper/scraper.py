@@ -1,14 +1,24 @@
+import argparse
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
 import json
 import logging
-from typing import Dict, List, Any
-from datetime import datetime
+import os
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from fetcher import Fetcher, RetryPolicy, create_session
+from http_cache import HTTPCache
+from journal import CrawlJournal
+from ndjson_snapshot import iter_teams
+from snapshot_writer import SnapshotWriter, load_players
+from snapshot_store import DB_PATH, SnapshotStore
+from parsers import ParseStage, parse_player_details, parse_player_list
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 一覧ページの項目のうち、変化したら詳細を取り直すもの
+TRACKED_FIELDS = ('number', 'position', 'team_id')
+
 class NPBScraper:
     BASE_URL = "https://npb.jp"
     PLAYERS_URL = "https://npb.jp/bis/players/"
@@ -28,41 +38,65 @@ class NPBScraper:
         "lions": {"name": "埼玉西武ライオンズ", "league": "Pacific"}
     }
 
-    def __init__(self):
+    def __init__(self, concurrency: int = 8, per_host_limit: int = 4, rate_limit: float = 5.0,
+                 parse_workers: Optional[int] = None, parser: Optional[str] = None,
+                 http_cache: Optional[HTTPCache] = None, journal: Optional[CrawlJournal] = None,
+                 retry: Optional[RetryPolicy] = None):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.rate_limit = rate_limit
+        self.parse_workers = parse_workers
+        self.parser = parser
+        self.http_cache = http_cache
+        self.journal = journal
+        self.retry = retry
         self.session = None
+        self.fetcher = None
+        self.parse_stage = None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = create_session(self.concurrency, self.per_host_limit)
+        self.fetcher = Fetcher(self.session, self.concurrency, self.per_host_limit, self.rate_limit,
+                               self.http_cache, self.retry)
+        self.parse_stage = ParseStage(self.parse_workers, self.parser)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
+        if self.parse_stage:
+            self.parse_stage.close()
+        if self.journal:
+            self.journal.close()
+        if self.http_cache:
+            self.http_cache.save()
+            self.http_cache.log_summary()
+        if self.fetcher:
+            self.fetcher.stats.log_summary()
 
     async def get_player_list(self, team_id: str) -> List[Dict[str, Any]]:
         """Get list of players for a specific team"""
+        if self.journal:
+            players = self.journal.roster(team_id)
+            if players is not None:
+                return players
         try:
             team_url = f"{self.PLAYERS_URL}?team={team_id}"
-            async with self.session.get(team_url) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                players = []
-                
-                player_entries = soup.find_all('div', class_='player_entry')
-                for entry in player_entries:
-                    player_info = {
-                        'id': entry.get('id', ''),
-                        'name': entry.find('h4', class_='name').text.strip() if entry.find('h4', class_='name') else '',
-                        'number': entry.find('div', class_='number').text.strip() if entry.find('div', class_='number') else '',
-                        'position': entry.find('div', class_='position').text.strip() if entry.find('div', class_='position') else '',
-                        'team': self.TEAMS[team_id]["name"],
-                        'league': self.TEAMS[team_id]["league"],
-                        'team_id': team_id,
-                        'profile_url': self.BASE_URL + entry.find('a')['href'] if entry.find('a') else None
-                    }
-                    players.append(player_info)
-                
-                return players
+            html = await self.fetcher.get_text(team_url)
+            entries = await self.parse_stage.run(parse_player_list, html)
+            players = []
+            for entry in entries:
+                href = entry.pop('href')
+                entry.update({
+                    'team': self.TEAMS[team_id]["name"],
+                    'league': self.TEAMS[team_id]["league"],
+                    'team_id': team_id,
+                    'profile_url': self.BASE_URL + href if href else None
+                })
+                players.append(entry)
+            if self.journal and players:
+                self.journal.record_roster(team_id, [dict(player) for player in players])
+            return players
         except Exception as e:
             logger.error(f"Error fetching player list for team {team_id}: {str(e)}")
             return []
@@ -70,74 +104,268 @@ class NPBScraper:
     async def get_player_details(self, player_url: str) -> Dict[str, Any]:
         """Get detailed information for a specific player"""
         try:
-            async with self.session.get(player_url) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                details = {}
-                profile_table = soup.find('table', class_='profile')
-                if profile_table:
-                    rows = profile_table.find_all('tr')
-                    for row in rows:
-                        header = row.find('th').text.strip() if row.find('th') else ''
-                        value = row.find('td').text.strip() if row.find('td') else ''
-                        details[header] = value
-
-                # Extract statistics
-                stats_tables = soup.find_all('table', class_='stats')
-                if stats_tables:
-                    stats = []
-                    for table in stats_tables:
-                        headers = [th.text.strip() for th in table.find_all('th')]
-                        rows = table.find_all('tr')[1:]  # Skip header row
-                        for row in rows:
-                            values = [td.text.strip() for td in row.find_all('td')]
-                            if len(headers) == len(values):
-                                stats.append(dict(zip(headers, values)))
-                    details['statistics'] = stats
-
-                return details
+            html = await self.fetcher.get_text(player_url)
+            return await self.parse_stage.run(parse_player_details, html)
         except Exception as e:
             logger.error(f"Error fetching player details from {player_url}: {str(e)}")
             return {}
 
+    async def with_details(self, player: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge a player's profile page into their roster entry"""
+        url = player['profile_url']
+        if not url:
+            return player
+        details = self.journal.player_details(url) if self.journal else None
+        if details is None:
+            details = await self.get_player_details(url)
+            if not details:
+                # 取得に失敗した選手は記録せず、再開時に取り直す
+                return player
+            details['fetched_at'] = datetime.now().isoformat(timespec='seconds')
+            if self.journal:
+                self.journal.record_details(url, details)
+        player.update(details)
+        return player
+
+    async def get_team_players(self, team_id: str) -> List[Dict[str, Any]]:
+        """Get the roster of a team with every player's details"""
+        logger.info(f"Fetching players for team: {self.TEAMS[team_id]['name']}")
+        players = await self.get_player_list(team_id)
+
+        # gather はロスター順に結果を返すので出力順は逐次実行時と同じ
+        detailed_players = await asyncio.gather(*(self.with_details(player) for player in players))
+        logger.info(f"Completed fetching {len(detailed_players)} players for {self.TEAMS[team_id]['name']}")
+        return list(detailed_players)
+
     async def get_all_players(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Get all players from all teams with their details"""
+        """Get all players from all teams with their details
+
+        Teams and profile pages are fetched concurrently; the fetcher bounds
+        how many requests are in flight and how fast they start.
+        """
+        team_ids = list(self.TEAMS.keys())
+        rosters = await asyncio.gather(*(self.get_team_players(team_id) for team_id in team_ids))
+        return dict(zip(team_ids, rosters))
+
+    async def stream_all_players(self, writer: SnapshotWriter) -> int:
+        """Crawl every team like ``get_all_players``, but hand each finished roster to ``writer``
+
+        Rosters are written as soon as their team completes and are not kept,
+        so memory holds only the teams still being fetched. Blocks land in
+        completion order; the writer's index lists them in ``TEAMS`` order.
+        Returns the number of players written.
+        """
+        async def team(team_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+            return team_id, await self.get_team_players(team_id)
+
+        count = 0
+        for next_team in asyncio.as_completed([team(team_id) for team_id in self.TEAMS]):
+            team_id, players = await next_team
+            writer.write_team(team_id, players)
+            count += len(players)
+        return count
+
+    async def get_all_players_incremental(self, previous: Dict[str, List[Dict[str, Any]]],
+                                          max_age: timedelta = timedelta(hours=72)
+                                          ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Any]]:
+        """Refresh a previous snapshot, fetching profiles only where needed
+
+        Every roster list is fetched again and diffed with ``previous`` by player
+        id. Profiles are fetched for new players, for players whose roster entry
+        changed (number, position, team) and for players last fetched more than
+        ``max_age`` ago; everyone else keeps their previous details. Returns the
+        full snapshot and a changelog of adds, removes and updates.
+        """
+        team_ids = list(self.TEAMS.keys())
+        rosters = await asyncio.gather(*(self.get_player_list(team_id) for team_id in team_ids))
+
+        previous_players = {player['id']: player for players in previous.values() for player in players}
+        stale_before = (datetime.now() - max_age).isoformat(timespec='seconds')
+        changelog = {"added": [], "removed": [], "updated": [], "refreshed": []}
         all_players = {}
-        
-        for team_id in self.TEAMS.keys():
-            logger.info(f"Fetching players for team: {self.TEAMS[team_id]['name']}")
-            players = await self.get_player_list(team_id)
-            
-            detailed_players = []
+        seen_ids = set()
+        pending = []
+
+        for team_id, players in zip(team_ids, rosters):
+            if not players and previous.get(team_id):
+                # ロスター取得に失敗した場合は全員削除扱いにせず前回のデータを残す
+                logger.warning(f"Empty roster for {self.TEAMS[team_id]['name']}, keeping previous data")
+                players = [dict(player) for player in previous[team_id]]
+                seen_ids.update(player['id'] for player in players)
+                all_players[team_id] = players
+                continue
+
+            team_players = []
             for player in players:
-                if player['profile_url']:
-                    details = await self.get_player_details(player['profile_url'])
-                    player.update(details)
-                detailed_players.append(player)
-            
-            all_players[team_id] = detailed_players
-            logger.info(f"Completed fetching {len(detailed_players)} players for {self.TEAMS[team_id]['name']}")
-        
-        return all_players
+                seen_ids.add(player['id'])
+                old = previous_players.get(player['id'])
+                if old is None:
+                    changelog["added"].append(_change_entry(player))
+                    pending.append(player)
+                    team_players.append(player)
+                    continue
+
+                changes = {field: [old.get(field), player[field]]
+                           for field in TRACKED_FIELDS if old.get(field) != player[field]}
+                merged = dict(old)
+                merged.update(player)
+                if changes:
+                    changelog["updated"].append(dict(_change_entry(player), changes=changes))
+                    pending.append(merged)
+                elif old.get('fetched_at', '') < stale_before:
+                    changelog["refreshed"].append(_change_entry(player))
+                    pending.append(merged)
+                team_players.append(merged)
+            all_players[team_id] = team_players
+
+        changelog["removed"] = [_change_entry(player) for player_id, player in previous_players.items()
+                                if player_id not in seen_ids]
 
-    def save_to_json(self, data: Dict[str, Any], filename: str = None):
+        logger.info(f"Incremental refresh: fetching {len(pending)} of {len(seen_ids)} profiles")
+        # with_details は辞書をその場で更新するので all_players にも反映される
+        await asyncio.gather(*(self.with_details(player) for player in pending))
+        return all_players, changelog
+
+    def save_to_json(self, data: Dict[str, Any], filename: str = None) -> bool:
         """Save scraped data to JSON file with timestamp"""
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"data/npb_players_{timestamp}.json"
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            # 一時ファイルに書いてから置き換え、APIが書きかけのファイルを読まないようにする
+            with open(filename + ".tmp", 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(filename + ".tmp", filename)
             logger.info(f"Data successfully saved to {filename}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving data to {filename}: {str(e)}")
+            return False
+
+    def snapshot_path(self) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"data/npb_players_{timestamp}.ndjson"
+
+    def save_to_ndjson(self, data: Dict[str, List[Dict[str, Any]]], filename: str = None) -> bool:
+        """Save an in-memory snapshot (incremental mode) in the streaming NDJSON format"""
+        filename = filename or self.snapshot_path()
+        try:
+            with SnapshotWriter(filename, list(self.TEAMS)) as writer:
+                for team_id, players in data.items():
+                    writer.write_team(team_id, players)
+            return True
         except Exception as e:
             logger.error(f"Error saving data to {filename}: {str(e)}")
+            return False
+
+    async def crawl_to_ndjson(self, filename: str = None) -> bool:
+        """Full crawl written team by team; the file appears only once it is complete"""
+        filename = filename or self.snapshot_path()
+        try:
+            with SnapshotWriter(filename, list(self.TEAMS)) as writer:
+                await self.stream_all_players(writer)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving data to {filename}: {str(e)}")
+            return False
+
+    def load_latest_snapshot(self, data_dir: str = "data") -> Dict[str, List[Dict[str, Any]]]:
+        """Load the newest npb_players_*.ndjson / .json, or an empty dataset if there is none"""
+        files = sorted(f for f in os.listdir(data_dir)
+                       if f.startswith("npb_players_") and f.endswith((".json", ".ndjson"))) if os.path.isdir(data_dir) else []
+        if not files:
+            return {}
+        path = os.path.join(data_dir, files[-1])
+        logger.info(f"Loading previous snapshot {path}")
+        return load_players(path)
+
+    def save_changelog(self, changelog: Dict[str, Any], filename: str = None):
+        """Save the changelog of an incremental refresh next to the snapshot"""
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"data/npb_changelog_{timestamp}.json"
+
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(changelog, f, ensure_ascii=False, indent=2)
+            logger.info(f"Changelog saved to {filename}: "
+                        f"{len(changelog['added'])} added, {len(changelog['removed'])} removed, "
+                        f"{len(changelog['updated'])} updated, {len(changelog['refreshed'])} refreshed")
+        except Exception as e:
+            logger.error(f"Error saving changelog to {filename}: {str(e)}")
+
+    def save_crawl_summary(self, filename: str = None):
+        """Save retries and failures per URL (and what was resumed from the journal)"""
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"data/npb_crawl_summary_{timestamp}.json"
+
+        summary = self.fetcher.stats.summary()
+        summary["resumed_from_journal"] = self.journal.resumed if self.journal else 0
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            logger.info(f"Crawl summary saved to {filename}")
+        except Exception as e:
+            logger.error(f"Error saving crawl summary to {filename}: {str(e)}")
+
+def _change_entry(player: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": player['id'], "name": player.get('name', ''), "team_id": player.get('team_id')}
 
 async def main():
-    async with NPBScraper() as scraper:
-        all_players = await scraper.get_all_players()
-        scraper.save_to_json(all_players)
+    parser = argparse.ArgumentParser(description="Scrape NPB player data")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--per-host", type=int, default=4, help="max requests in flight per host")
+    parser.add_argument("--rate", type=float, default=5.0, help="max requests started per second per host (0 = unlimited)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="HTML parser processes (0 = parse inline, default = one per CPU)")
+    parser.add_argument("--parser", default=None, help="BeautifulSoup parser backend (default: lxml if installed, else html.parser)")
+    parser.add_argument("--http-cache", default="data/http_cache", help="directory of the conditional-GET page cache")
+    parser.add_argument("--http-cache-mb", type=int, default=200, help="page cache size cap in MiB")
+    parser.add_argument("--no-http-cache", action="store_true", help="always download every page")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite snapshot store to write into (default: the one the API reads)")
+    parser.add_argument("--no-db", action="store_true", help="only write the JSON snapshot")
+    parser.add_argument("--incremental", action="store_true", help="refresh the latest snapshot instead of a full crawl")
+    parser.add_argument("--max-age-hours", type=float, default=72, help="re-fetch unchanged profiles older than this in incremental mode")
+    parser.add_argument("--retries", type=int, default=4, help="retries per page on connection errors, 429 and 5xx")
+    parser.add_argument("--journal", default="data/crawl_journal.jsonl", help="checkpoint of the crawl in progress")
+    parser.add_argument("--no-resume", action="store_true", help="discard an unfinished crawl journal and start over")
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson",
+                        help="snapshot file format (ndjson is written team by team as the crawl runs)")
+    args = parser.parse_args()
+
+    http_cache = None if args.no_http_cache else HTTPCache(args.http_cache, args.http_cache_mb * 1024 * 1024)
+    journal = CrawlJournal(args.journal, resume=not args.no_resume)
+    all_players, path = None, None
+    async with NPBScraper(args.concurrency, args.per_host, args.rate, args.parse_workers, args.parser, http_cache,
+                          journal, RetryPolicy(args.retries)) as scraper:
+        previous = scraper.load_latest_snapshot() if args.incremental else {}
+        if previous:
+            all_players, changelog = await scraper.get_all_players_incremental(previous, timedelta(hours=args.max_age_hours))
+            scraper.save_changelog(changelog)
+        elif args.format == "ndjson":
+            path = scraper.snapshot_path()
+            saved = await scraper.crawl_to_ndjson(path)
+        else:
+            all_players = await scraper.get_all_players()
+        if all_players is not None:
+            if args.format == "ndjson":
+                path = scraper.snapshot_path()
+                saved = scraper.save_to_ndjson(all_players, path)
+            else:
+                saved = scraper.save_to_json(all_players)
+        scraper.save_crawl_summary()
+    if saved:
+        # スナップショットを保存できたのでチェックポイントは不要
+        journal.discard()
+
+    if not args.no_db and (saved or all_players is not None):
+        store = SnapshotStore(args.db)
+        try:
+            # NDJSON はチームごとに読み直して書き込む（全員分をメモリに載せない）
+            store.write_players(all_players if all_players is not None else iter_teams(path))
+        finally:
+            store.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,245 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from ndjson_snapshot import iter_teams
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# APIと同じデータディレクトリ（NPB_DATA_DIR、無ければリポジトリ直下の data）。起動したディレクトリには依存しない
+DATA_DIR = os.path.abspath(os.environ.get("NPB_DATA_DIR") or
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data"))
+
+# 既定の書き込み先。APIが読むストア（NPB_DB、無ければ DATA_DIR/npb.db）と同じ
+DB_PATH = os.environ.get("NPB_DB", os.path.join(DATA_DIR, "npb.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    season INTEGER,
+    created_at TEXT NOT NULL,
+    source TEXT,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_kind ON snapshots(kind, version);
+CREATE UNIQUE INDEX IF NOT EXISTS snapshots_source ON snapshots(source);
+
+CREATE TABLE IF NOT EXISTS players (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    team_id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    player_id TEXT NOT NULL,
+    name TEXT,
+    number TEXT,
+    position TEXT,
+    league TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, team_id, row)
+);
+CREATE INDEX IF NOT EXISTS players_id ON players(player_id, snapshot);
+
+CREATE TABLE IF NOT EXISTS player_stats (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    player_id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    season TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, player_id, row)
+);
+CREATE INDEX IF NOT EXISTS player_stats_season ON player_stats(player_id, season, snapshot);
+
+CREATE TABLE IF NOT EXISTS team_stats (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    season INTEGER,
+    stats_type TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    team TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, stats_type, row)
+);
+CREATE INDEX IF NOT EXISTS team_stats_season ON team_stats(season, stats_type, snapshot);
+
+CREATE TABLE IF NOT EXISTS individual_stats (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    season INTEGER,
+    stats_type TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    player_name TEXT,
+    team TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, stats_type, row)
+);
+CREATE INDEX IF NOT EXISTS individual_stats_season ON individual_stats(season, stats_type, snapshot);
+CREATE INDEX IF NOT EXISTS individual_stats_player ON individual_stats(player_name, season);
+
+CREATE TABLE IF NOT EXISTS leaders (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    season INTEGER,
+    stats_type TEXT NOT NULL,
+    category_row INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, stats_type, category_row, row)
+);
+CREATE INDEX IF NOT EXISTS leaders_season ON leaders(season, stats_type, category);
+
+CREATE TABLE IF NOT EXISTS teams (
+    snapshot INTEGER NOT NULL REFERENCES snapshots(version),
+    league TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (snapshot, league, row)
+);
+"""
+
+# ファイル名の先頭と snapshots.kind の対応
+FILE_KINDS = {"npb_players_": "players", "npb_stats_": "stats", "npb_teams_": "teams"}
+
+def _json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+class SnapshotStore:
+    """SQLite (WAL) store of every scraped snapshot.
+
+    Each ``write_*`` call inserts one snapshot and all of its rows in a single
+    transaction, so readers see either the whole snapshot or none of it.
+    ``snapshots.version`` increases monotonically across all kinds.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _begin_snapshot(self, kind: str, season: Optional[int], created_at: Optional[datetime],
+                        source: Optional[str], meta: Optional[Dict[str, Any]] = None) -> int:
+        created_at = (created_at or datetime.now()).isoformat(timespec='seconds')
+        cursor = self.conn.execute(
+            "INSERT INTO snapshots (kind, season, created_at, source, meta) VALUES (?, ?, ?, ?, ?)",
+            (kind, season, created_at, source, _json(meta) if meta else None))
+        return cursor.lastrowid
+
+    def write_players(self, data: Union[Dict[str, List[Dict[str, Any]]], Iterable[Tuple[str, List[Dict[str, Any]]]]],
+                      created_at: Optional[datetime] = None, source: Optional[str] = None) -> int:
+        """Store a players snapshot (team_id -> roster) and every player's season stats
+
+        ``data`` may also be an iterable of (team_id, roster) pairs, e.g.
+        ``ndjson_snapshot.iter_teams``, so a team is inserted and dropped
+        before the next one is read.
+        """
+        with self.conn:
+            version = self._begin_snapshot("players", None, created_at, source)
+            count = 0
+            for team_id, players in (data.items() if isinstance(data, dict) else data):
+                player_rows, stats_rows = [], []
+                for row, player in enumerate(players):
+                    player_rows.append((version, team_id, row, player.get('id', ''), player.get('name'),
+                                        player.get('number'), player.get('position'), player.get('league'),
+                                        _json(player)))
+                    for stats_row, stats in enumerate(player.get('statistics', [])):
+                        stats_rows.append((version, player.get('id', ''), stats_row, stats.get('年度'), _json(stats)))
+                self.conn.executemany("INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", player_rows)
+                self.conn.executemany("INSERT INTO player_stats VALUES (?, ?, ?, ?, ?)", stats_rows)
+                count += len(player_rows)
+        logger.info(f"Stored players snapshot v{version} ({count} players) in {self.path}")
+        return version
+
+    def write_stats(self, data: Dict[str, Any], created_at: Optional[datetime] = None,
+                    source: Optional[str] = None) -> int:
+        """Store a stats snapshot as produced by NPBStatsScraper.get_all_stats"""
+        season = data.get("season")
+        with self.conn:
+            version = self._begin_snapshot("stats", season, created_at, source, {"errors": data.get("errors", [])})
+            self.conn.executemany(
+                "INSERT INTO team_stats VALUES (?, ?, ?, ?, ?, ?)",
+                [(version, season, stats_type, row, stats.get("チーム"), _json(stats))
+                 for stats_type, rows in data.get("team", {}).items() for row, stats in enumerate(rows)])
+            self.conn.executemany(
+                "INSERT INTO individual_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(version, season, stats_type, row, stats.get("選手"), stats.get("チーム"), _json(stats))
+                 for stats_type, rows in data.get("individual", {}).items() for row, stats in enumerate(rows)])
+            self.conn.executemany(
+                "INSERT INTO leaders VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(version, season, stats_type, category_row, category["category"], row, _json(ranking))
+                 for stats_type, categories in data.get("leaders", {}).items()
+                 for category_row, category in enumerate(categories)
+                 for row, ranking in enumerate(category["rankings"])])
+        logger.info(f"Stored stats snapshot v{version} (season {season}) in {self.path}")
+        return version
+
+    def write_teams(self, data: Dict[str, List[Dict[str, Any]]], created_at: Optional[datetime] = None,
+                    source: Optional[str] = None) -> int:
+        """Store a teams snapshot (league -> teams)"""
+        with self.conn:
+            version = self._begin_snapshot("teams", None, created_at, source)
+            self.conn.executemany(
+                "INSERT INTO teams VALUES (?, ?, ?, ?)",
+                [(version, league, row, _json(team)) for league, teams in data.items() for row, team in enumerate(teams)])
+        logger.info(f"Stored teams snapshot v{version} in {self.path}")
+        return version
+
+    def import_json_dir(self, data_dir: str = "data") -> int:
+        """One-time import of existing npb_*_<timestamp>.json / .ndjson files, oldest first.
+
+        Files already imported (matched by file name) are skipped, so the
+        import can be re-run safely.
+        """
+        imported = {row[0] for row in self.conn.execute("SELECT source FROM snapshots WHERE source IS NOT NULL")}
+        files = []
+        for directory in (data_dir, os.path.join(data_dir, "seasons")):
+            if os.path.isdir(directory):
+                files.extend(os.path.join(directory, f) for f in os.listdir(directory)
+                             if f.endswith((".json", ".ndjson")))
+
+        count = 0
+        for path in sorted(files, key=_file_time):
+            name = os.path.relpath(path, data_dir)
+            prefix = next((p for p in FILE_KINDS if os.path.basename(path).startswith(p)), None)
+            if prefix is None or name in imported:
+                continue
+            if path.endswith(".ndjson"):
+                data = iter_teams(path)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            writer = getattr(self, f"write_{FILE_KINDS[prefix]}")
+            writer(data, created_at=_file_time(path), source=name)
+            count += 1
+        logger.info(f"Imported {count} snapshot files from {data_dir}")
+        return count
+
+def _file_time(path: str) -> datetime:
+    """Timestamp from npb_*_YYYYmmdd_HHMMSS.json, or the file's mtime"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime("_".join(stem.split("_")[-2:]), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return datetime.fromtimestamp(os.path.getmtime(path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Import existing JSON snapshots into the SQLite store")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory with npb_*_<timestamp>.json files")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.db)
+    try:
+        store.import_json_dir(args.data_dir)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
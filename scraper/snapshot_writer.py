@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ndjson_snapshot import FORMAT, VERSION, iter_teams
+
+logger = logging.getLogger(__name__)
+
+class SnapshotWriter:
+    """Write a players snapshot as NDJSON, one team at a time
+
+    Layout: a header line, one ``{"team_id", "player"}`` line per player with
+    each team's players contiguous, and a last line holding the byte offset,
+    length and player count of every team block. Everything goes to
+    ``<path>.tmp`` and is renamed into place by ``close``, so readers never
+    see a partial file (the API ignores ``*.tmp``).
+
+    Blocks are written in the order ``write_team`` is called (the order the
+    crawl finishes teams), so a roster is never held back waiting for
+    another team. The index records the block positions and, with
+    ``order``, lists the teams in that order; readers follow the index, so
+    team order is stable even though the block bytes are not.
+    """
+
+    def __init__(self, path: str, order: Optional[List[str]] = None):
+        self.path = path
+        self.order = order or []
+        self.tmp_path = path + ".tmp"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self.tmp_path, 'wb')
+        self.index: Dict[str, List[int]] = {}
+        self._write({"format": FORMAT, "version": VERSION,
+                     "created_at": datetime.now().isoformat(timespec='seconds')})
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n"
+        self._file.write(line)
+        return len(line)
+
+    def write_team(self, team_id: str, players: List[Dict[str, Any]]):
+        """Append one team's roster; the caller can drop it afterwards"""
+        if team_id in self.index:
+            raise ValueError(f"Team {team_id} already written")
+        offset = self._file.tell()
+        length = sum(self._write({"team_id": team_id, "player": player}) for player in players)
+        self.index[team_id] = [offset, length, len(players)]
+
+    def close(self):
+        """Write the index and atomically publish the file"""
+        # ブロックは書き終えた順に並ぶので、索引を指定の順序（order に無いチームはその後に ID 順）にそろえる
+        rank = {team_id: i for i, team_id in enumerate(self.order)}
+        self.index = dict(sorted(self.index.items(), key=lambda item: (rank.get(item[0], len(rank)), item[0])))
+        self._write({"index": self.index})
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        logger.info(f"Snapshot written to {self.path} ({len(self.index)} teams, "
+                    f"{sum(count for _, _, count in self.index.values())} players)")
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def load_players(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a players snapshot in either format (.ndjson or the older .json)"""
+    if path.endswith(".ndjson"):
+        return dict(iter_teams(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
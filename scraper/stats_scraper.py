@@ -1,16 +1,22 @@
+import argparse
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
 import json
 import logging
-from typing import Dict, List, Any
+import os
+import sys
+from typing import Dict, List, Any, Optional
 from datetime import datetime
+from fetcher import Fetcher, RetryPolicy, create_session
+from http_cache import HTTPCache
+from snapshot_store import DB_PATH, SnapshotStore
+from parsers import ParseStage, parse_leaders, parse_stats_table
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class NPBStatsScraper:
-    BASE_URL = "https://npb.jp/bis/2024/stats/"
+    BASE_URL = "https://npb.jp/bis/{season}/stats/"
+    DEFAULT_SEASON = 2024
     
     STATS_TYPES = {
         "team": {
@@ -30,146 +36,199 @@ class NPBStatsScraper:
         }
     }
 
-    def __init__(self):
+    PARSERS = {
+        "team": parse_stats_table,
+        "individual": parse_stats_table,
+        "leaders": parse_leaders
+    }
+
+    def __init__(self, season: int = DEFAULT_SEASON, concurrency: int = 8, per_host_limit: int = 4,
+                 rate_limit: float = 5.0, parse_workers: Optional[int] = None, parser: Optional[str] = None,
+                 http_cache: Optional[HTTPCache] = None, retry: Optional[RetryPolicy] = None):
+        self.season = season
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.rate_limit = rate_limit
+        self.parse_workers = parse_workers
+        self.parser = parser
+        self.http_cache = http_cache
+        self.retry = retry
         self.session = None
+        self.fetcher = None
+        self.parse_stage = None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = create_session(self.concurrency, self.per_host_limit)
+        self.fetcher = Fetcher(self.session, self.concurrency, self.per_host_limit, self.rate_limit,
+                               self.http_cache, self.retry)
+        self.parse_stage = ParseStage(self.parse_workers, self.parser)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
-
-    async def get_team_stats(self, stats_type: str) -> List[Dict[str, Any]]:
+        if self.parse_stage:
+            self.parse_stage.close()
+        if self.http_cache:
+            self.http_cache.save()
+            self.http_cache.log_summary()
+        if self.fetcher:
+            self.fetcher.stats.log_summary()
+
+    def page_url(self, section: str, stats_type: str, season: Optional[int] = None) -> str:
+        base_url = self.BASE_URL.format(season=season or self.season)
+        return f"{base_url}{self.STATS_TYPES[section][stats_type]}"
+
+    async def get_page(self, section: str, stats_type: str, season: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Fetch and parse one stats page; errors are raised to the caller"""
+        html = await self.fetcher.get_text(self.page_url(section, stats_type, season))
+        return await self.parse_stage.run(self.PARSERS[section], html)
+
+    async def get_team_stats(self, stats_type: str, season: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get team statistics (batting/pitching/fielding)"""
-        try:
-            url = f"{self.BASE_URL}{self.STATS_TYPES['team'][stats_type]}"
-            async with self.session.get(url) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                stats = []
-
-                # Find the stats table
-                table = soup.find('table', class_='tablesorter')
-                if not table:
-                    return []
-
-                # Get headers
-                headers = [th.text.strip() for th in table.find('thead').find_all('th')]
-
-                # Get team stats
-                for row in table.find('tbody').find_all('tr'):
-                    values = [td.text.strip() for td in row.find_all('td')]
-                    if len(headers) == len(values):
-                        stats.append(dict(zip(headers, values)))
-
-                return stats
-        except Exception as e:
-            logger.error(f"Error fetching {stats_type} team stats: {str(e)}")
-            return []
+        return await self.get_page("team", stats_type, season)
 
-    async def get_individual_stats(self, stats_type: str) -> List[Dict[str, Any]]:
+    async def get_individual_stats(self, stats_type: str, season: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get individual player statistics (batting/pitching/fielding)"""
-        try:
-            url = f"{self.BASE_URL}{self.STATS_TYPES['individual'][stats_type]}"
-            async with self.session.get(url) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                stats = []
-
-                # Find the stats table
-                table = soup.find('table', class_='tablesorter')
-                if not table:
-                    return []
-
-                # Get headers
-                headers = [th.text.strip() for th in table.find('thead').find_all('th')]
-
-                # Get player stats
-                for row in table.find('tbody').find_all('tr'):
-                    values = [td.text.strip() for td in row.find_all('td')]
-                    if len(headers) == len(values):
-                        stats.append(dict(zip(headers, values)))
-
-                return stats
-        except Exception as e:
-            logger.error(f"Error fetching {stats_type} individual stats: {str(e)}")
-            return []
+        return await self.get_page("individual", stats_type, season)
 
-    async def get_leaders(self, stats_type: str) -> List[Dict[str, Any]]:
+    async def get_leaders(self, stats_type: str, season: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get statistical leaders (batting/pitching/fielding)"""
-        try:
-            url = f"{self.BASE_URL}{self.STATS_TYPES['leaders'][stats_type]}"
-            async with self.session.get(url) as response:
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                leaders = []
-
-                # Find all leader sections
-                sections = soup.find_all('div', class_='leader_section')
-                for section in sections:
-                    category = section.find('h3').text.strip()
-                    table = section.find('table')
-                    if table:
-                        headers = [th.text.strip() for th in table.find_all('th')]
-                        rows = []
-                        for tr in table.find_all('tr')[1:]:  # Skip header row
-                            values = [td.text.strip() for td in tr.find_all('td')]
-                            if len(headers) == len(values):
-                                rows.append(dict(zip(headers, values)))
-                        leaders.append({
-                            "category": category,
-                            "rankings": rows
-                        })
-
-                return leaders
-        except Exception as e:
-            logger.error(f"Error fetching {stats_type} leaders: {str(e)}")
-            return []
+        return await self.get_page("leaders", stats_type, season)
+
+    async def get_all_stats(self, season: Optional[int] = None) -> Dict[str, Any]:
+        """Get all available statistics of a season
+
+        All pages are fetched concurrently under the shared fetcher limits and
+        parsed as one batch. A page that fails keeps an empty list and is
+        reported under ``errors`` with its URL and the reason.
+        """
+        season = season or self.season
+        pages = [(section, stats_type) for section in self.STATS_TYPES for stats_type in self.STATS_TYPES[section]]
+        urls = [self.page_url(section, stats_type, season) for section, stats_type in pages]
+
+        logger.info(f"Fetching {len(urls)} statistics pages for {season}...")
+        bodies = await asyncio.gather(*(self.fetcher.get_text(url) for url in urls), return_exceptions=True)
+        fetched = [i for i, body in enumerate(bodies) if not isinstance(body, BaseException)]
+        parsed = await self.parse_stage.run_batch([(self.PARSERS[pages[i][0]], bodies[i]) for i in fetched])
+        results = list(bodies)
+        for i, result in zip(fetched, parsed):
+            results[i] = result
 
-    async def get_all_stats(self) -> Dict[str, Any]:
-        """Get all available statistics"""
         stats = {
+            "season": season,
             "team": {},
             "individual": {},
-            "leaders": {}
+            "leaders": {},
+            "errors": []
         }
-
-        # Collect team stats
-        for stats_type in self.STATS_TYPES["team"]:
-            logger.info(f"Fetching team {stats_type} statistics...")
-            stats["team"][stats_type] = await self.get_team_stats(stats_type)
-
-        # Collect individual stats
-        for stats_type in self.STATS_TYPES["individual"]:
-            logger.info(f"Fetching individual {stats_type} statistics...")
-            stats["individual"][stats_type] = await self.get_individual_stats(stats_type)
-
-        # Collect leaders
-        for stats_type in self.STATS_TYPES["leaders"]:
-            logger.info(f"Fetching {stats_type} leaders...")
-            stats["leaders"][stats_type] = await self.get_leaders(stats_type)
+        for (section, stats_type), url, result in zip(pages, urls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error fetching {section} {stats_type} stats ({season}): {str(result)}")
+                stats["errors"].append({
+                    "section": section,
+                    "stats_type": stats_type,
+                    "url": url,
+                    "error": str(result) or type(result).__name__
+                })
+                result = []
+            stats[section][stats_type] = result
 
         return stats
 
-    def save_to_json(self, data: Dict[str, Any], filename: str = None):
+    async def get_seasons_stats(self, seasons: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get all statistics for several seasons at once (for backfills)"""
+        results = await asyncio.gather(*(self.get_all_stats(season) for season in seasons))
+        return dict(zip(seasons, results))
+
+    def save_to_json(self, data: Dict[str, Any], filename: str = None) -> bool:
         """Save scraped statistics to JSON file"""
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"data/npb_stats_{timestamp}.json"
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            # 一時ファイルに書いてから置き換え、APIが書きかけのファイルを読まないようにする
+            with open(filename + ".tmp", 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(filename + ".tmp", filename)
             logger.info(f"Statistics successfully saved to {filename}")
+            return True
         except Exception as e:
             logger.error(f"Error saving statistics to {filename}: {str(e)}")
-
-async def main():
-    async with NPBStatsScraper() as scraper:
-        stats = await scraper.get_all_stats()
-        scraper.save_to_json(stats)
+            return False
+
+    def save_season_json(self, data: Dict[str, Any], data_dir: str = "data/seasons") -> bool:
+        """Save one season of a backfill as data/seasons/npb_stats_<season>.json"""
+        os.makedirs(data_dir, exist_ok=True)
+        return self.save_to_json(data, os.path.join(data_dir, f"npb_stats_{data['season']}.json"))
+
+def has_stats(data: Dict[str, Any]) -> bool:
+    """Whether any page of a season produced rows (False when every page failed or came back empty)"""
+    return any(rows for section in ("team", "individual", "leaders") for rows in data[section].values())
+
+def parse_seasons(value: str) -> List[int]:
+    """Parse "2014-2024" or "2019,2021,2023" into a list of seasons"""
+    seasons = []
+    for part in value.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            seasons.extend(range(int(start), int(end) + 1))
+        else:
+            seasons.append(int(part))
+    return seasons
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Scrape NPB statistics")
+    parser.add_argument("--season", type=int, default=NPBStatsScraper.DEFAULT_SEASON, help="season to scrape")
+    parser.add_argument("--seasons", type=parse_seasons, default=None, help='backfill several seasons, e.g. "2014-2024"')
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--per-host", type=int, default=4, help="max requests in flight per host")
+    parser.add_argument("--rate", type=float, default=5.0, help="max requests started per second per host (0 = unlimited)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="HTML parser processes (0 = parse inline, default = one per CPU)")
+    parser.add_argument("--parser", default=None, help="BeautifulSoup parser backend (default: lxml if installed, else html.parser)")
+    parser.add_argument("--http-cache", default="data/http_cache", help="directory of the conditional-GET page cache")
+    parser.add_argument("--http-cache-mb", type=int, default=200, help="page cache size cap in MiB")
+    parser.add_argument("--no-http-cache", action="store_true", help="always download every page")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite snapshot store to write into (default: the one the API reads)")
+    parser.add_argument("--no-db", action="store_true", help="only write the JSON snapshots")
+    parser.add_argument("--retries", type=int, default=4, help="retries per page on connection errors, 429 and 5xx")
+    args = parser.parse_args()
+
+    http_cache = None if args.no_http_cache else HTTPCache(args.http_cache, args.http_cache_mb * 1024 * 1024)
+    async with NPBStatsScraper(args.season, args.concurrency, args.per_host, args.rate, args.parse_workers,
+                               args.parser, http_cache, RetryPolicy(args.retries)) as scraper:
+        if args.seasons:
+            all_seasons = await scraper.get_seasons_stats(args.seasons)
+        else:
+            all_seasons = {args.season: await scraper.get_all_stats()}
+
+        # 1行も取れなかったシーズンは保存しない（空のスナップショットが前回の正常なものを置き換えないように）
+        empty = [season for season, stats in all_seasons.items() if not has_stats(stats)]
+        for season in empty:
+            logger.error(f"No statistics scraped for {season}; keeping the previous snapshot")
+            del all_seasons[season]
+        if not all_seasons:
+            return 1
+
+        saved = True
+        if args.seasons:
+            for stats in all_seasons.values():
+                saved = scraper.save_season_json(stats) and saved
+        # 最新シーズンは通常のスナップショットとしても保存する（取得できなかった場合は古いシーズンで置き換えない）
+        latest = max(args.seasons) if args.seasons else args.season
+        if latest in all_seasons:
+            saved = scraper.save_to_json(all_seasons[latest]) and saved
+
+    if not args.no_db:
+        store = SnapshotStore(args.db)
+        try:
+            # 古いシーズンから書き込み、最新シーズンが最新バージョンになるようにする
+            for season in sorted(all_seasons):
+                store.write_stats(all_seasons[season])
+        finally:
+            store.close()
+    return 1 if empty or not saved else 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
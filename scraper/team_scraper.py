@@ -1,108 +1,165 @@
-from playwright.sync_api import sync_playwright
+import argparse
+import asyncio
 import json
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime
+from urllib.parse import urljoin
 import os
+import sys
+from fetcher import Fetcher, RetryPolicy, create_session
+from http_cache import HTTPCache
+from parsers import parse_teams, resolve_parser
+from snapshot_store import DB_PATH, SnapshotStore
+
+# Playwright は静的HTMLから取得できなかった場合の予備としてのみ使う（無ければ予備なし）
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    async_playwright = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class BrowserPool:
+    """One Chromium shared by every browser fetch in the process.
+
+    The browser and its context are started on first use and kept; each
+    fetch only opens and closes a page. With ``endpoint`` (a CDP URL such
+    as ``http://localhost:9222``) an already running Chromium is used
+    instead, so it also survives across scraper runs.
+    """
+
+    def __init__(self, endpoint: Optional[str] = None, max_pages: int = 2):
+        self.endpoint = endpoint
+        self.launches = 0
+        self.pages = 0
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_pages)
+
+    async def _ensure_context(self):
+        async with self._lock:
+            if self._context is not None and self._browser.is_connected():
+                return self._context
+            if async_playwright is None:
+                raise RuntimeError("playwright is not installed")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self.endpoint:
+                self._browser = await self._playwright.chromium.connect_over_cdp(self.endpoint)
+                contexts = self._browser.contexts
+                self._context = contexts[0] if contexts else await self._browser.new_context()
+            else:
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._context = await self._browser.new_context()
+            self.launches += 1
+            logger.info(f"Browser ready ({self.endpoint or 'launched chromium'})")
+            return self._context
+
+    async def content(self, url: str, timeout: float = 30.0) -> str:
+        """HTML of ``url`` after its scripts have run, from a page of the shared context"""
+        context = await self._ensure_context()
+        async with self._slots:
+            page = await context.new_page()
+            try:
+                await page.goto(url, timeout=timeout * 1000)
+                await page.wait_for_load_state("networkidle")
+                self.pages += 1
+                return await page.content()
+            finally:
+                await page.close()
+
+    async def close(self):
+        async with self._lock:
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+            self._playwright = self._browser = self._context = None
+
+_shared_pool: Optional[BrowserPool] = None
+
+def shared_browser_pool(endpoint: Optional[str] = None) -> BrowserPool:
+    """The process-wide BrowserPool (created on first call)"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = BrowserPool(endpoint)
+    return _shared_pool
+
 class NPBTeamScraper:
     BASE_URL = "https://npb.jp/teams/"
-    
-    def __init__(self):
+
+    # 静的HTMLで取得（auto: 取れなければブラウザ / always: 常にブラウザ / never: ブラウザを使わない）
+    BROWSER_MODES = ("auto", "always", "never")
+
+    def __init__(self, http_cache: Optional[HTTPCache] = None, retry: Optional[RetryPolicy] = None,
+                 parser: Optional[str] = None, browser: str = "auto", browser_pool: Optional[BrowserPool] = None):
         self.teams_data = {
             "central": [],
             "pacific": []
         }
-
-    def scrape_teams(self):
-        """Scrape NPB team information using Playwright"""
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
+        self.http_cache = http_cache
+        self.retry = retry
+        self.parser = resolve_parser(parser)
+        self.browser = browser
+        self.browser_pool = browser_pool
+        self.source = None
+        self.session = None
+        self.fetcher = None
+
+    async def __aenter__(self):
+        self.session = create_session(2, 2)
+        self.fetcher = Fetcher(self.session, 2, 2, None, self.http_cache, self.retry)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session:
+            await self.session.close()
+        if self.http_cache:
+            self.http_cache.save()
+        if self.fetcher:
+            self.fetcher.stats.log_summary()
+
+    async def scrape_teams(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Scrape NPB team information, over plain HTTP when possible
+
+        The teams page is static, so it is normally fetched and parsed
+        without a browser. The shared browser pool is used only when the
+        HTTP fetch fails or yields no teams (or with ``browser="always"``).
+        """
+        if self.browser != "always":
             try:
-                logger.info("Accessing NPB teams page...")
-                page.goto(self.BASE_URL)
-                page.wait_for_load_state("networkidle")
-
-                # セ・リーグチーム情報の取得
-                logger.info("Scraping Central League teams...")
-                central_teams = page.query_selector_all('//h3[contains(text(), "CENTRAL LEAGUE")]/following-sibling::div[1]//table')
-                self.teams_data["central"] = self._extract_teams_data(central_teams)
-
-                # パ・リーグチーム情報の取得
-                logger.info("Scraping Pacific League teams...")
-                pacific_teams = page.query_selector_all('//h3[contains(text(), "PACIFIC LEAGUE")]/following-sibling::div[1]//table')
-                self.teams_data["pacific"] = self._extract_teams_data(pacific_teams)
-
+                logger.info("Fetching NPB teams page...")
+                teams_data = self._parse(await self.fetcher.get_text(self.BASE_URL))
+                if any(teams_data.values()):
+                    self.teams_data, self.source = teams_data, "http"
+                    return self.teams_data
+                logger.warning("No teams found in the static teams page")
             except Exception as e:
-                logger.error(f"Error during scraping: {str(e)}")
-            finally:
-                browser.close()
+                logger.warning(f"Error fetching {self.BASE_URL}: {str(e)}")
+            if self.browser == "never":
+                return self.teams_data
 
+        try:
+            logger.info("Rendering NPB teams page in the browser...")
+            pool = self.browser_pool or shared_browser_pool()
+            self.teams_data, self.source = self._parse(await pool.content(self.BASE_URL)), "browser"
+        except Exception as e:
+            logger.error(f"Error during scraping: {str(e)}")
         return self.teams_data
 
-    def _extract_teams_data(self, team_elements) -> List[Dict[str, Any]]:
-        """Extract team information from table elements"""
-        teams = []
-        
-        for team_element in team_elements:
-            try:
-                # チーム名の取得（日本語と英語）
-                team_name = team_element.evaluate('(el) => {
-                    const prevElement = el.previousElementSibling;
-                    if (prevElement && prevElement.tagName === "H4") {
-                        return {
-                            ja: prevElement.textContent.split(/(?=[A-Z])/)[0].trim(),
-                            en: prevElement.textContent.split(/(?=[A-Z])/)[1].trim()
-                        };
-                    }
-                    return null;
-                }')
-
-                if not team_name:
-                    continue
-
-                # チーム詳細情報の取得
-                rows = team_element.query_selector_all('tr')
-                team_info = {
-                    "name": team_name,
-                    "details": {}
-                }
-
-                for row in rows:
-                    cells = row.query_selector_all('td')
-                    if len(cells) == 2:
-                        key = cells[0].inner_text().strip()
-                        value = cells[1].inner_text().strip()
-                        
-                        # 本拠地の場合、球場名のみを抽出
-                        if "本拠地" in key:
-                            value = value.split("/")[0].strip()
-                        
-                        team_info["details"][key] = value
-
-                # チームロゴURLの取得（存在する場合）
-                logo_element = team_element.evaluate('(el) => {
-                    const img = el.closest("div").querySelector("img");
-                    return img ? img.src : null;
-                }')
-                
-                if logo_element:
-                    team_info["logo_url"] = logo_element
-
-                teams.append(team_info)
+    def _parse(self, html: str) -> Dict[str, List[Dict[str, Any]]]:
+        teams_data = parse_teams(html, self.parser)
+        for teams in teams_data.values():
+            for team in teams:
+                if "logo_url" in team:
+                    team["logo_url"] = urljoin(self.BASE_URL, team["logo_url"])
+        return teams_data
 
-            except Exception as e:
-                logger.error(f"Error extracting team data: {str(e)}")
-                continue
-
-        return teams
-
-    def save_to_json(self, filename: str = None):
+    def save_to_json(self, filename: str = None) -> bool:
         """Save scraped team data to JSON file"""
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -110,18 +167,55 @@ class NPBTeamScraper:
 
         # データディレクトリの作成（存在しない場合）
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        
+
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            # 一時ファイルに書いてから置き換え、APIが書きかけのファイルを読まないようにする
+            with open(filename + ".tmp", 'w', encoding='utf-8') as f:
                 json.dump(self.teams_data, f, ensure_ascii=False, indent=2)
+            os.replace(filename + ".tmp", filename)
             logger.info(f"Team data successfully saved to {filename}")
+            return True
         except Exception as e:
             logger.error(f"Error saving team data to {filename}: {str(e)}")
-
-def main():
-    scraper = NPBTeamScraper()
-    scraper.scrape_teams()
-    scraper.save_to_json()
+            return False
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Scrape NPB team information")
+    parser.add_argument("--browser", choices=NPBTeamScraper.BROWSER_MODES, default="auto",
+                        help="when to render the page in Chromium (auto = only if plain HTTP yields no teams)")
+    parser.add_argument("--browser-endpoint", default=os.environ.get("NPB_BROWSER_ENDPOINT"),
+                        help="CDP URL of a long-running Chromium to reuse instead of launching one")
+    parser.add_argument("--parser", default=None, help="BeautifulSoup tree builder (default: lxml if installed)")
+    parser.add_argument("--http-cache", default="data/http_cache", help="directory of the conditional-GET page cache")
+    parser.add_argument("--http-cache-mb", type=int, default=200, help="page cache size cap in MiB")
+    parser.add_argument("--no-http-cache", action="store_true", help="always download the page")
+    parser.add_argument("--retries", type=int, default=4, help="retries on connection errors, 429 and 5xx")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite snapshot store to write into (default: the one the API reads)")
+    parser.add_argument("--no-db", action="store_true", help="only write the JSON snapshot")
+    args = parser.parse_args()
+
+    http_cache = None if args.no_http_cache else HTTPCache(args.http_cache, args.http_cache_mb * 1024 * 1024)
+    pool = shared_browser_pool(args.browser_endpoint)
+    try:
+        async with NPBTeamScraper(http_cache, RetryPolicy(args.retries), args.parser, args.browser, pool) as scraper:
+            teams_data = await scraper.scrape_teams()
+            # 1チームも取れなかったときは空のスナップショットを書かない（APIは前回のものを返し続ける）
+            if not any(teams_data.values()):
+                logger.error("No teams scraped; keeping the previous snapshot")
+                return 1
+            saved = scraper.save_to_json()
+    finally:
+        await pool.close()
+
+    if not saved:
+        return 1
+    if not args.no_db:
+        store = SnapshotStore(args.db)
+        try:
+            store.write_teams(teams_data)
+        finally:
+            store.close()
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(asyncio.run(main()))
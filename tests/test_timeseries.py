@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from timeseries import PlayerSeries, build_tables, table_of  # noqa: E402
+
+# 同じ年度に打撃成績と投手成績の行がある二刀流の選手
+TWO_WAY = {
+    "id": "tw1",
+    "name": "二刀流",
+    "statistics": [
+        {"年度": "2023", "所属球団": "日本ハム", "試合": "130", "打数": "400", "安打": "120", "本塁打": "30",
+         "打率": ".300"},
+        {"年度": "2023", "所属球団": "日本ハム", "登板": "20", "投球回": "120", "安打": "8", "本塁打": "2",
+         "自責点": "40", "防御率": "3.00"},
+    ],
+}
+
+BATTER = {
+    "id": "b1",
+    "name": "打者",
+    "statistics": [
+        {"年度": "2023", "所属球団": "日本ハム", "試合": "140", "打数": "500", "安打": "150", "本塁打": "20",
+         "打率": ".300"},
+    ],
+}
+
+
+def test_table_of():
+    assert table_of(TWO_WAY["statistics"][0]) == "batting"
+    assert table_of(TWO_WAY["statistics"][1]) == "pitching"
+
+
+def test_two_way_player_keeps_tables_apart():
+    tables = build_tables({"tw1": TWO_WAY, "b1": BATTER})
+
+    batting = tables["batting"].trend("tw1", "安打,打率,本塁打")
+    assert batting["seasons"] == [2023]
+    assert batting["stats"]["安打"]["values"] == [120]
+    assert batting["stats"]["打率"]["values"] == [0.3]
+    assert batting["stats"]["本塁打"]["values"] == [30]
+
+    pitching = tables["pitching"].trend("tw1", "安打,防御率,本塁打")
+    assert pitching["stats"]["安打"]["values"] == [8]
+    assert pitching["stats"]["防御率"]["values"] == [3.0]
+    assert pitching["stats"]["本塁打"]["values"] == [2]
+
+    # 打者の行は投手成績の系列に入らない
+    assert tables["pitching"].trend("b1")["seasons"] == []
+
+
+def test_team_seasons_sum_batting_rows_only():
+    series = PlayerSeries.build({"tw1": TWO_WAY, "b1": BATTER}, "batting")
+    (row,) = series.team_seasons(2023, "日本ハム", "安打,打数,打率")
+    assert row["安打"] == 270
+    assert row["打率"] == 0.3